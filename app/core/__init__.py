@@ -0,0 +1,52 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+# the core package holds everything needed to turn a series of steps into
+# a workflow zip, it deliberately has no dependency on the web framework
+# so it can be imported cheaply by batch jobs and worker processes
+
+from .exceptions import (
+    WorkflowGeneratorError,
+    WorkflowValidationError,
+    MemoryBudgetExceeded,
+    SubflowNotFound,
+    CatalogNotFound,
+    ProfileNotFound,
+    ProfilerBusy,
+    StagedUploadNotFound,
+    ConversionCancelled,
+    PrebuiltWorkflowNotFound,
+)
+from .models import (
+    StepType,
+    DecisionPath,
+    ImportStep,
+    ImportWorkflow,
+    ImportSubflow,
+    ImportCatalog,
+    StagedOverrides,
+)
+from .zip_converter import rewrite_workflow_metadata
+from .csv_to_import_steps import read_csv_steps, convert_csv_to_import_steps
+from .compiled_workflow import compile_workflow
+from .explain import explain_workflow
+from .workflow_generator import Workflow, render_workflow_xml
+from .zip_converter import construct_zip
+from .pipeline import generate_workflow_zip
+from .analysis import analyse_import_steps
@@ -0,0 +1,383 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# dry-run analysis of a list of ImportStep, this builds the same step graph
+# as compile_workflow (including the inferred connections to the next step)
+# but never compiles the workflow or writes the xml or the zip, each step is
+# only written on its own to measure it, so it runs in time linear in the
+# number of steps and connections
+#
+# the input steps are only read, never modified
+
+from collections import namedtuple
+from types import MappingProxyType
+import uuid
+
+import lxml.etree as et
+
+from . import catalogs
+from . import subflows
+from .compiled_workflow import (
+    CompiledConnection,
+    CompiledGroup,
+    CompiledStep,
+    CompiledWorkflow,
+    selection_options_error,
+    step_indexes_error,
+)
+from .exceptions import SubflowNotFound, CatalogNotFound
+from .models import StepType
+from .xml_writer import measure_fragment, measure_step, render_workflow_document
+
+START_STEP_INDEX = -1
+END_STEP_INDEX = -2
+
+# the size estimate is measured with the bytes backend, see
+# xml_writer.measure_step, each step is written on its own with placeholder
+# ids, which are the length of the real ones, and without the steps of its
+# group, which are measured with the rest of their own group; subflows and
+# catalogs are measured once for each depth they are included at
+_PLACEHOLDER_ID = str(uuid.UUID(int=0))
+_NO_TRANSLATIONS = MappingProxyType({})
+_NO_GROUP = CompiledGroup("", "", ())
+_NO_CHOICES = et.Element("Choices")
+
+# stands in for a catalog while a step is measured, its choices are
+# measured separately
+_MeasuredCatalog = namedtuple("_MeasuredCatalog", ["choices_xml", "option_count"])
+
+
+def _text(value):
+    return str(value) if value else ""
+
+
+class _StepSizeEstimator():
+
+    def __init__(self):
+        self._fragment_sizes = {}
+
+    def header(self, workflow_title, workflow_description):
+        # the document without any steps, this includes the <Steps>
+        # element of the top level group
+        return render_workflow_document(CompiledWorkflow(
+            _PLACEHOLDER_ID, _text(workflow_title), _text(workflow_description),
+            _NO_TRANSLATIONS, _NO_GROUP,
+        )).size()
+
+    def step(self, import_step, step_type, decision_names, level, step_number,
+             choices=None):
+        config = import_step.config or {}
+        catalog = None
+        size = 0
+        if isinstance(choices, catalogs.Catalog):
+            catalog = _MeasuredCatalog(_NO_CHOICES, choices.option_count)
+            size = self._fragment(("catalog", choices.name), choices.choices_xml, level + 3) \
+                - self._fragment(("catalog", None), _NO_CHOICES, level + 3)
+            choices = None
+        elif bool(config.get("dynamic")) and not choices:
+            # reported as an error, measured as an empty url
+            choices = [""]
+        step = CompiledStep(
+            step_type=step_type,
+            step_index=import_step.step_index,
+            step_id=_PLACEHOLDER_ID,
+            title=str(import_step.step_title),
+            description=_text(import_step.step_description),
+            step_tag=import_step.step_tag,
+            connections=tuple(
+                CompiledConnection(_PLACEHOLDER_ID, _PLACEHOLDER_ID, _PLACEHOLDER_ID, z)
+                for z in decision_names
+            ),
+            translations=_NO_TRANSLATIONS,
+            config=config,
+            choices=tuple(choices or ()),
+            group=_NO_GROUP if step_type == StepType.group and not config.get("include")
+            else None,
+            subflow=None,
+            catalog=catalog,
+        )
+        return size + measure_step(step, step_number, level)
+
+    def subflow(self, subflow, level):
+        return self._fragment(("subflow", subflow.name), subflow.steps_xml, level)
+
+    def _fragment(self, key, element, level):
+        size = self._fragment_sizes.get((key, level))
+        if size is None:
+            size = self._fragment_sizes[(key, level)] = measure_fragment(element, level)
+        return size
+
+
+def _group_successors(indexes, import_steps):
+    # mirrors compiled_workflow._step_connections, steps without decision
+    # paths continue to the next step in the order in which they were
+    # written; returns the paths out of each step as well as the successors
+    # of each StepIndex, as a repeated StepIndex has the paths of every
+    # step that uses it
+    step_paths = []
+    successors = {START_STEP_INDEX: [(indexes[1], "")], END_STEP_INDEX: []}
+    for position, import_step in enumerate(import_steps, start=1):
+        if import_step.decision_paths:
+            paths = [(z.step_index, z.decision_name) for z in import_step.decision_paths]
+        else:
+            paths = [(indexes[position + 1], "")]
+        step_paths.append(paths)
+        successors.setdefault(import_step.step_index, []).extend(paths)
+    return successors, step_paths
+
+
+def _reachable(successors):
+    seen = {START_STEP_INDEX}
+    stack = [START_STEP_INDEX]
+    while stack:
+        for sink, _ in successors[stack.pop()]:
+            if sink in successors and sink not in seen:
+                seen.add(sink)
+                stack.append(sink)
+    return seen
+
+
+def _longest_path(successors, weights):
+    # the longest path from the start step, in steps, through the graph with
+    # the edges that loop back to an earlier step removed, found with an
+    # iterative depth first search so that it runs in linear time
+    longest = {}
+    on_stack = set()
+    stack = [(START_STEP_INDEX, iter(successors[START_STEP_INDEX]))]
+    on_stack.add(START_STEP_INDEX)
+    best = {START_STEP_INDEX: 0}
+    while stack:
+        node, remaining = stack[-1]
+        advanced = False
+        for sink, _ in remaining:
+            if sink not in successors or sink in on_stack:
+                continue
+            if sink in longest:
+                best[node] = max(best[node], longest[sink])
+                continue
+            on_stack.add(sink)
+            best[sink] = 0
+            stack.append((sink, iter(successors[sink])))
+            advanced = True
+            break
+        if advanced:
+            continue
+        stack.pop()
+        on_stack.discard(node)
+        longest[node] = best[node] + weights.get(node, 0)
+        if stack:
+            parent = stack[-1][0]
+            best[parent] = max(best[parent], longest[node])
+    return longest[START_STEP_INDEX]
+
+
+def analyse_import_steps(import_steps, workflow_title="", workflow_description=""):
+
+    estimator = _StepSizeEstimator()
+    errors = []
+    step_counts = {z.value: 0 for z in StepType if z not in (StepType.start, StepType.end)}
+    unreachable = []
+    decision_fan_outs = []
+    included_subflows = {}
+    catalog_references = {}
+    included_step_count = 0
+    connection_count = 0
+    max_depth = 0
+    group_count = 0
+
+    estimated_size = estimator.header(workflow_title, workflow_description)
+
+    # collect every group with an explicit stack, parents always come
+    # before their children so walking the list backwards visits the
+    # innermost groups first
+    groups = [{"steps": import_steps, "depth": 0, "level": 1}]
+    position = 0
+    while position < len(groups):
+        group = groups[position]
+        position += 1
+        for import_step in group["steps"]:
+            if import_step.step_type == StepType.group and import_step.steps \
+                    and not import_step.config.get("include"):
+                groups.append({
+                    "steps": import_step.steps,
+                    "parent": group,
+                    "depth": group["depth"] + 1,
+                    "level": group["level"] + 2,
+                    "owner": import_step,
+                })
+
+    group_longest_paths = {}
+    for group in reversed(groups):
+        group_steps = group["steps"]
+        # the path of step indexes down to the group is only worked out
+        # for the groups that are reported, see _resolve_group_paths
+        path = group
+        level = group["level"] + 1
+        max_depth = max(max_depth, group["depth"])
+
+        indexes = [START_STEP_INDEX] + [z.step_index for z in group_steps] + [END_STEP_INDEX]
+        error = step_indexes_error(indexes)
+        if error is not None:
+            errors.append({"group": path, "message": error})
+
+        successors, step_paths = _group_successors(indexes, group_steps)
+        weights = {}
+
+        # the start and end steps
+        estimated_size += estimator.step(
+            _Placeholder("Start", START_STEP_INDEX), StepType.start, [""], level, 0)
+        estimated_size += estimator.step(
+            _Placeholder("End", END_STEP_INDEX), StepType.end, [], level,
+            len(group_steps) + 1)
+        connection_count += 1
+
+        for step_number, (import_step, paths) in enumerate(
+                zip(group_steps, step_paths), start=1):
+            step_type = import_step.step_type
+            step_counts[step_type.value] = step_counts.get(step_type.value, 0) + 1
+            weights[import_step.step_index] = 1
+
+            decision_names = [z[1] for z in paths]
+            connection_count += len(decision_names)
+            for sink, _ in paths:
+                if sink not in successors:
+                    errors.append({
+                        "group": path,
+                        "step_index": import_step.step_index,
+                        "message": "Decision path to unknown StepIndex {0}".format(sink),
+                    })
+
+            if step_type == StepType.decision:
+                decision_fan_outs.append(len(decision_names))
+
+            choices = import_step.selection_options
+            if step_type == StepType.selection:
+                catalog_name = catalogs.catalog_reference(choices)
+                if catalog_name is not None and not bool(import_step.config.get("dynamic")):
+                    catalog_references[catalog_name] = catalog_references.get(catalog_name, 0) + 1
+                    try:
+                        choices = catalogs.get_catalog(catalog_name)
+                    except CatalogNotFound as e:
+                        errors.append({"group": path, "step_index": import_step.step_index,
+                                       "message": e.detail})
+                        choices = []
+                else:
+                    error = selection_options_error(choices, import_step.config)
+                    if error is not None:
+                        errors.append({"group": path, "step_index": import_step.step_index,
+                                       "message": error})
+
+            estimated_size += estimator.step(
+                import_step, step_type, decision_names, level, step_number, choices)
+
+            if step_type == StepType.group:
+                group_count += 1
+                include = import_step.config.get("include")
+                if include:
+                    included_subflows[include] = included_subflows.get(include, 0) + 1
+                    try:
+                        subflow = subflows.get_subflow(include)
+                    except SubflowNotFound as e:
+                        errors.append({"group": path, "step_index": import_step.step_index,
+                                       "message": e.detail})
+                    else:
+                        # the subflow's own start and end steps are not counted
+                        included_step_count += subflow.step_count - 2
+                        estimated_size += estimator.subflow(subflow, level + 1)
+                elif import_step.steps is None:
+                    errors.append({"group": path, "step_index": import_step.step_index,
+                                   "message": "Group steps must contain steps or include a subflow"})
+                else:
+                    child_longest = group_longest_paths.get(id(import_step))
+                    if child_longest is None:
+                        # an empty group is still given its start and end steps
+                        estimated_size += estimator.step(
+                            _Placeholder("Start", START_STEP_INDEX), StepType.start,
+                            [""], level + 2, 0)
+                        estimated_size += estimator.step(
+                            _Placeholder("End", END_STEP_INDEX), StepType.end,
+                            [], level + 2, 1)
+                        connection_count += 1
+                        child_longest = 0
+                    weights[import_step.step_index] = 1 + child_longest
+
+        reachable = _reachable(successors)
+        unreachable.extend(
+            {"group": path, "step_index": z.step_index}
+            for z in group_steps if z.step_index not in reachable
+        )
+
+        longest = _longest_path(successors, weights)
+        if "owner" in group:
+            group_longest_paths[id(group["owner"])] = longest
+        else:
+            longest_path = longest
+
+    _resolve_group_paths(errors)
+    _resolve_group_paths(unreachable)
+
+    return {
+        "valid": not errors,
+        "errors": errors,
+        "step_count": sum(step_counts.values()) + included_step_count,
+        "step_counts": step_counts,
+        "included_step_count": included_step_count,
+        "group_count": group_count,
+        "max_depth": max_depth,
+        "connection_count": connection_count,
+        "decision_fan_out": {
+            "decision_steps": len(decision_fan_outs),
+            "max": max(decision_fan_outs) if decision_fan_outs else 0,
+            "mean": sum(decision_fan_outs) / len(decision_fan_outs)
+            if decision_fan_outs else 0.0,
+        },
+        "unreachable_step_count": len(unreachable),
+        "unreachable_steps": unreachable,
+        "longest_path": longest_path,
+        "included_subflows": included_subflows,
+        "catalog_references": catalog_references,
+        "estimated_xml_bytes": estimated_size,
+    }
+
+
+def _resolve_group_paths(entries):
+    # replaces the group of each entry with the StepIndex of
+    # each of the group steps above it, outermost first
+    paths = {}
+    for entry in entries:
+        group = entry["group"]
+        if id(group) not in paths:
+            path = []
+            while "owner" in group:
+                path.append(group["owner"].step_index)
+                group = group["parent"]
+            path.reverse()
+            paths[id(entry["group"])] = path
+        entry["group"] = paths[id(entry["group"])]
+
+
+class _Placeholder():
+    # stands in for the ImportStep of the start and end steps
+    # which StepGroup adds to every group
+
+    def __init__(self, title, step_index):
+        self.step_index = step_index
+        self.step_title = title
+        self.step_description = ""
+        self.step_tag = ""
+        self.config = {}
@@ -0,0 +1,126 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# cooperative cancellation of a conversion, once its deadline has passed or
+# its client has gone there is no point finishing the workflow and zip
+#
+# a conversion is run inside watch(), check() is called between stages and
+# checkpoint() from inside the step loops and zip writing, alongside
+# memory.checkpoint(); both raise ConversionCancelled, which unwinds the
+# pipeline and so closes any partly written zip buffer
+#
+# checkpoint() only looks at the clock every few calls and only asks
+# whether the client is still connected every few hundred milliseconds,
+# as that can mean a round trip to the event loop
+
+from contextlib import contextmanager
+import threading
+import time
+
+from .exceptions import ConversionCancelled
+
+DEADLINE = "deadline"
+DISCONNECT = "disconnect"
+
+# the number of checkpoint() calls between looks at the clock
+_CHECK_EVERY = 64
+_DISCONNECT_POLL_SECONDS = 0.25
+
+_local = threading.local()
+_counts_lock = threading.Lock()
+_counts = {DEADLINE: 0, DISCONNECT: 0}
+
+
+class CancellationToken():
+
+    def __init__(self, deadline=None, is_disconnected=None):
+        # deadline is a time.monotonic() value, is_disconnected a callable
+        # that returns True once the client has gone
+        self.deadline = deadline
+        self.is_disconnected = is_disconnected
+        self.reason = None
+        self._calls = 0
+        self._next_poll = time.monotonic() + _DISCONNECT_POLL_SECONDS
+
+    def check(self):
+        now = time.monotonic()
+        if self.deadline is not None and now >= self.deadline:
+            self._cancel(DEADLINE, "The conversion did not finish before its deadline")
+        if self.is_disconnected is not None and now >= self._next_poll:
+            self._next_poll = now + _DISCONNECT_POLL_SECONDS
+            if self.is_disconnected():
+                self._cancel(DISCONNECT, "The client disconnected before the conversion finished")
+
+    def checkpoint(self):
+        self._calls += 1
+        if self._calls >= _CHECK_EVERY:
+            self._calls = 0
+            self.check()
+
+    def _cancel(self, reason, detail):
+        # the count is only taken the first time, the exception may be
+        # raised again from a clean up path
+        if self.reason is None:
+            self.reason = reason
+            with _counts_lock:
+                _counts[reason] += 1
+        raise ConversionCancelled(detail)
+
+
+def current_token():
+    return getattr(_local, "token", None)
+
+
+@contextmanager
+def watch(timeout_seconds=None, is_disconnected=None):
+    # yields None, so costs nothing, if there is neither a timeout nor a
+    # way of telling that the client has gone
+    if timeout_seconds is None and is_disconnected is None:
+        yield None
+        return
+
+    token = CancellationToken(
+        time.monotonic() + timeout_seconds if timeout_seconds is not None else None,
+        is_disconnected
+    )
+    previous = current_token()
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+def check():
+    # called between stages
+    token = getattr(_local, "token", None)
+    if token is not None:
+        token.check()
+
+
+def checkpoint():
+    # called from inside the step loops, cheap enough to call per step
+    token = getattr(_local, "token", None)
+    if token is not None:
+        token.checkpoint()
+
+
+def cancellation_counts():
+    # the number of conversions cancelled since the process started, by reason
+    with _counts_lock:
+        return dict(_counts)
@@ -0,0 +1,88 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# named catalogs of selection options, a catalog is uploaded once and its
+# "Choices" xml built up front, a selection step then references it in
+# place of its own options, e.g. SelectionOptions = "@catalog:sites"
+
+import copy
+
+import lxml.etree as et
+
+from .exceptions import WorkflowValidationError, CatalogNotFound
+from .fragment_store import FragmentStore
+
+CATALOG_PREFIX = "@catalog:"
+
+
+class Catalog():
+
+    def __init__(self, name, choices_xml, modified=None):
+        self.name = name
+        self.choices_xml = choices_xml
+        self.modified = modified
+        self.option_count = len(choices_xml)
+
+    def instantiate(self):
+        return copy.deepcopy(self.choices_xml)
+
+
+_store = FragmentStore("catalog", Catalog, CatalogNotFound)
+
+
+def configure(directory=None):
+    _store.configure(directory)
+
+
+def catalog_reference(selection_options):
+    # returns the name of the referenced catalog if the selection options
+    # are a catalog reference, otherwise None
+    if not selection_options or len(selection_options) != 1:
+        return None
+    option = selection_options[0].strip()
+    if not option.startswith(CATALOG_PREFIX):
+        return None
+    return option[len(CATALOG_PREFIX):].strip()
+
+
+def compile_catalog(options):
+    choices_xml = et.Element("Choices")
+    for option in options:
+        et.SubElement(choices_xml, "Choice").text = option.strip()
+    return choices_xml
+
+
+def register_catalog(name, options):
+    _store.check_name(name)
+    if not options:
+        raise WorkflowValidationError("A catalog must contain at least one option")
+    return _store.put(name, compile_catalog(options))
+
+
+def get_catalog(name):
+    return _store.get(name)
+
+
+def remove_catalog(name):
+    _store.remove(name)
+
+
+def list_catalogs():
+    return [
+        {"name": z.name, "option_count": z.option_count} for z in _store.all()
+    ]
@@ -0,0 +1,186 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# the formats of the DecisionPaths, Config and SelectionOptions cells of a
+# csv, e.g. "Yes:1;No:13", "Multi:True;Fixed:False" and "Red;Amber;Green"
+#
+# items are separated by ";" and, other than in SelectionOptions, a name
+# from its value by ":"; a separator can be included in a name or value by
+# quoting the whole of it, e.g. "Fail; retry":3, as in a csv a quote only
+# opens a field as its first character other than whitespace, and only
+# within the quotes does a backslash escape the next character, e.g.
+# "say \"hi\"", so an inch mark or a windows path is read as written
+#
+# a cell without quotes that is well formed, i.e. nearly every cell, is
+# matched as a whole by one compiled pattern and its pairs read with
+# another, anything else is read a field at a time, which also finds the
+# position of any error
+#
+# whitespace around names and values is ignored, other than in
+# SelectionOptions where, as before, every unquoted option is taken as
+# written
+#
+# each function parses a whole column at once, an error gives the row,
+# column and position of the character it was found at
+
+import re
+
+from .exceptions import WorkflowValidationError
+from .models import DecisionPath
+
+_OPENING_QUOTE_PATTERN = re.compile(r'\s*"')
+_QUOTED_FIELD_PATTERN = re.compile(r'\s*"((?:[^"\\]|\\.)*)"\s*', re.DOTALL)
+_PAIR_FIELD_PATTERN = re.compile(r"[^;:]*")
+_ITEM_FIELD_PATTERN = re.compile(r"[^;]*")
+
+_ESCAPE_PATTERN = re.compile(r"\\(.)", re.DOTALL)
+
+_PLAIN_PAIRS_PATTERN = re.compile(
+    r'[^;:"]*:[^;:"]*(?:;[^;:"]*:[^;:"]*)*;?\Z')
+_PAIR_PATTERN = re.compile(r"([^;:]*):([^;:]*)")
+
+
+class _CellError(Exception):
+
+    def __init__(self, position, message):
+        super().__init__(message)
+        self.position = position
+        self.message = message
+
+
+def _split_cell(cell, pairs, strip):
+    # a list of items, each a list of (field, position) pairs, positions
+    # count from 1 as they are shown in error messages
+    items = []
+    fields = []
+    field_pattern = _PAIR_FIELD_PATTERN if pairs else _ITEM_FIELD_PATTERN
+    field_start = 0
+    while True:
+        opening = _OPENING_QUOTE_PATTERN.match(cell, field_start)
+        if opening is not None:
+            match = _QUOTED_FIELD_PATTERN.match(cell, field_start)
+            if match is None:
+                raise _CellError(opening.end(), "unterminated quote")
+            value = match.group(1)
+            if "\\" in value:
+                value = _ESCAPE_PATTERN.sub(r"\1", value)
+            end = match.end()
+            if end < len(cell) and cell[end] != ";" and not (pairs and cell[end] == ":"):
+                raise _CellError(end + 1, "unexpected text after the closing quote")
+        else:
+            match = field_pattern.match(cell, field_start)
+            value = match.group(0).strip() if strip else match.group(0)
+            end = match.end()
+        fields.append((value, field_start + 1))
+        if end == len(cell):
+            break
+        if cell[end] == ";":
+            items.append(fields)
+            fields = []
+        field_start = end + 1
+    items.append(fields)
+    return items
+
+
+def _pairs(fields, form):
+    # the name and value of an item, empty items are skipped
+    if len(fields) == 1:
+        if fields[0][0] == "":
+            return None
+        raise _CellError(fields[0][1], "expected {0}".format(form))
+    if len(fields) > 2:
+        raise _CellError(fields[2][1] - 1, "unexpected ':', quote or escape it")
+    return fields
+
+
+def _parse_column(values, column, parse_cell):
+    # values is the column as a list, the row numbers in errors
+    # count the data rows of the csv from 1
+    parsed = []
+    for row, cell in enumerate(values, 1):
+        try:
+            parsed.append(parse_cell(cell if isinstance(cell, str) else str(cell)))
+        except _CellError as e:
+            raise WorkflowValidationError(
+                "Row {0}: {1} character {2}: {3}".format(
+                    row, column, e.position, e.message))
+    return parsed
+
+
+def _parse_decision_paths(cell):
+    if cell == "":
+        return None
+    if _PLAIN_PAIRS_PATTERN.match(cell):
+        try:
+            return [
+                DecisionPath.construct(
+                    step_index=int(step_index), decision_name=decision_name.strip())
+                for decision_name, step_index in _PAIR_PATTERN.findall(cell)
+            ]
+        except ValueError:
+            # read again below for the position of the error
+            pass
+    decision_paths = []
+    for fields in _split_cell(cell, True, True):
+        pair = _pairs(fields, "{DecisionName}:{StepIndex}")
+        if pair is None:
+            continue
+        (decision_name, _), (step_index, position) = pair
+        try:
+            step_index = int(step_index)
+        except ValueError:
+            raise _CellError(position, "StepIndex must be a whole number")
+        decision_paths.append(DecisionPath.construct(
+            step_index=step_index, decision_name=decision_name))
+    return decision_paths or None
+
+
+def _parse_config(cell):
+    if cell == "":
+        return {}
+    if _PLAIN_PAIRS_PATTERN.match(cell):
+        return {
+            name.strip().lower(): value.strip()
+            for name, value in _PAIR_PATTERN.findall(cell)
+        }
+    config = {}
+    for fields in _split_cell(cell, True, True):
+        pair = _pairs(fields, "{Name}:{Value}")
+        if pair is None:
+            continue
+        (name, _), (value, _) = pair
+        config[name.lower()] = value
+    return config
+
+
+def _parse_selection_options(cell):
+    if '"' not in cell:
+        return cell.split(";")
+    return [z[0][0] for z in _split_cell(cell, False, False)]
+
+
+def parse_decision_paths(values, column="DecisionPaths"):
+    return _parse_column(values, column, _parse_decision_paths)
+
+
+def parse_config(values, column="Config"):
+    return _parse_column(values, column, _parse_config)
+
+
+def parse_selection_options(values, column="SelectionOptions"):
+    return _parse_column(values, column, _parse_selection_options)
@@ -0,0 +1,264 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# the compiled form of a workflow, a graph of steps with their connections
+# resolved and the start and end step of every group added, produced once
+# from the ImportStep input and rendered to xml by workflow_generator.py
+#
+# compiling never modifies the input, and everything in a compiled workflow
+# is immutable (namedtuples, tuples and read only mappings) so it can be
+# cached, shared between threads and serialised any number of times; the
+# step and connection ids are fixed when it is compiled, so every
+# serialisation of the same compiled workflow has the same ids
+
+from collections import namedtuple
+from types import MappingProxyType
+import time
+import uuid
+
+from . import cancellation
+from . import catalogs
+from . import memory
+from . import subflows
+from .exceptions import WorkflowValidationError, SubflowNotFound, CatalogNotFound
+from .models import ImportStep, StepType
+
+START_STEP_INDEX = -1
+END_STEP_INDEX = -2
+
+CompiledConnection = namedtuple(
+    "CompiledConnection", ["connection_id", "source", "sink", "connection_type"])
+
+# config is a read only copy of the step's config, choices its selection
+# options, group the CompiledGroup of a group step's own steps, subflow and
+# catalog the subflows.Subflow or catalogs.Catalog the step refers to
+CompiledStep = namedtuple("CompiledStep", [
+    "step_type", "step_index", "step_id", "title", "description", "step_tag",
+    "connections", "translations", "config", "choices", "group", "subflow",
+    "catalog",
+])
+
+CompiledGroup = namedtuple("CompiledGroup", ["title", "description", "steps"])
+
+CompiledWorkflow = namedtuple(
+    "CompiledWorkflow",
+    ["workflow_id", "title", "description", "translations", "group"])
+
+_NO_MAPPING = MappingProxyType({})
+
+# every group starts and ends with these, they are never modified
+_START_STEP = ImportStep(
+    step_index=START_STEP_INDEX, step_title="Start", step_type=StepType.start)
+_END_STEP = ImportStep(
+    step_index=END_STEP_INDEX, step_title="End", step_type=StepType.end)
+
+
+def _freeze_translations(translations):
+    if not translations:
+        return _NO_MAPPING
+    return MappingProxyType({
+        locale: MappingProxyType(dict(texts))
+        for locale, texts in translations.items()
+    })
+
+
+def _text(value):
+    return str(value) if value else ""
+
+
+def step_indexes_error(step_indexes):
+    # why the StepIndex values of a group, including its start and end
+    # steps, can't be compiled, or None; these and selection_options_error
+    # are shared with analysis.py so that it reports the same as compiling
+    if len(set(step_indexes)) != len(step_indexes):
+        return "All StepIndex values must be unique within a group"
+    return None
+
+
+def selection_options_error(choices, config):
+    # the options of a selection step may be empty, e.g. a list filled in
+    # later, unless the step is dynamic; a catalog reference is checked
+    # against the catalogs separately
+    if choices is None or (bool(config.get("dynamic")) and not choices):
+        return "Selection steps must have SelectionOptions"
+    return None
+
+
+def _step_connections(import_step, step_id, next_step_index, step_index_to_id):
+    # a step without decision paths is connected to the step written after it
+    if import_step.step_type == StepType.end:
+        return ()
+    decision_paths = [
+        (z.step_index, z.decision_name) for z in import_step.decision_paths or ()
+    ] or [(next_step_index, "")]
+    connections = []
+    for sink_index, decision_name in decision_paths:
+        sink_id = step_index_to_id.get(sink_index)
+        if sink_id is None:
+            raise WorkflowValidationError(
+                "Step {0}: Decision path to unknown StepIndex {1}".format(
+                    import_step.step_index, sink_index))
+        connections.append(CompiledConnection(
+            str(uuid.uuid1()), step_id, sink_id, decision_name))
+    return tuple(connections)
+
+
+def _compile_step(import_step, step_id, connections, compiled_groups):
+    config = import_step.config or {}
+    choices = import_step.selection_options
+    group = subflow = catalog = None
+
+    if import_step.step_type == StepType.group:
+        if config.get("include"):
+            # the steps of the group come from a precompiled subflow
+            try:
+                subflow = subflows.get_subflow(config.get("include"))
+            except SubflowNotFound as e:
+                raise WorkflowValidationError(
+                    "Group step {0}: {1}".format(import_step.step_index, e.detail))
+        else:
+            group = compiled_groups[id(import_step)]
+
+    if import_step.step_type == StepType.selection:
+        catalog_name = catalogs.catalog_reference(choices)
+        if catalog_name is not None and not bool(config.get("dynamic")):
+            # the choices are prebuilt in a shared catalog
+            try:
+                catalog = catalogs.get_catalog(catalog_name)
+            except CatalogNotFound as e:
+                raise WorkflowValidationError(
+                    "Selection step {0}: {1}".format(import_step.step_index, e.detail))
+        else:
+            error = selection_options_error(choices, config)
+            if error is not None:
+                raise WorkflowValidationError(
+                    "Selection step {0}: {1}".format(import_step.step_index, error))
+
+    return CompiledStep(
+        step_type=import_step.step_type,
+        step_index=import_step.step_index,
+        step_id=step_id,
+        title=str(import_step.step_title),
+        description=_text(import_step.step_description),
+        step_tag=import_step.step_tag,
+        connections=connections,
+        translations=_freeze_translations(import_step.translations),
+        config=MappingProxyType(dict(config)),
+        choices=tuple(choices) if choices is not None else None,
+        group=group,
+        subflow=subflow,
+        catalog=catalog,
+    )
+
+
+def _compile_steps(import_steps, title, description, compiled_groups, timings):
+    group_steps = [_START_STEP] + list(import_steps) + [_END_STEP]
+    error = step_indexes_error([z.step_index for z in group_steps])
+    if error is not None:
+        raise WorkflowValidationError(error)
+
+    step_index_to_id = {
+        z.step_index: z.step_id or str(uuid.uuid4()) for z in group_steps
+    }
+    position_of_index = {
+        z.step_index: position for position, z in enumerate(group_steps)
+    }
+
+    steps = []
+    for import_step in group_steps:
+        memory.checkpoint()
+        cancellation.checkpoint()
+        if timings is not None:
+            start = time.perf_counter()
+        step_id = step_index_to_id[import_step.step_index]
+        position = position_of_index[import_step.step_index]
+        next_step_index = group_steps[position + 1].step_index \
+            if position + 1 < len(group_steps) else None
+        connections = _step_connections(
+            import_step, step_id, next_step_index, step_index_to_id)
+        steps.append(
+            _compile_step(import_step, step_id, connections, compiled_groups))
+        if timings is not None:
+            timings[step_id] = time.perf_counter() - start
+
+    return CompiledGroup(_text(title), _text(description), tuple(steps))
+
+
+def compile_group(import_steps, title="", description="", timings=None):
+    # the groups are listed outermost first from a work list and compiled
+    # in reverse, so a group's nested groups are always compiled before it
+    # and the depth of nesting is not limited by the recursion limit
+    #
+    # if timings is a dict the seconds taken to compile each step, not
+    # including the steps of a group, are recorded in it by step id
+    groups = [(None, import_steps, title, description)]
+    position = 0
+    while position < len(groups):
+        for import_step in groups[position][1]:
+            if import_step.step_type != StepType.group \
+                    or import_step.config.get("include"):
+                continue
+            if import_step.steps is None:
+                raise WorkflowValidationError(
+                    "Group step {0}: Group steps must contain steps or include a subflow".format(
+                        import_step.step_index))
+            groups.append((
+                import_step, import_step.steps,
+                import_step.step_title, import_step.step_description
+            ))
+        position += 1
+
+    compiled_groups = {}
+    for group_step, group_import_steps, group_title, group_description in reversed(groups):
+        compiled_groups[id(group_step)] = _compile_steps(
+            group_import_steps, group_title, group_description, compiled_groups,
+            timings)
+    return compiled_groups[id(None)]
+
+
+def compile_workflow(import_steps, title, description, translations=None, timings=None):
+    return CompiledWorkflow(
+        workflow_id=str(uuid.uuid1()),
+        title=_text(title),
+        description=_text(description),
+        translations=_freeze_translations(translations),
+        group=compile_group(import_steps, title, description, timings),
+    )
+
+
+def reachable_step_ids(compiled_group):
+    # the ids of the steps that can be reached from the start step of
+    # their group, in the group and every group within it that can itself
+    # be reached; the end step of each group is always included
+    reachable = set()
+    groups = [compiled_group]
+    while groups:
+        group = groups.pop()
+        steps_by_id = {z.step_id: z for z in group.steps}
+        reachable.add(group.steps[-1].step_id)
+        pending = [group.steps[0].step_id]
+        reachable.add(pending[0])
+        while pending:
+            step = steps_by_id[pending.pop()]
+            if step.group is not None:
+                groups.append(step.group)
+            for connection in step.connections:
+                if connection.sink not in reachable:
+                    reachable.add(connection.sink)
+                    pending.append(connection.sink)
+    return reachable
@@ -0,0 +1,179 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+from . import cell_formats
+from . import localisation
+from .models import ImportStep, StepType
+from .exceptions import WorkflowValidationError
+
+STEP_ID = "StepId"
+STEP_INDEX = "StepIndex"
+STEP_TITLE = "StepTitle"
+STEP_DESCRIPTION = "StepDescription"
+STEP_TAG = "StepTag"
+STEP_TYPE = "StepType"
+DECISION_PATHS = "DecisionPaths"
+SELECTION_OPTIONS = "SelectionOptions"
+CONFIG = "Config"
+PARENT = "Parent"
+PARENT_DEPTH = "ParentDepth"
+
+
+def read_csv_steps(csv_file, **read_csv_kwargs):
+
+    # pandas is only needed once a csv is actually being converted, so it
+    # is imported here to keep it out of the import cost of the package
+    import pandas as pd
+
+    try:
+        csv_file.seek(0)
+        return pd.read_csv(csv_file, **read_csv_kwargs)
+    except Exception as e:
+        raise WorkflowValidationError(str(e))
+
+
+def _field_conversions(imported_steps_df):
+
+    # convert any NaNs to empty strings for easier error handling
+    imported_steps_df.fillna(value="", inplace=True)
+
+    # step type strings converted to enums
+    imported_steps_df[STEP_TYPE] = imported_steps_df[STEP_TYPE].apply(
+        lambda x: StepType[x.strip().lower()]
+    )
+
+    # convert decision_paths to pairs, selection options to a list and
+    # config to a dict, each column is parsed in one go, see cell_formats.py
+    if DECISION_PATHS in imported_steps_df.columns:
+        imported_steps_df[DECISION_PATHS] = cell_formats.parse_decision_paths(
+            imported_steps_df[DECISION_PATHS].tolist(), DECISION_PATHS)
+
+    if SELECTION_OPTIONS in imported_steps_df.columns:
+        imported_steps_df[SELECTION_OPTIONS] = cell_formats.parse_selection_options(
+            imported_steps_df[SELECTION_OPTIONS].tolist(), SELECTION_OPTIONS)
+
+    if CONFIG in imported_steps_df.columns:
+        imported_steps_df[CONFIG] = cell_formats.parse_config(
+            imported_steps_df[CONFIG].tolist(), CONFIG)
+
+    # convert Parent (i.e. the StepIndex of the Parent) to int
+    if PARENT in imported_steps_df.columns:
+        import pandas as pd
+        imported_steps_df[PARENT] = pd.to_numeric(
+            imported_steps_df[PARENT], errors="coerce")
+
+    return imported_steps_df
+
+
+def _arrange_steps_under_parents(imported_steps_df, workflow_steps):
+
+    # the Parent of each step by its position in the list,
+    # and the position of each StepIndex
+    parents = imported_steps_df[PARENT].tolist()
+    position_of_index = {}
+    for position, step in enumerate(workflow_steps):
+        position_of_index.setdefault(step.step_index, position)
+
+    # work out the depth of each step by walking up to its top level
+    # ancestor, a step whose ancestors don't lead to a top level step
+    # (a missing parent or a loop) is given a depth of -1 and, like the
+    # top level steps, stays where it is
+    depths = [None] * len(workflow_steps)
+    for position in range(len(workflow_steps)):
+        path = []
+        on_path = set()
+        current = position
+        while True:
+            if current is None or current in on_path:
+                depth = -1
+                break
+            if depths[current] is not None:
+                depth = depths[current]
+                break
+            parent = parents[current]
+            if parent != parent:
+                depth = depths[current] = 0
+                break
+            path.append(current)
+            on_path.add(current)
+            current = position_of_index.get(parent)
+        for step_position in reversed(path):
+            if depth >= 0:
+                depth += 1
+            depths[step_position] = depth
+
+    # move each step with a depth into its parent, in the order the
+    # steps were written, the rest stay at the top level
+    top_level_steps = []
+    for position, step in enumerate(workflow_steps):
+        if depths[position] <= 0:
+            top_level_steps.append(step)
+            continue
+        parent_step = workflow_steps[position_of_index[parents[position]]]
+        if parent_step.steps is None:
+            parent_step.steps = []
+        parent_step.steps.append(step)
+
+    return top_level_steps
+
+
+def convert_csv_to_import_steps(imported_steps_df):
+
+    # convert string type fields from the csv into required types
+    imported_steps_df = _field_conversions(imported_steps_df)
+
+    # localised columns such as StepTitle_fr
+    try:
+        localised_columns = localisation.localised_names(
+            imported_steps_df.columns, localisation.STEP_TEXT_FIELDS)
+    except ValueError as e:
+        raise WorkflowValidationError(str(e))
+
+    # create a flat list of ImportStep
+    df_json = imported_steps_df.to_dict("records")
+    workflow_steps = [
+        ImportStep(
+            step_id=row.get(STEP_ID),
+            step_index=row.get(STEP_INDEX),
+            step_title=row.get(STEP_TITLE),
+            step_description=row.get(STEP_DESCRIPTION) if not row.get(
+                STEP_DESCRIPTION) is None else "",
+            step_tag=row.get(STEP_TAG) if not row.get(
+                STEP_TAG) is None else "",
+            step_type=row.get(STEP_TYPE) if not row.get(
+                STEP_TYPE) is None else StepType.instruction,
+            decision_paths=row.get(DECISION_PATHS) if not row.get(
+                DECISION_PATHS) is None else None,
+            selection_options=row.get(SELECTION_OPTIONS) if not row.get(
+                SELECTION_OPTIONS) is None else None,
+            config=row.get(CONFIG) if not row.get(CONFIG) is None else {},
+            translations=localisation.extract_translations(
+                row, localisation.STEP_TEXT_FIELDS, localised_columns)
+        )
+        for row in df_json
+    ]
+
+    # next recurse the steps to put each step with a parent
+    # in the ImportStep list of that parent step
+    if PARENT in imported_steps_df.columns:
+        workflow_steps = _arrange_steps_under_parents(
+            imported_steps_df,
+            workflow_steps
+        )
+
+    return workflow_steps
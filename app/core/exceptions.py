@@ -0,0 +1,72 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# the core package has no knowledge of the web layer, so it raises
+# these exceptions and main.py maps them on to HTTP responses
+
+
+class WorkflowGeneratorError(Exception):
+    # base class for every error raised by the core package
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class WorkflowValidationError(WorkflowGeneratorError):
+    # the input steps could not be converted into a valid workflow
+    pass
+
+
+class MemoryBudgetExceeded(WorkflowGeneratorError):
+    # a conversion ran while the worker process was over its memory limit
+    pass
+
+
+class SubflowNotFound(WorkflowGeneratorError):
+    # there is no subflow registered under the requested name
+    pass
+
+
+class CatalogNotFound(WorkflowGeneratorError):
+    # there is no option catalog registered under the requested name
+    pass
+
+
+class ProfileNotFound(WorkflowGeneratorError):
+    # there is no stored profile with the requested id
+    pass
+
+
+class ProfilerBusy(WorkflowGeneratorError):
+    # a profile was requested while another request is being profiled
+    pass
+
+
+class StagedUploadNotFound(WorkflowGeneratorError):
+    # there is no staged upload with the requested handle, or it has expired
+    pass
+
+
+class ConversionCancelled(WorkflowGeneratorError):
+    # a conversion was stopped as its deadline passed or its client went away
+    pass
+
+
+class PrebuiltWorkflowNotFound(WorkflowGeneratorError):
+    # there is no prebuilt workflow definition with the requested name
+    pass
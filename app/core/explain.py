@@ -0,0 +1,154 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# the explain report of a workflow, where the bytes of its workflow.xml and
+# the time taken to build it go, step by step, group by group and by type
+#
+# unlike analysis.py, which estimates the size without building anything,
+# the workflow is compiled and written out with the bytes backend, which
+# records where each step starts and ends as it is written; the output of
+# the two backends is identical so the sizes hold for either
+#
+# sizes are of the default locale's workflow.xml, a step's bytes include
+# the steps of a group while its own bytes don't, build_ms is the time
+# taken to compile and write the step itself
+#
+# each step is listed with its position in steps and the position of the
+# group step it is in, or None at the top level, rather than its path of
+# StepIndex values, which would grow the report with the depth of nesting;
+# step_path works the path out for a step when it is wanted
+
+from . import cancellation
+from . import memory
+from .compiled_workflow import compile_workflow
+from .models import StepType
+from .xml_writer import render_workflow_document
+
+# the number of steps listed in largest_steps
+LARGEST_STEP_COUNT = 10
+
+
+def _choice_count(step):
+    # the number of choices written for a selection step
+    if step.step_type != StepType.selection or bool(step.config.get("dynamic")):
+        return 0
+    if step.catalog is not None:
+        return step.catalog.option_count
+    return len(step.choices or ())
+
+
+def step_path(steps, position):
+    # the StepIndex of each group down to the step, e.g. "3/1"
+    indexes = []
+    while position is not None:
+        indexes.append(str(steps[position]["step_index"]))
+        position = steps[position]["parent"]
+    return "/".join(reversed(indexes))
+
+
+def explain_workflow(workflow_steps, workflow_title, workflow_description, workflow_translations=None):
+
+    if workflow_title is None:
+        workflow_title = "My Workflow"
+
+    if workflow_description is None:
+        workflow_description = ""
+
+    compile_seconds = {}
+    step_spans = []
+    with memory.stage("build"):
+        compiled = compile_workflow(
+            workflow_steps, workflow_title, workflow_description,
+            translations=workflow_translations, timings=compile_seconds
+        )
+    cancellation.check()
+    with memory.stage("xml"):
+        workflow_document = render_workflow_document(compiled, step_spans)
+
+    # the figures of each group step so far are its own, the bytes and
+    # write time of its steps are worked out here and taken off them, and
+    # the compile time of its steps added to that of the group, spans are
+    # in document order so a group's steps always come after it
+    compile_ms = [
+        compile_seconds.get(z.step.step_id, 0.0) * 1000 for z in step_spans
+    ]
+    group_compile_ms = list(compile_ms)
+    child_bytes = [0] * len(step_spans)
+    child_write_ms = [0.0] * len(step_spans)
+    for position in range(len(step_spans) - 1, -1, -1):
+        span = step_spans[position]
+        if span.parent is not None:
+            child_bytes[span.parent] += span.end - span.start
+            child_write_ms[span.parent] += span.seconds * 1000
+            group_compile_ms[span.parent] += group_compile_ms[position]
+
+    steps = []
+    groups = []
+    step_types = {}
+    for position, span in enumerate(step_spans):
+        step = span.step
+        step_bytes = span.end - span.start
+        row = {
+            "position": position,
+            "parent": span.parent,
+            "step_index": step.step_index,
+            "step_type": step.step_type.value,
+            "title": step.title,
+            "depth": span.depth,
+            "bytes": step_bytes,
+            "own_bytes": step_bytes - child_bytes[position],
+            "connection_count": len(step.connections),
+            "choice_count": _choice_count(step),
+            "build_ms": compile_ms[position]
+            + span.seconds * 1000 - child_write_ms[position],
+        }
+        steps.append(row)
+
+        totals = step_types.setdefault(row["step_type"], {
+            "count": 0, "own_bytes": 0, "connection_count": 0,
+            "choice_count": 0, "build_ms": 0.0,
+        })
+        totals["count"] += 1
+        for key in ("own_bytes", "connection_count", "choice_count", "build_ms"):
+            totals[key] += row[key]
+
+        if step.group is not None or step.subflow is not None:
+            groups.append({
+                "position": position,
+                "parent": span.parent,
+                "step_index": step.step_index,
+                "title": step.title,
+                "subflow": step.subflow.name if step.subflow is not None else None,
+                # not counting the start and end step of the group
+                "step_count": len(step.group.steps) - 2 if step.group is not None
+                else step.subflow.step_count,
+                "bytes": step_bytes,
+                "build_ms": group_compile_ms[position] + span.seconds * 1000,
+            })
+
+    return {
+        "workflow_bytes": workflow_document.size(),
+        "locale_count": len(workflow_document.locales()),
+        "step_count": len(steps),
+        "build_ms": sum(z["build_ms"] for z in steps),
+        "step_types": step_types,
+        "largest_steps": sorted(
+            steps, key=lambda z: z["own_bytes"], reverse=True)[:LARGEST_STEP_COUNT],
+        "groups": groups,
+        "steps": steps,
+    }
@@ -0,0 +1,138 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# a store of named, precompiled xml fragments such as subflows and option
+# catalogs, fragments are cached in memory and, if a directory has been
+# configured, also written to disk so that every worker process on the
+# host sees fragments registered through any of the others
+
+import os
+import re
+import tempfile
+import threading
+
+import lxml.etree as et
+
+from .exceptions import WorkflowValidationError
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+class FragmentStore():
+
+    def __init__(self, kind, wrap, not_found_error):
+        # wrap(name, xml, modified) turns a stored fragment into the object
+        # handed back to callers, e.g. a Subflow or a Catalog
+        self.kind = kind
+        self.wrap = wrap
+        self.not_found_error = not_found_error
+        self.directory = None
+        self._fragments = {}
+        self._lock = threading.Lock()
+
+    def configure(self, directory=None):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self.directory = directory
+            self._fragments.clear()
+
+    def check_name(self, name):
+        if not name or not _NAME_PATTERN.match(name):
+            raise WorkflowValidationError(
+                "{0} names may only contain letters, digits, '.', '_' and '-'".format(
+                    self.kind.capitalize())
+            )
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + ".xml")
+
+    def _not_found(self, name):
+        return self.not_found_error("No {0} named {1}".format(self.kind, name))
+
+    def put(self, name, xml):
+        self.check_name(name)
+        with self._lock:
+            modified = None
+            if self.directory:
+                # write to a temporary file first so other workers
+                # never read a partially written fragment
+                fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(et.tostring(xml))
+                    os.replace(temp_path, self._path(name))
+                except BaseException:
+                    os.remove(temp_path)
+                    raise
+                modified = os.stat(self._path(name)).st_mtime_ns
+            fragment = self._fragments[name] = self.wrap(name, xml, modified)
+        return fragment
+
+    def get(self, name):
+        self.check_name(name)
+        with self._lock:
+            fragment = self._fragments.get(name)
+            if not self.directory:
+                if fragment is None:
+                    raise self._not_found(name)
+                return fragment
+
+            try:
+                modified = os.stat(self._path(name)).st_mtime_ns
+            except FileNotFoundError:
+                self._fragments.pop(name, None)
+                raise self._not_found(name)
+
+            # reload if another worker has registered a newer version
+            if fragment is None or fragment.modified != modified:
+                with open(self._path(name), "rb") as f:
+                    xml = et.fromstring(f.read())
+                fragment = self._fragments[name] = self.wrap(name, xml, modified)
+            return fragment
+
+    def remove(self, name):
+        self.check_name(name)
+        with self._lock:
+            found = self._fragments.pop(name, None) is not None
+            if self.directory:
+                try:
+                    os.remove(self._path(name))
+                    found = True
+                except FileNotFoundError:
+                    pass
+        if not found:
+            raise self._not_found(name)
+
+    def all(self):
+        if self.directory:
+            names = sorted(
+                z[:-len(".xml")] for z in os.listdir(self.directory)
+                if z.endswith(".xml")
+            )
+        else:
+            names = sorted(self._fragments)
+
+        fragments = []
+        for name in names:
+            try:
+                fragments.append(self.get(name))
+            except self.not_found_error:
+                # removed by another worker while listing
+                continue
+        return fragments
@@ -0,0 +1,133 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# decoding of json request bodies however deeply they are nested, the json
+# module recurses for every nested object and list so with the default
+# recursion limit it gives up on a workflow nested more than about 480
+# groups deep, that is a RecursionError rather than a malformed body
+#
+# bodies are decoded by the json module as usual, only one that is too
+# deep for it is decoded again here with an explicit stack, the strings
+# are still read by the json module's scanstring and the numbers and
+# constants are turned into the same values as json.loads gives
+
+import json
+from json.decoder import JSONDecodeError, scanstring
+from json.scanner import NUMBER_RE
+import re
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+_CONSTANTS = (
+    ("null", None),
+    ("true", True),
+    ("false", False),
+    ("NaN", float("nan")),
+    ("Infinity", float("inf")),
+    ("-Infinity", float("-inf")),
+)
+
+
+def loads(data):
+    try:
+        return json.loads(data)
+    except RecursionError:
+        pass
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode(json.detect_encoding(data), "surrogatepass")
+    return _loads_without_recursion(data)
+
+
+def _skip(text, pos):
+    return _WHITESPACE.match(text, pos).end()
+
+
+def _key(text, pos):
+    # the key of an object member and the position of its value
+    if not text.startswith('"', pos):
+        raise JSONDecodeError(
+            "Expecting property name enclosed in double quotes", text, pos)
+    key, pos = scanstring(text, pos + 1)
+    pos = _skip(text, pos)
+    if not text.startswith(":", pos):
+        raise JSONDecodeError("Expecting ':' delimiter", text, pos)
+    return key, _skip(text, pos + 1)
+
+
+def _scalar(text, pos):
+    # a string, number or constant and the position after it
+    if text.startswith('"', pos):
+        return scanstring(text, pos + 1)
+    match = NUMBER_RE.match(text, pos)
+    if match is not None:
+        integer, fraction, exponent = match.groups()
+        if fraction or exponent:
+            return float(integer + (fraction or "") + (exponent or "")), match.end()
+        return int(integer), match.end()
+    for literal, value in _CONSTANTS:
+        if text.startswith(literal, pos):
+            return value, pos + len(literal)
+    raise JSONDecodeError("Expecting value", text, pos)
+
+
+def _loads_without_recursion(text):
+    # each entry of the stack is an object or list being read, with the
+    # key of the member whose value comes next for an object
+    stack = []
+    pos = _skip(text, 0)
+    while True:
+        if text.startswith("{", pos):
+            pos = _skip(text, pos + 1)
+            if not text.startswith("}", pos):
+                key, pos = _key(text, pos)
+                stack.append(({}, key))
+                continue
+            value, pos = {}, pos + 1
+        elif text.startswith("[", pos):
+            pos = _skip(text, pos + 1)
+            if not text.startswith("]", pos):
+                stack.append(([], None))
+                continue
+            value, pos = [], pos + 1
+        else:
+            value, pos = _scalar(text, pos)
+
+        # the value is added to the object or list it is in, and every
+        # object or list that it ends is added to the one it is in in turn
+        while True:
+            pos = _skip(text, pos)
+            if not stack:
+                if pos != len(text):
+                    raise JSONDecodeError("Extra data", text, pos)
+                return value
+            container, key = stack[-1]
+            if key is None:
+                container.append(value)
+            else:
+                container[key] = value
+            if text.startswith(",", pos):
+                pos = _skip(text, pos + 1)
+                if key is not None:
+                    key, pos = _key(text, pos)
+                    stack[-1] = (container, key)
+                break
+            if text.startswith("]" if key is None else "}", pos):
+                stack.pop()
+                value, pos = container, pos + 1
+                continue
+            raise JSONDecodeError("Expecting ',' delimiter", text, pos)
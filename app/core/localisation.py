@@ -0,0 +1,149 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# localised text, a column such as StepTitle_fr or StepDescription_de holds
+# the text of that field in one locale, the translations of a step are kept
+# as {locale: {"title": ..., "description": ...}}
+#
+# the workflow is built and turned into xml once, only the title and
+# description elements that have translations are recorded and their text
+# swapped before the same tree is serialised again for each locale
+
+import re
+
+# a locale is an ISO 639-1 language, optionally followed by a script and
+# a region, e.g. fr, pt-BR, zh-Hant or es-419; the language is checked
+# against the list so that a column such as StepTitle_old is reported
+# rather than published as a locale of its own
+_LOCALE_PATTERN = re.compile(
+    r"^(?P<language>[A-Za-z]{2})(-[A-Za-z]{4})?(-([A-Za-z]{2}|[0-9]{3}))?$")
+
+LANGUAGES = frozenset("""
+    aa ab ae af ak am an ar as av ay az ba be bg bh bi bm bn bo br bs ca ce
+    ch co cr cs cu cv cy da de dv dz ee el en eo es et eu fa ff fi fj fo fr
+    fy ga gd gl gn gu gv ha he hi ho hr ht hu hy hz ia id ie ig ii ik io is
+    it iu ja jv ka kg ki kj kk kl km kn ko kr ks ku kv kw ky la lb lg li ln
+    lo lt lu lv mg mh mi mk ml mn mr ms mt my na nb nd ne ng nl nn no nr nv
+    ny oc oj om or os pa pi pl ps pt qu rm rn ro ru rw sa sc sd se sg si sk
+    sl sm sn so sq sr ss st su sv sw ta te tg th ti tk tl tn to tr ts tt tw
+    ty ug uk ur uz ve vi vo wa wo xh yi yo za zh zu
+""".split())
+
+# the localisable fields, by the name used in the csv and json input
+STEP_TEXT_FIELDS = {
+    "StepTitle": "title",
+    "StepDescription": "description",
+    "stepTitle": "title",
+    "stepDescription": "description",
+    "step_title": "title",
+    "step_description": "description",
+}
+WORKFLOW_TEXT_FIELDS = {
+    "workflowTitle": "title",
+    "workflowDescription": "description",
+    "workflow_title": "title",
+    "workflow_description": "description",
+}
+
+
+def is_locale(locale):
+    match = _LOCALE_PATTERN.match(locale)
+    return match is not None and match.group("language").lower() in LANGUAGES
+
+
+def split_localised_name(name, fields):
+    # returns (field, locale) for a name such as "StepTitle_fr", otherwise
+    # None, a localisable field followed by anything but a locale is an
+    # error
+    base, separator, locale = str(name).rpartition("_")
+    if not separator or base not in fields:
+        return None
+    if not is_locale(locale):
+        raise ValueError(
+            "{0}: {1} is not a known locale, e.g. fr, de or pt-BR".format(name, locale))
+    return fields[base], locale
+
+
+def check_translations(translations):
+    for locale in translations:
+        if not is_locale(locale):
+            raise ValueError(
+                "{0} is not a known locale, e.g. fr, de or pt-BR".format(locale))
+    return translations
+
+
+def localised_names(names, fields):
+    # the localised names among names, as (name, field, locale)
+    localised = []
+    for name in names:
+        split = split_localised_name(name, fields)
+        if split is not None:
+            localised.append((name,) + split)
+    return localised
+
+
+def extract_translations(values, fields, localised=None):
+    # collects the localised values, empty values are skipped so that
+    # the text falls back to the default for that locale
+    if localised is None:
+        localised = localised_names(values.keys(), fields)
+    translations = {}
+    for name, field, locale in localised:
+        value = values.get(name)
+        if value is None or value == "":
+            continue
+        translations.setdefault(locale, {})[field] = str(value)
+    return translations
+
+
+def collect_translations(values, fields):
+    # moves any localised keys out of values and into values["translations"]
+    localised = localised_names(values.keys(), fields)
+    if not localised:
+        return values
+    translations = extract_translations(values, fields, localised)
+    values = {
+        k: v for k, v in values.items() if k not in {z[0] for z in localised}
+    }
+    for locale, texts in (values.get("translations") or {}).items():
+        translations.setdefault(locale, {}).update(texts)
+    values["translations"] = translations
+    return values
+
+
+class LocalisedText():
+
+    def __init__(self):
+        self._elements = []
+        self._locales = set()
+
+    def add(self, element, field, translations):
+        # element is a title or description element of the built xml
+        if not translations:
+            return
+        self._elements.append((element, element.text, field, translations))
+        self._locales.update(translations)
+
+    def locales(self):
+        return sorted(self._locales)
+
+    def apply(self, locale=None):
+        # sets the text of every recorded element to its translation,
+        # or back to the default text if there isn't one or locale is None
+        for element, default_text, field, translations in self._elements:
+            element.text = translations.get(locale, {}).get(field, default_text)
@@ -0,0 +1,230 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# optional per-request memory accounting built on tracemalloc, and an
+# optional memory limit for the whole worker process
+#
+# a request is wrapped in track_request(), the pipeline marks its stages
+# with stage() and calls checkpoint() from inside the step loops, both of
+# which do nothing unless tracking or a limit has been switched on with
+# configure()
+#
+# N.B. tracemalloc only sees allocations made through the python allocator,
+# the lxml element tree lives in libxml2's own memory so it is reflected in
+# the rss figures but not in the traced figures; tracemalloc is also process
+# wide so concurrent requests inflate each other's figures, which are only
+# there to diagnose where memory goes
+#
+# the limit is on the resident set size of the process, which does include
+# libxml2's memory, it is not a budget for each request: whichever
+# conversion reaches a checkpoint while the process is over it is aborted,
+# so with concurrent requests that needn't be the one that used the most;
+# it can only be read on linux, elsewhere it is never reached
+
+from contextlib import contextmanager
+import collections
+import os
+import threading
+import time
+import tracemalloc
+
+from .exceptions import MemoryBudgetExceeded
+
+_enabled = False
+_limit_bytes = None
+_top_sites = 5
+_recent_reports = collections.deque(maxlen=20)
+
+# the number of checkpoint() calls between reads of the rss for the limit
+_CHECK_EVERY = 64
+
+# the tracker for the request being converted on this thread, the
+# conversion never awaits so this is also safe for async endpoints
+_local = threading.local()
+
+
+def configure(enabled=False, limit_bytes=None, top_sites=5, history=20, frames=1):
+    global _enabled, _limit_bytes, _top_sites, _recent_reports
+
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    if not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    _enabled = bool(enabled)
+    _limit_bytes = limit_bytes
+    _top_sites = top_sites
+    _recent_reports = collections.deque(_recent_reports, maxlen=history)
+
+
+def is_enabled():
+    return _enabled
+
+
+def limit_bytes():
+    return _limit_bytes
+
+
+def recent_reports():
+    return list(_recent_reports)
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ])
+
+
+class RequestMemoryTracker():
+
+    def __init__(self, name, top_sites=5):
+        self.name = name
+        self.top_sites = top_sites
+        self.started_at = time.time()
+        self.stages = []
+        self.peak_bytes = 0
+        self.error = None
+        self._baseline_snapshot = _snapshot() if top_sites else None
+        self._baseline_bytes = tracemalloc.get_traced_memory()[0]
+        self._baseline_rss = _rss_bytes()
+        self._stage_peak_bytes = 0
+
+    def sample(self):
+        used = tracemalloc.get_traced_memory()[0] - self._baseline_bytes
+        if used > self._stage_peak_bytes:
+            self._stage_peak_bytes = used
+        if used > self.peak_bytes:
+            self.peak_bytes = used
+
+    def _top_allocation_sites(self):
+        if not self._baseline_snapshot:
+            return []
+        stats = _snapshot().compare_to(self._baseline_snapshot, "lineno")
+        return [
+            {
+                "site": "{0}:{1}".format(
+                    stat.traceback[0].filename, stat.traceback[0].lineno),
+                "size_bytes": stat.size_diff,
+                "count": stat.count_diff,
+            }
+            for stat in stats[:self.top_sites]
+            if stat.size_diff > 0
+        ]
+
+    @contextmanager
+    def stage(self, name):
+        self._stage_peak_bytes = 0
+        start = time.perf_counter()
+        try:
+            yield
+            self.sample()
+        finally:
+            traced_bytes = tracemalloc.get_traced_memory()[0] - self._baseline_bytes
+            self.stages.append({
+                "stage": name,
+                "duration_ms": (time.perf_counter() - start) * 1000,
+                "traced_bytes": traced_bytes,
+                "peak_traced_bytes": max(self._stage_peak_bytes, traced_bytes),
+                "rss_bytes": _rss_bytes() - self._baseline_rss,
+                "top_sites": self._top_allocation_sites(),
+            })
+
+    def report(self):
+        return {
+            "request": self.name,
+            "started_at": self.started_at,
+            "peak_traced_bytes": max(
+                [self.peak_bytes] + [z["peak_traced_bytes"] for z in self.stages]
+            ),
+            "error": self.error,
+            "stages": self.stages,
+        }
+
+
+def current_tracker():
+    return getattr(_local, "tracker", None)
+
+
+@contextmanager
+def track_request(name, always=False):
+    # with always set a tracker is returned even when tracking is off, it
+    # records the duration and rss of each stage but not the traced memory,
+    # e.g. for a request that is being profiled
+    if not _enabled and not always:
+        yield None
+        return
+
+    if _enabled:
+        tracker = RequestMemoryTracker(name, _top_sites)
+    else:
+        tracker = RequestMemoryTracker(name, 0)
+    previous = current_tracker()
+    _local.tracker = tracker
+    try:
+        yield tracker
+    except MemoryBudgetExceeded as e:
+        tracker.error = e.detail
+        raise
+    finally:
+        _local.tracker = previous
+        if _enabled:
+            _recent_reports.append(tracker.report())
+
+
+def check_limit():
+    # called at the start of each stage, and every so often from checkpoint()
+    if _limit_bytes is None:
+        return
+    rss = _rss_bytes()
+    if rss > _limit_bytes:
+        raise MemoryBudgetExceeded(
+            "The worker is using {0} bytes, over its memory limit of {1} bytes".format(
+                rss, _limit_bytes))
+
+
+@contextmanager
+def stage(name):
+    check_limit()
+    tracker = current_tracker()
+    if tracker is None:
+        yield
+        return
+    with tracker.stage(name):
+        yield
+
+
+def checkpoint():
+    # called from inside the step loops, cheap enough to call per step
+    tracker = getattr(_local, "tracker", None)
+    if tracker is not None:
+        tracker.sample()
+    if _limit_bytes is not None:
+        calls = getattr(_local, "calls", 0) + 1
+        if calls >= _CHECK_EVERY:
+            calls = 0
+            check_limit()
+        _local.calls = calls
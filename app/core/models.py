@@ -0,0 +1,166 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+from typing import Dict, List, Optional
+from pydantic import BaseModel, root_validator, validator
+from enum import Enum
+from humps import camelize
+
+from . import localisation
+
+
+def to_camel(string):
+    return camelize(string)
+
+
+class CamelModel(BaseModel):
+    class Config:
+        alias_generator = to_camel
+        allow_population_by_field_name = True
+
+
+class StepType(str, Enum):
+    instruction = "instruction"
+    text = "text"
+    numeric = "numeric"
+    photo = "photo"
+    video = "video"
+    signature = "signature"
+    barcode = "barcode"
+    selection = "selection"
+    decision = "decision"
+    group = "group"
+    datetime = "datetime"
+    start = "start"
+    end = "end"
+
+    @classmethod
+    def _missing_(cls, value):
+        return StepType.instruction
+
+
+class DecisionPath(CamelModel):
+    step_index: int
+    decision_name: str
+
+
+class ImportStep(CamelModel):
+    step_id: str = None
+    step_index: int
+    step_title: str = "Step Title"
+    step_description: str = ""
+    step_tag: str = ""
+    step_type: StepType = StepType.instruction
+    decision_paths: Optional[List[DecisionPath]]
+    selection_options: Optional[List[str]]
+    steps: Optional[List["ImportStep"]]
+    config: dict = {}
+    # translations of the title and description keyed by locale, localised
+    # keys such as stepTitle_fr are gathered into this
+    translations: Dict[str, Dict[str, str]] = {}
+
+    @root_validator(pre=True)
+    def _collect_translations(cls, values):
+        return localisation.collect_translations(
+            values, localisation.STEP_TEXT_FIELDS)
+
+    @validator("translations")
+    def _check_translations(cls, translations):
+        return localisation.check_translations(translations)
+
+
+# this call is to handle the recursive nature of the ImportStep
+# model, which itself contains a list of ImportStep
+ImportStep.update_forward_refs()
+
+
+def build_import_steps(raw_steps):
+    # pydantic validates the nested "Steps" of a group recursively, so
+    # deeply nested groups are built here from a work list instead, each
+    # step is validated without its "Steps" which are filled in afterwards
+    if not isinstance(raw_steps, list):
+        return raw_steps
+    import_steps = []
+    pending = [(raw_steps, import_steps)]
+    while pending:
+        raw_list, built_list = pending.pop()
+        for raw_step in raw_list:
+            if not isinstance(raw_step, dict):
+                built_list.append(raw_step)
+                continue
+            import_step = ImportStep(
+                **{k: v for k, v in raw_step.items() if k != "steps"})
+            nested_steps = raw_step.get("steps")
+            if nested_steps is not None:
+                if not isinstance(nested_steps, list):
+                    raise ValueError(
+                        "Steps of step {0} must be a list".format(
+                            import_step.step_index))
+                import_step.steps = []
+                pending.append((nested_steps, import_step.steps))
+            built_list.append(import_step)
+    return import_steps
+
+
+class ImportWorkflow(CamelModel):
+    workflow_title: str
+    workflow_description: Optional[str] = ""
+    workflow_steps: List[ImportStep]
+    translations: Dict[str, Dict[str, str]] = {}
+
+    @root_validator(pre=True)
+    def _collect_translations(cls, values):
+        return localisation.collect_translations(
+            values, localisation.WORKFLOW_TEXT_FIELDS)
+
+    @validator("translations")
+    def _check_translations(cls, translations):
+        return localisation.check_translations(translations)
+
+    _build_workflow_steps = validator(
+        "workflow_steps", pre=True, allow_reuse=True)(build_import_steps)
+
+
+class ImportSubflow(CamelModel):
+    subflow_steps: List[ImportStep]
+
+    _build_subflow_steps = validator(
+        "subflow_steps", pre=True, allow_reuse=True)(build_import_steps)
+
+
+class StagedOverrides(CamelModel):
+    # changes made to a staged upload when a workflow is generated from it,
+    # step_config is keyed by the path of StepIndex values down to a step,
+    # e.g. "2/1" for step 1 of the group with StepIndex 2
+    workflow_title: Optional[str]
+    workflow_description: Optional[str]
+    translations: Optional[Dict[str, Dict[str, str]]]
+    step_config: Dict[str, dict] = {}
+
+    @root_validator(pre=True)
+    def _collect_translations(cls, values):
+        return localisation.collect_translations(
+            values, localisation.WORKFLOW_TEXT_FIELDS)
+
+    @validator("translations")
+    def _check_translations(cls, translations):
+        return localisation.check_translations(translations)
+
+
+class ImportCatalog(CamelModel):
+    options: List[str]
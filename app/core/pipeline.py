@@ -0,0 +1,100 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+from . import cancellation
+from . import memory
+from . import profiling
+from .localisation import LocalisedText
+from .compiled_workflow import compile_workflow
+from .workflow_generator import render_workflow_xml
+from .xml_writer import render_workflow_document
+from .zip_converter import construct_zip
+
+# "lxml" builds an element tree with the step classes and serialises it,
+# "bytes" writes the escaped xml directly, see xml_writer.py, the output
+# of the two is identical
+XML_BACKENDS = ("lxml", "bytes")
+
+_xml_backend = "lxml"
+
+
+def configure(xml_backend="lxml"):
+    global _xml_backend
+    if xml_backend not in XML_BACKENDS:
+        raise ValueError("xml_backend must be one of {0}".format(
+            ", ".join(XML_BACKENDS)))
+    _xml_backend = xml_backend
+
+
+def generate_workflow_zip(workflow_steps, workflow_title, workflow_description, workflow_translations=None, xml_backend=None,
+                          compact=False, prune_unreachable=False, report=None,
+                          with_index=False):
+    # compact output is only written by the bytes backend, see
+    # xml_writer._CompactDocumentWriter; if report is a dict the bytes saved
+    # by compact output, and with the bytes backend the size of the default
+    # locale's workflow.xml, are put in it
+    #
+    # with_index adds an index.json of where each step is in each
+    # workflow.xml, see zip_index.py, it also needs the bytes backend
+
+    if workflow_title is None:
+        workflow_title = "My Workflow"
+
+    if workflow_description is None:
+        workflow_description = ""
+
+    profiling.annotate_steps(workflow_steps)
+
+    # cancellation is checked between each stage as well as within them
+    cancellation.check()
+    with memory.stage("build"):
+        compiled = compile_workflow(
+            workflow_steps, workflow_title, workflow_description,
+            translations=workflow_translations
+        )
+
+    cancellation.check()
+    if compact or with_index or (xml_backend or _xml_backend) == "bytes":
+        step_spans = [] if with_index else None
+        with memory.stage("xml"):
+            workflow_document = render_workflow_document(
+                compiled, step_spans, compact=compact,
+                prune_unreachable=prune_unreachable, subflow_steps=True)
+        if report is not None:
+            report.update(
+                xml_bytes=workflow_document.size(),
+                bytes_saved=workflow_document.bytes_saved,
+                pruned_step_count=workflow_document.pruned_step_count,
+            )
+        cancellation.check()
+        return construct_zip(workflow_document, step_spans=step_spans)
+
+    # the workflow is built once whatever the number of locales,
+    # see localisation.LocalisedText
+    localised_text = LocalisedText()
+    with memory.stage("xml"):
+        workflow_xml = render_workflow_xml(compiled, localised_text)
+
+    if report is not None:
+        # the size isn't known until each locale is written into the zip
+        report.update(bytes_saved=0, pruned_step_count=0)
+    cancellation.check()
+    return construct_zip(
+        workflow_xml, localised_text
+    )
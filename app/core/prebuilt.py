@@ -0,0 +1,341 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# prebuilt workflows, a directory of definitions that are converted once
+# and then served by name, e.g. standard workflows requested over and over
+#
+# a definition is an ImportWorkflow as {name}.json, or the steps of one as
+# {name}.csv, which is given its name as the title; each is converted by
+# the normal pipeline when the directory is loaded, or when it is first
+# requested after its file has changed, which is noticed from the
+# modification time and size of the file, so no restart is needed
+#
+# every worker process holds the zips in memory, a cache directory shared
+# by the workers holds each zip by the hash of its definition so that the
+# first worker to convert it does so for all of them and they all serve
+# the same bytes, and so the same ETag, which ranged requests rely on; the
+# hash also covers the source of the core package and the subflows and
+# catalogs the definition refers to, so the cache, which outlives restarts,
+# is never used for a zip an upgraded generator would write differently
+#
+# a workflow is converted again when a subflow or catalog it refers to
+# has been registered again or removed, as well as when its definition
+# changes
+
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+
+import lxml.etree as et
+
+from . import catalogs
+from . import subflows
+from . import zip_converter
+from .csv_to_import_steps import read_csv_steps, convert_csv_to_import_steps
+from .exceptions import (
+    CatalogNotFound,
+    PrebuiltWorkflowNotFound,
+    SubflowNotFound,
+    WorkflowGeneratorError,
+    WorkflowValidationError,
+)
+from .models import ImportWorkflow, StepType
+from .pipeline import generate_workflow_zip
+
+DEFINITION_EXTENSIONS = (".json", ".csv")
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def _source_digest():
+    # the source of the core package, which decides the bytes of each zip
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".py"):
+            with open(os.path.join(directory, filename), "rb") as f:
+                digest.update(filename.encode("utf-8") + b"\0" + f.read() + b"\0")
+    return digest.digest()
+
+
+_SOURCE_DIGEST = _source_digest()
+
+_directory = None
+_cache_directory = None
+_workflows = {}
+_lock = threading.Lock()
+
+
+class PrebuiltWorkflow():
+
+    def __init__(self, name, filename, signature, zip_bytes=None, error=None,
+                 dependencies=()):
+        # signature is the modification time and size of the definition,
+        # error is why it couldn't be converted, in which case there is no
+        # zip, and dependencies the subflows and catalogs it refers to
+        self.name = name
+        self.filename = filename
+        self.signature = signature
+        self.dependencies = dependencies
+        self.zip_bytes = zip_bytes
+        self.error = error
+        self.etag = '"{0}"'.format(hashlib.sha256(zip_bytes).hexdigest()) \
+            if zip_bytes is not None else None
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "filename": self.filename,
+            "size": len(self.zip_bytes) if self.zip_bytes is not None else None,
+            "etag": self.etag,
+            "error": self.error,
+        }
+
+
+def configure(directory=None, cache_directory=None):
+    global _directory, _cache_directory
+    if cache_directory:
+        os.makedirs(cache_directory, exist_ok=True)
+    with _lock:
+        _directory = directory
+        _cache_directory = cache_directory
+        _workflows.clear()
+
+
+def _definition_names():
+    if not _directory or not os.path.isdir(_directory):
+        return []
+    return sorted(set(
+        os.path.splitext(z)[0] for z in os.listdir(_directory)
+        if os.path.splitext(z)[1] in DEFINITION_EXTENSIONS
+        and _NAME_PATTERN.match(os.path.splitext(z)[0])
+    ))
+
+
+def _definition_path(name):
+    # the json definition is used if there is both a json and a csv
+    if not _directory or not _NAME_PATTERN.match(name):
+        return None
+    for extension in DEFINITION_EXTENSIONS:
+        path = os.path.join(_directory, name + extension)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _parse(name, path, definition):
+    # the steps, title, description and translations of a definition
+    if path.endswith(".json"):
+        workflow = ImportWorkflow.parse_raw(definition)
+        return (workflow.workflow_steps, workflow.workflow_title,
+                workflow.workflow_description, workflow.translations)
+    return (convert_csv_to_import_steps(read_csv_steps(io.BytesIO(definition))),
+            name, "", None)
+
+
+def _fragment(get_fragment, name):
+    try:
+        return get_fragment(name)
+    except (SubflowNotFound, CatalogNotFound, WorkflowValidationError):
+        return None
+
+
+def _dependencies(import_steps):
+    # the subflows and catalogs the steps refer to, as (kind, name, fragment)
+    # with None for those that don't exist, the groups are walked with a
+    # work list as they may be nested deeply
+    subflow_names = set()
+    catalog_names = set()
+    remaining = list(import_steps)
+    while remaining:
+        import_step = remaining.pop()
+        config = import_step.config or {}
+        if import_step.step_type == StepType.group:
+            if config.get("include"):
+                subflow_names.add(config.get("include"))
+            elif import_step.steps:
+                remaining.extend(import_step.steps)
+        elif import_step.step_type == StepType.selection and not bool(config.get("dynamic")):
+            catalog_name = catalogs.catalog_reference(import_step.selection_options)
+            if catalog_name is not None:
+                catalog_names.add(catalog_name)
+    return tuple(
+        [("subflow", z, _fragment(subflows.get_subflow, z)) for z in sorted(subflow_names)]
+        + [("catalog", z, _fragment(catalogs.get_catalog, z)) for z in sorted(catalog_names)]
+    )
+
+
+def _dependencies_unchanged(dependencies):
+    # the fragment stores hand back the same object until a fragment is
+    # registered again, removed, or changed by another worker
+    get_fragment = {"subflow": subflows.get_subflow, "catalog": catalogs.get_catalog}
+    return all(
+        _fragment(get_fragment[kind], name) is fragment
+        for kind, name, fragment in dependencies
+    )
+
+
+def _dependencies_digest(dependencies):
+    parts = []
+    for kind, name, fragment in dependencies:
+        if fragment is None:
+            xml_digest = b"missing"
+        else:
+            xml = fragment.steps_xml if kind == "subflow" else fragment.choices_xml
+            xml_digest = hashlib.sha256(et.tostring(xml)).digest()
+        parts.append(kind.encode("utf-8") + b":" + name.encode("utf-8") + b":" + xml_digest)
+    return b"\0".join(parts)
+
+
+def _convert(parsed):
+    import_steps, title, description, translations = parsed
+    zip_buffer = generate_workflow_zip(import_steps, title, description, translations)
+    return b"".join(zip_converter.iter_chunks(zip_buffer))
+
+
+def _store_cached_zip(cached_path, zip_bytes):
+    # the zip is linked into place so it is never seen partly written, and
+    # the first worker to convert it wins; without hard links, e.g. on some
+    # network file systems, it is moved into place unless it is already
+    # there, so two workers converting it at the same moment may each keep
+    # their own bytes until one of them restarts
+    fd, temp_path = tempfile.mkstemp(dir=_cache_directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(zip_bytes)
+        try:
+            os.link(temp_path, cached_path)
+        except FileExistsError:
+            raise
+        except OSError:
+            if os.path.exists(cached_path):
+                raise FileExistsError(cached_path)
+            os.replace(temp_path, cached_path)
+    except FileExistsError:
+        with open(cached_path, "rb") as f:
+            zip_bytes = f.read()
+    finally:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+    return zip_bytes
+
+
+def _cached_zip(name, path, definition, parsed, dependencies):
+    # converted by whichever worker gets there first
+    if not _cache_directory:
+        return _convert(parsed)
+
+    digest = hashlib.sha256(
+        _SOURCE_DIGEST + os.path.basename(path).encode("utf-8") + b"\0" + definition
+        + b"\0" + _dependencies_digest(dependencies)).hexdigest()
+    cached_path = os.path.join(_cache_directory, "{0}.{1}.zip".format(name, digest))
+    try:
+        with open(cached_path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    zip_bytes = _store_cached_zip(cached_path, _convert(parsed))
+
+    # zips of earlier versions of the definition
+    prefix = name + "."
+    for filename in os.listdir(_cache_directory):
+        if filename.startswith(prefix) and filename.endswith(".zip") \
+                and filename[len(prefix):-len(".zip")] != digest \
+                and "." not in filename[len(prefix):-len(".zip")]:
+            try:
+                os.remove(os.path.join(_cache_directory, filename))
+            except FileNotFoundError:
+                pass
+    return zip_bytes
+
+
+def _refresh(name):
+    # the workflow as its definition now stands, converting it if the
+    # definition, or a subflow or catalog it refers to, is new or has
+    # changed, None if there is no definition
+    path = _definition_path(name)
+    if path is None:
+        with _lock:
+            _workflows.pop(name, None)
+        return None
+    try:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        workflow = _workflows.get(name)
+    if workflow is not None and workflow.signature == signature \
+            and workflow.filename == os.path.basename(path) \
+            and _dependencies_unchanged(workflow.dependencies):
+        return workflow
+
+    dependencies = ()
+    try:
+        with open(path, "rb") as f:
+            definition = f.read()
+        parsed = _parse(name, path, definition)
+        dependencies = _dependencies(parsed[0])
+        workflow = PrebuiltWorkflow(
+            name, os.path.basename(path), signature,
+            zip_bytes=_cached_zip(name, path, definition, parsed, dependencies),
+            dependencies=dependencies)
+    except FileNotFoundError:
+        return None
+    except WorkflowGeneratorError as e:
+        workflow = PrebuiltWorkflow(name, os.path.basename(path), signature,
+                                    error=e.detail, dependencies=dependencies)
+    except Exception as e:
+        # e.g. invalid json, a definition that can't be converted for any
+        # reason is reported rather than stopping the others being loaded
+        workflow = PrebuiltWorkflow(name, os.path.basename(path), signature,
+                                    error=str(e), dependencies=dependencies)
+    with _lock:
+        _workflows[name] = workflow
+    return workflow
+
+
+def load_prebuilt():
+    # converts every definition that is new or has changed and forgets
+    # those that have been removed
+    names = _definition_names()
+    with _lock:
+        for name in set(_workflows) - set(names):
+            del _workflows[name]
+    return [z for z in (_refresh(name) for name in names) if z is not None]
+
+
+def get_prebuilt(name):
+    workflow = _refresh(name)
+    if workflow is None:
+        raise PrebuiltWorkflowNotFound("No prebuilt workflow named {0}".format(name))
+    if workflow.error is not None:
+        raise WorkflowValidationError(
+            "Prebuilt workflow {0} could not be converted: {1}".format(name, workflow.error))
+    return workflow
+
+
+def list_prebuilt():
+    return [z.summary() for z in load_prebuilt()]
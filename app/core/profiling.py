@@ -0,0 +1,210 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# on demand profiling of a single conversion, a flagged request is run
+# under cProfile and the profile is written to the profile directory
+# alongside a json file of metadata, i.e. the step count and the stage
+# timings recorded through memory.stage()
+#
+# requests that aren't flagged never reach capture() so don't pay for it,
+# annotate_steps() is a no-op unless a capture is running on the thread
+
+from contextlib import contextmanager
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+from .exceptions import ProfileNotFound, ProfilerBusy
+
+_ID_PATTERN = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+_directory = os.path.join(tempfile.gettempdir(), "workflow_profiles")
+_history = 20
+
+# only one request is profiled at a time, a profiler sees every call made
+# on its thread and on newer pythons only one can be active in the process
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def configure(directory=None, history=20):
+    global _directory, _history
+    if directory:
+        _directory = directory
+    _history = history
+
+
+def _path(profile_id, extension):
+    if not _ID_PATTERN.match(profile_id):
+        raise ProfileNotFound("No profile with id {0}".format(profile_id))
+    return os.path.join(_directory, profile_id + extension)
+
+
+def _write_atomic(path, data):
+    # other workers may list the directory while the files are written
+    fd, temp_path = tempfile.mkstemp(dir=_directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class ProfileCapture():
+
+    def __init__(self, name):
+        # ids sort in the order the profiles were started
+        self.profile_id = "{0}-{1}".format(
+            int(time.time() * 1000000), uuid.uuid4().hex[:8])
+        self.metadata = {
+            "id": self.profile_id,
+            "request": name,
+            "started_at": time.time(),
+            "duration_ms": None,
+            "step_count": None,
+            "group_count": None,
+            "stages": [],
+            "error": None,
+        }
+        self.profile = cProfile.Profile()
+
+    def save(self):
+        os.makedirs(_directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=_directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            self.profile.dump_stats(temp_path)
+            os.replace(temp_path, _path(self.profile_id, ".prof"))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        # the metadata is written last, a profile is only listed once it has one
+        _write_atomic(
+            _path(self.profile_id, ".json"),
+            json.dumps(self.metadata, indent=2).encode("utf-8")
+        )
+        _prune()
+
+
+def current_capture():
+    return getattr(_local, "capture", None)
+
+
+@contextmanager
+def capture(name, tracker=None):
+    # tracker is the memory.RequestMemoryTracker of the request, the
+    # duration of each of its stages is recorded in the metadata
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusy("Another request is already being profiled")
+    try:
+        profile_capture = ProfileCapture(name)
+        _local.capture = profile_capture
+        start = time.perf_counter()
+        profile_capture.profile.enable()
+        try:
+            yield profile_capture
+        except Exception as e:
+            profile_capture.metadata["error"] = "{0}: {1}".format(
+                type(e).__name__, getattr(e, "detail", e))
+            raise
+        finally:
+            profile_capture.profile.disable()
+            _local.capture = None
+            metadata = profile_capture.metadata
+            metadata["duration_ms"] = (time.perf_counter() - start) * 1000
+            if tracker is not None:
+                metadata["stages"] = [
+                    {"stage": z["stage"], "duration_ms": z["duration_ms"]}
+                    for z in tracker.stages
+                ]
+            profile_capture.save()
+    finally:
+        _lock.release()
+
+
+def annotate_steps(import_steps):
+    # records the number of steps and groups being converted
+    profile_capture = current_capture()
+    if profile_capture is None:
+        return
+    step_count = group_count = 0
+    pending = [import_steps]
+    while pending:
+        for import_step in pending.pop():
+            step_count += 1
+            if import_step.steps:
+                group_count += 1
+                pending.append(import_step.steps)
+    profile_capture.metadata["step_count"] = step_count
+    profile_capture.metadata["group_count"] = group_count
+
+
+def list_profiles():
+    # the metadata of every stored profile, newest first
+    try:
+        names = os.listdir(_directory)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in sorted(names, reverse=True):
+        profile_id, extension = os.path.splitext(name)
+        if extension != ".json" or not _ID_PATTERN.match(profile_id):
+            continue
+        try:
+            with open(os.path.join(_directory, name), "rb") as f:
+                profiles.append(json.loads(f.read().decode("utf-8")))
+        except (OSError, ValueError):
+            # removed by another worker or not a profile
+            continue
+    return profiles
+
+
+def _prune():
+    for metadata in list_profiles()[_history:]:
+        for extension in (".json", ".prof"):
+            try:
+                os.remove(_path(metadata["id"], extension))
+            except FileNotFoundError:
+                pass
+
+
+def profile_path(profile_id):
+    # the path of the pstats file, as written by cProfile
+    path = _path(profile_id, ".prof")
+    if not os.path.exists(path) or not os.path.exists(_path(profile_id, ".json")):
+        raise ProfileNotFound("No profile with id {0}".format(profile_id))
+    return path
+
+
+def profile_summary(profile_id, sort="cumulative", limit=40):
+    # the pstats report of the functions with the highest cost
+    if sort not in ("cumulative", "tottime", "ncalls"):
+        sort = "cumulative"
+    out = io.StringIO()
+    stats = pstats.Stats(profile_path(profile_id), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,257 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# staged uploads, the steps of an upload are parsed and validated once and
+# kept under a handle for a limited time, so that a workflow can be
+# generated from them again and again with different overrides without
+# reading the csv each time
+#
+# the step tree is stored as a flat list of steps, each with the position
+# of its parent, serialised as json and compressed; a staged upload is
+# turned back into new ImportStep objects on every use without running the
+# pydantic validation again, so overrides never affect the stored steps
+#
+# if a directory has been configured staged uploads are written to it, so
+# that every worker process on the host can generate from any handle
+
+import json
+import os
+import re
+import secrets
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+from . import compiled_workflow
+from .exceptions import StagedUploadNotFound, WorkflowValidationError
+from .models import DecisionPath, ImportStep, StepType
+
+DEFAULT_TTL_SECONDS = 3600
+
+_HANDLE_PATTERN = re.compile(r"^[A-Za-z0-9_-]{22}$")
+_FORMAT_VERSION = 1
+# the expiry time, as a big endian double, comes before the compressed steps
+_HEADER = struct.Struct(">d")
+
+_directory = None
+_ttl_seconds = DEFAULT_TTL_SECONDS
+_staged = {}
+_lock = threading.Lock()
+
+
+def configure(directory=None, ttl_seconds=DEFAULT_TTL_SECONDS):
+    global _directory, _ttl_seconds
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _lock:
+        _directory = directory
+        _ttl_seconds = ttl_seconds
+        _staged.clear()
+
+
+class StagedUpload():
+
+    def __init__(self, handle, expires_at, workflow_title, workflow_description,
+                 translations, import_steps):
+        self.handle = handle
+        self.expires_at = expires_at
+        self.workflow_title = workflow_title
+        self.workflow_description = workflow_description
+        self.translations = translations
+        self.import_steps = import_steps
+
+
+def _encode(workflow_title, workflow_description, translations, import_steps):
+    # the steps are listed parents first, each with the position of its
+    # parent, so deep nesting needs neither recursion nor nested json
+    steps = []
+    pending = [(import_steps, None)]
+    while pending:
+        group_steps, parent = pending.pop()
+        for import_step in group_steps:
+            step = import_step.dict(exclude={"steps"}, exclude_defaults=True)
+            step["parent"] = parent
+            if import_step.steps is not None:
+                step["group"] = True
+                pending.append((import_step.steps, len(steps)))
+            steps.append(step)
+    return zlib.compress(json.dumps({
+        "version": _FORMAT_VERSION,
+        "workflow_title": workflow_title,
+        "workflow_description": workflow_description,
+        "translations": translations,
+        "steps": steps,
+    }, separators=(",", ":")).encode("utf-8"))
+
+
+def _decode(handle, expires_at, data):
+    payload = json.loads(zlib.decompress(data).decode("utf-8"))
+    import_steps = []
+    built = []
+    for step in payload["steps"]:
+        parent = step.pop("parent")
+        is_group = step.pop("group", False)
+        if "step_type" in step:
+            step["step_type"] = StepType(step["step_type"])
+        if step.get("decision_paths") is not None:
+            step["decision_paths"] = [
+                DecisionPath.construct(**z) for z in step["decision_paths"]
+            ]
+        # the steps were validated when they were staged
+        import_step = ImportStep.construct(**step)
+        if is_group:
+            import_step.steps = []
+        (import_steps if parent is None else built[parent].steps).append(import_step)
+        built.append(import_step)
+    return StagedUpload(
+        handle, expires_at, payload["workflow_title"],
+        payload["workflow_description"], payload["translations"], import_steps
+    )
+
+
+def _path(handle):
+    return os.path.join(_directory, handle + ".staged")
+
+
+def _not_found(handle):
+    return StagedUploadNotFound(
+        "No staged upload {0}, it may have expired".format(handle))
+
+
+def _remove_expired(now):
+    for handle, (expires_at, _) in list(_staged.items()):
+        if expires_at <= now:
+            del _staged[handle]
+    if not _directory:
+        return
+    for name in os.listdir(_directory):
+        if not name.endswith(".staged"):
+            continue
+        try:
+            with open(os.path.join(_directory, name), "rb") as f:
+                expires_at, = _HEADER.unpack(f.read(_HEADER.size))
+            if expires_at <= now:
+                os.remove(os.path.join(_directory, name))
+        except (OSError, struct.error):
+            # removed by another worker
+            continue
+
+
+def stage_upload(import_steps, workflow_title=None, workflow_description=None,
+                 translations=None):
+    # the steps are compiled once so that an invalid upload is rejected
+    # now rather than each time it is generated
+    compiled_workflow.compile_workflow(
+        import_steps, workflow_title, workflow_description, translations)
+
+    data = _encode(
+        workflow_title, workflow_description, translations or {}, import_steps)
+    handle = secrets.token_urlsafe(16)
+    now = time.time()
+    expires_at = now + _ttl_seconds
+    with _lock:
+        _remove_expired(now)
+        if _directory:
+            # write to a temporary file first so other workers
+            # never read a partially written upload
+            fd, temp_path = tempfile.mkstemp(dir=_directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(_HEADER.pack(expires_at) + data)
+                os.replace(temp_path, _path(handle))
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        else:
+            _staged[handle] = (expires_at, data)
+    return StagedUpload(
+        handle, expires_at, workflow_title, workflow_description,
+        translations or {}, import_steps
+    )
+
+
+def get_staged_upload(handle):
+    # a new copy of the staged steps, safe to modify
+    if not _HANDLE_PATTERN.match(handle):
+        raise _not_found(handle)
+    with _lock:
+        if _directory:
+            try:
+                with open(_path(handle), "rb") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                raise _not_found(handle)
+            expires_at, = _HEADER.unpack(content[:_HEADER.size])
+            data = content[_HEADER.size:]
+        else:
+            if handle not in _staged:
+                raise _not_found(handle)
+            expires_at, data = _staged[handle]
+    if expires_at <= time.time():
+        raise _not_found(handle)
+    return _decode(handle, expires_at, data)
+
+
+def remove_staged_upload(handle):
+    if not _HANDLE_PATTERN.match(handle):
+        raise _not_found(handle)
+    with _lock:
+        found = _staged.pop(handle, None) is not None
+        if _directory:
+            try:
+                os.remove(_path(handle))
+                found = True
+            except FileNotFoundError:
+                pass
+    if not found:
+        raise _not_found(handle)
+
+
+def apply_step_config(import_steps, step_config):
+    # step_config maps the path of StepIndex values down to a step, e.g.
+    # "2/1" for step 1 of the group with StepIndex 2, to config values
+    # that replace those of the step
+    for path, config in step_config.items():
+        group_steps = import_steps
+        import_step = None
+        for part in str(path).split("/"):
+            try:
+                step_index = int(part)
+            except ValueError:
+                raise WorkflowValidationError(
+                    "{0} is not a path of StepIndex values, e.g. 2/1".format(path))
+            import_step = next(
+                (z for z in group_steps or () if z.step_index == step_index), None)
+            if import_step is None:
+                raise WorkflowValidationError("No step at {0}".format(path))
+            group_steps = import_step.steps
+        import_step.config = dict(import_step.config, **config)
+
+
+def count_steps(import_steps):
+    # the number of steps, including those in groups
+    step_count = 0
+    pending = [import_steps]
+    while pending:
+        for import_step in pending.pop():
+            step_count += 1
+            if import_step.steps:
+                pending.append(import_step.steps)
+    return step_count
@@ -0,0 +1,87 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# a library of reusable subflows, a subflow is a list of ImportStep that is
+# compiled once into the "Steps" xml of a group and then spliced into any
+# group step whose config includes it, e.g. "Include:safety-v3"
+
+import copy
+import uuid
+
+from . import compiled_workflow
+from . import workflow_generator
+from .exceptions import WorkflowValidationError, SubflowNotFound
+from .fragment_store import FragmentStore
+
+
+class Subflow():
+
+    def __init__(self, name, steps_xml, modified=None):
+        self.name = name
+        self.steps_xml = steps_xml
+        self.modified = modified
+        self.step_count = sum(1 for _ in steps_xml.iter("Step"))
+
+    def instantiate(self):
+        # copy the compiled fragment and give every step and connection a
+        # new id, so the same subflow can appear more than once in a workflow
+        steps_xml = copy.deepcopy(self.steps_xml)
+        new_ids = {}
+        for element in steps_xml.iter("Base", "Connection"):
+            for attribute in ("ID", "Source", "Sink"):
+                old_id = element.get(attribute)
+                if old_id is None:
+                    continue
+                new_id = new_ids.get(old_id)
+                if new_id is None:
+                    new_id = new_ids[old_id] = str(uuid.uuid4())
+                element.set(attribute, new_id)
+        return steps_xml
+
+
+_store = FragmentStore("subflow", Subflow, SubflowNotFound)
+
+
+def configure(directory=None):
+    _store.configure(directory)
+
+
+def compile_subflow(import_steps):
+    return workflow_generator.render_steps_xml(
+        compiled_workflow.compile_group(import_steps))
+
+
+def register_subflow(name, import_steps):
+    _store.check_name(name)
+    if not import_steps:
+        raise WorkflowValidationError("A subflow must contain at least one step")
+    return _store.put(name, compile_subflow(import_steps))
+
+
+def get_subflow(name):
+    return _store.get(name)
+
+
+def remove_subflow(name):
+    _store.remove(name)
+
+
+def list_subflows():
+    return [
+        {"name": z.name, "step_count": z.step_count} for z in _store.all()
+    ]
@@ -0,0 +1,317 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+import lxml.etree as et
+from datetime import datetime
+
+from . import cancellation
+from . import compiled_workflow
+from . import memory
+from .models import StepType
+
+
+def append_element(xml, tag, text):
+    new_element = et.SubElement(xml, tag)
+    new_element.text = text
+    return new_element
+
+
+def add_localised_text(localised_text, step_xml, translations):
+    # records the title and description of a step that has translations
+    if localised_text is None or not translations:
+        return
+    base_xml = step_xml.find("Base")
+    localised_text.add(base_xml.find("Title"), "title", translations)
+    localised_text.add(base_xml.find("Description"), "description", translations)
+
+
+def flatten_to_list(list_of_lists):
+    return [
+        item for sublist in list_of_lists for item in sublist if bool(item)
+    ]
+
+
+def render_steps_xml(compiled_group, localised_text=None):
+    # this calls the construct_xml method of the renderer of each step
+    # the xml for all of the steps sits within an xml element called "Steps"
+    # if localised_text is given the text of any translated steps is
+    # recorded in it, see localisation.LocalisedText
+    # nested groups are walked with an explicit stack of the groups
+    # being serialised rather than through GroupStep.construct_xml
+    steps_xml = et.Element("Steps")
+    stack = [(steps_xml, enumerate(compiled_group.steps))]
+    while stack:
+        parent_xml, remaining_steps = stack[-1]
+        for i, step in remaining_steps:
+            memory.checkpoint()
+            cancellation.checkpoint()
+            renderer = STEP_RENDERERS[step.step_type]
+            if step.group is not None:
+                step_xml = renderer.construct_group_xml(step, i, parent_xml)
+                add_localised_text(localised_text, step_xml, step.translations)
+                stack.append((
+                    et.SubElement(step_xml, "Steps"),
+                    enumerate(step.group.steps)
+                ))
+                break
+            step_xml = renderer.construct_xml(step, i, parent_xml)
+            add_localised_text(localised_text, step_xml, step.translations)
+        else:
+            stack.pop()
+    return steps_xml
+
+
+def render_workflow_xml(compiled, localised_text=None):
+    # renders the steps and then adds all of the other
+    # information required at the workflow level
+    steps_xml = render_steps_xml(compiled.group, localised_text)
+    workflow_xml = et.Element("Procedure", IsReport="false")
+    append_element(workflow_xml, "ID", compiled.workflow_id)
+    title_xml = append_element(workflow_xml, "Title", compiled.title)
+    description_xml = append_element(
+        workflow_xml, "Description", compiled.description)
+    if localised_text is not None:
+        localised_text.add(title_xml, "title", compiled.translations)
+        localised_text.add(
+            description_xml, "description", compiled.translations)
+    append_element(workflow_xml, "DocVersion", "")
+    append_element(workflow_xml, "Version", "")
+    append_element(workflow_xml, "Author", "")
+    append_element(workflow_xml, "Metadata", "")
+    append_element(workflow_xml, "Interlocked", "false")
+    et.SubElement(workflow_xml, "Report", Export="false")
+    append_element(workflow_xml, "DateModified",
+                   datetime.now().isoformat())
+    capabilities_xml = et.Element("Capabilities")
+    capabilities = ["Default", "Freeform", "Form", "FileInput", "PDFAsset"]
+    for capability in capabilities:
+        append_element(capabilities_xml, "Capability", capability)
+    workflow_xml.append(capabilities_xml)
+    workflow_xml.append(steps_xml)
+    return workflow_xml
+
+
+class StepGroup():
+
+    def __init__(self, import_steps, title, description):
+        # the steps are compiled once, see compiled_workflow.py,
+        # import_steps itself is left unchanged
+        self.compiled = compiled_workflow.compile_group(import_steps, title, description)
+        self.title = self.compiled.title
+        self.description = self.compiled.description
+
+    def return_xml(self, localised_text=None):
+        return render_steps_xml(self.compiled, localised_text)
+
+
+class Workflow(StepGroup):
+
+    def __init__(self, import_steps, title, description, translations=None):
+        self.compiled = compiled_workflow.compile_workflow(
+            import_steps, title, description, translations)
+        self.workflow_id = self.compiled.workflow_id
+        self.title = self.compiled.title
+        self.description = self.compiled.description
+
+    def return_xml(self, localised_text=None):
+        return render_workflow_xml(self.compiled, localised_text)
+
+
+class BaseStep():
+    # the step classes render a compiled_workflow.CompiledStep, they hold
+    # no state of their own so one instance of each is shared by every step
+    step_type = "ConfirmStep"
+
+    def _connections_element(self, connections_xml, connection_object):
+        result = et.SubElement(
+            connections_xml,
+            "Connection",
+            Type=connection_object.connection_type,
+            ID=connection_object.connection_id,
+            Source=connection_object.source,
+            Sink=connection_object.sink
+        )
+        return result
+
+    def _connection_anchors_element(self, connections_xml, connection_object):
+        result = et.SubElement(
+            connections_xml,
+            "Connection",
+            ID=connection_object.connection_id,
+            Anchor="Bottom|Top"
+        )
+        return result
+
+    def _construct_connections_xml(self, parent_xml, connections):
+        connections_xml = et.SubElement(parent_xml, "Connections")
+        for step_connection in connections:
+            self._connections_element(connections_xml, step_connection)
+        return connections_xml
+
+    def _construct_connection_anchors_xml(self, parent_xml, connections):
+        connections_xml = et.SubElement(parent_xml, "ConnectionAnchors")
+        for step_connection in connections:
+            self._connection_anchors_element(connections_xml, step_connection)
+        return connections_xml
+
+    def construct_xml(self, step, step_number, parent_xml=None):
+        # the step is built in place under parent_xml if given, elements
+        # are created with SubElement throughout as appending an element
+        # deep in a tree costs lxml a walk up to the root
+        if parent_xml is None:
+            step_xml = et.Element("Step", Type=self.step_type)
+        else:
+            step_xml = et.SubElement(parent_xml, "Step", Type=self.step_type)
+        base_xml = et.SubElement(step_xml, "Base", ID=step.step_id)
+        append_element(base_xml, "Title", step.title)
+        append_element(base_xml, "Description", step.description)
+        if step.step_tag:
+            append_element(base_xml, "Tag", step.step_tag)
+        if step.connections:
+            self._construct_connections_xml(base_xml, step.connections)
+        designer_xml = et.SubElement(base_xml, "DesignerData")
+        append_element(designer_xml, "Position",
+                       "50," + str((1 + step_number) * 100))
+        append_element(designer_xml, "Size", "0,0")
+        if step.connections:
+            self._construct_connection_anchors_xml(
+                designer_xml, step.connections)
+        return step_xml
+
+
+class StartStep(BaseStep):
+    step_type = "StartStep"
+
+
+class TerminatorStep(BaseStep):
+    step_type = "TerminateGroupStep"
+
+
+class DecisionStep(BaseStep):
+    step_type = "DecisionStep"
+
+
+def _optional(step):
+    optional = step.config.get("optional")
+    return str(optional if optional is not None else "False").lower()
+
+
+class InputStep(BaseStep):
+    step_type = "InputStep"
+
+    def __init__(self, input_type):
+        self.input_type = str(input_type)
+
+    def construct_xml(self, step, step_number, parent_xml=None):
+        step_xml = super().construct_xml(step, step_number, parent_xml)
+        append_element(step_xml, "InputType", self.input_type)
+        append_element(step_xml, "IsOptional", _optional(step))
+        ip_element = et.SubElement(step_xml, "InputParameter")
+        constraint_element = et.SubElement(ip_element, "Constraint")
+        append_element(constraint_element, "ConstraintType", "None")
+        return step_xml
+
+
+class DateTimeStep(BaseStep):
+    step_type = "InputStep"
+    input_type = "DateTime"
+
+    def construct_xml(self, step, step_number, parent_xml=None):
+        step_xml = super().construct_xml(step, step_number, parent_xml)
+        append_element(step_xml, "InputType", self.input_type)
+        append_element(step_xml, "IsOptional", _optional(step))
+        ip_element = et.SubElement(step_xml, "InputParameter")
+        constraint_element = et.SubElement(ip_element, "Constraint")
+        append_element(constraint_element, "DisplayDate", "true")
+        append_element(constraint_element, "DisplayTime", "true")
+        return step_xml
+
+
+class SelectionStep(BaseStep):
+    step_type = "InputStep"
+    input_type = "Selection"
+
+    def construct_xml(self, step, step_number, parent_xml=None):
+        dynamic = step.config.get("dynamic")
+        fixed = step.config.get("fixed")
+        multi = step.config.get("multi")
+        fixed = fixed if fixed is not None else "true"
+        multi = multi if multi is not None else "false"
+
+        step_xml = super().construct_xml(step, step_number, parent_xml)
+        append_element(step_xml, "InputType", self.input_type)
+        append_element(step_xml, "IsOptional", _optional(step))
+        if bool(dynamic):
+            append_element(step_xml, "DynamicUrl", step.choices[0])
+        ip_element = et.SubElement(step_xml, "InputParameter")
+        constraint_element = et.SubElement(ip_element, "Constraint")
+        if bool(dynamic):
+            et.SubElement(constraint_element, "Choices")
+        elif step.catalog is not None:
+            constraint_element.append(step.catalog.instantiate())
+        else:
+            choice_element = et.SubElement(constraint_element, "Choices")
+            for choice in step.choices:
+                append_element(choice_element, "Choice", choice.strip())
+        append_element(constraint_element,
+                       "FixedMode", str(fixed).lower())
+        append_element(constraint_element, "MinSelection", "1")
+        max_selection = "1" if multi == "false" else str(
+            step.catalog.option_count if step.catalog is not None
+            else len(step.choices))
+        append_element(constraint_element,
+                       "MaxSelection", max_selection)
+        return step_xml
+
+
+class GroupStep(BaseStep):
+    step_type = "GroupStep"
+
+    def construct_group_xml(self, step, step_number, parent_xml=None):
+        # the xml for the group step without its "Steps" element
+        is_form = step.config.get("form")
+        step_xml = super().construct_xml(step, step_number, parent_xml)
+        step_xml.attrib["IsReport"] = str(
+            is_form if is_form is not None else "false").lower()
+        return step_xml
+
+    def construct_xml(self, step, step_number, parent_xml=None):
+        step_xml = self.construct_group_xml(step, step_number, parent_xml)
+        if step.subflow is not None:
+            steps_xml = step.subflow.instantiate()
+        else:
+            steps_xml = render_steps_xml(step.group)
+        step_xml.append(steps_xml)
+        return step_xml
+
+
+STEP_RENDERERS = {
+    StepType.instruction: BaseStep(),
+    StepType.text: InputStep("Text"),
+    StepType.numeric: InputStep("Numeric"),
+    StepType.photo: InputStep("Photo"),
+    StepType.video: InputStep("Video"),
+    StepType.signature: InputStep("Signature"),
+    StepType.barcode: InputStep("Barcode"),
+    StepType.datetime: DateTimeStep(),
+    StepType.selection: SelectionStep(),
+    StepType.decision: DecisionStep(),
+    StepType.group: GroupStep(),
+    StepType.start: StartStep(),
+    StepType.end: TerminatorStep(),
+}
@@ -0,0 +1,655 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# the "bytes" xml backend, writes a compiled workflow straight out as the
+# escaped bytes of the pretty printed xml without building an element tree
+#
+# the output is byte for byte what the lxml backend, i.e. the step classes
+# in workflow_generator.py followed by ElementTree.write(pretty_print=True),
+# produces, so any change to the xml of a step has to be made in both;
+# tests/test_xml_writer.py checks the two against each other
+#
+# text that has translations is left as a slot in the document and filled
+# in as each locale is written, so the workflow is rendered once whatever
+# the number of locales, as with localisation.LocalisedText
+#
+# the compact output, from _CompactDocumentWriter, is the same document
+# without the indentation and line breaks and without the elements in
+# COMPACT_OMITTED, it can also leave out the steps that can't be reached
+# from the start step of their group; the writer counts the bytes the
+# pretty printed document would have had so the saving can be reported
+
+from collections import namedtuple
+from datetime import datetime
+import re
+import time
+
+from . import cancellation
+from . import memory
+from .compiled_workflow import CompiledGroup, reachable_step_ids
+from .models import StepType
+
+CAPABILITIES = ("Default", "Freeform", "Form", "FileInput", "PDFAsset")
+
+# the characters lxml refuses, it raises a ValueError for these too
+_INVALID_CHARACTERS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+_TEXT_ESCAPES = str.maketrans({
+    "&": "&amp;", "<": "&lt;", ">": "&gt;", "\r": "&#13;",
+})
+_ATTRIBUTE_ESCAPES = str.maketrans({
+    "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;",
+    "\n": "&#10;", "\t": "&#9;", "\r": "&#13;",
+})
+
+_INPUT_TYPES = {
+    StepType.text: b"Text",
+    StepType.numeric: b"Numeric",
+    StepType.photo: b"Photo",
+    StepType.video: b"Video",
+    StepType.signature: b"Signature",
+    StepType.barcode: b"Barcode",
+}
+_STEP_TYPES = {
+    StepType.start: b"StartStep",
+    StepType.end: b"TerminateGroupStep",
+    StepType.decision: b"DecisionStep",
+    StepType.group: b"GroupStep",
+    StepType.datetime: b"InputStep",
+    StepType.selection: b"InputStep",
+}
+_STEP_TYPES.update((z, b"InputStep") for z in _INPUT_TYPES)
+_INPUT_STEP_TYPES = set(_INPUT_TYPES) | {StepType.datetime, StepType.selection}
+# and back again, for the steps of an included subflow, see FragmentStep,
+# InputStep is told apart by its InputType
+_FRAGMENT_STEP_TYPES = {
+    v.decode("ascii"): k for k, v in _STEP_TYPES.items() if v != b"InputStep"
+}
+_FRAGMENT_STEP_TYPES["InputStep"] = None
+_FRAGMENT_INPUT_TYPES = {v.decode("ascii"): k for k, v in _INPUT_TYPES.items()}
+_FRAGMENT_INPUT_TYPES.update(DateTime=StepType.datetime, Selection=StepType.selection)
+
+_WRITE_CHUNK_SIZE = 2**20
+
+# libxml2 indents by at most 60 spaces, deeper elements line up at that
+_MAX_INDENT = b"  " * 30
+
+# the elements left out of compact output, all of them hold the value the
+# designer and devices use when the element is missing: the empty header
+# fields, an empty step description, the designer size of 0,0 and the
+# connection anchors, which are always Bottom|Top
+COMPACT_OMITTED = (
+    "DocVersion", "Version", "Author", "Metadata", "Description", "Size",
+    "ConnectionAnchors",
+)
+
+
+def _check(value):
+    if _INVALID_CHARACTERS.search(value):
+        raise ValueError(
+            "All strings must be XML compatible: Unicode or ASCII, "
+            "no NULL bytes or control characters")
+
+
+# most values are plain printable ascii and are only encoded
+_PLAIN = re.compile(r"[ !#-%'-;=?-~]*\Z")
+
+
+def escape_text(value):
+    if _PLAIN.match(value):
+        return value.encode("ascii")
+    _check(value)
+    return value.translate(_TEXT_ESCAPES).encode("ascii", "xmlcharrefreplace")
+
+
+def escape_attribute(value):
+    if _PLAIN.match(value):
+        return value.encode("ascii")
+    _check(value)
+    return value.translate(_ATTRIBUTE_ESCAPES).encode("ascii", "xmlcharrefreplace")
+
+
+class WorkflowDocument():
+    # the serialised workflow, a list of byte strings and slots for the
+    # translated text, (translations, field, default text)
+
+    def __init__(self, parts, locales, bytes_saved=0, pruned_step_count=0):
+        self.parts = parts
+        self._locales = locales
+        # for compact output, the bytes of the default locale's document
+        # saved against the pretty printed one and the steps left out
+        self.bytes_saved = bytes_saved
+        self.pruned_step_count = pruned_step_count
+
+    def locales(self):
+        return sorted(self._locales)
+
+    def write(self, f, locale=None):
+        for part in self.parts:
+            if isinstance(part, tuple):
+                translations, field, default_text = part
+                f.write(escape_text(
+                    translations.get(locale, {}).get(field, default_text)))
+                continue
+            # written in chunks so that the memory limit is checked as
+            # the zip grows, see zip_converter._CheckpointWriter
+            view = memoryview(part)
+            for start in range(0, len(view), _WRITE_CHUNK_SIZE):
+                f.write(view[start:start + _WRITE_CHUNK_SIZE])
+
+    def size(self, locale=None):
+        # the length of the document as written for the locale
+        return sum(
+            len(escape_text(z[0].get(locale, {}).get(z[1], z[2])))
+            if isinstance(z, tuple) else len(z)
+            for z in self.parts
+        )
+
+    def tobytes(self, locale=None):
+        out = _BytesOut()
+        self.write(out, locale)
+        return bytes(out.buf)
+
+
+class _BytesOut():
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def write(self, data):
+        self.buf += data
+
+
+class StepSpan():
+    # where a step was written in the default locale's document, spans are
+    # listed in document order and parent is the position of the span of
+    # the group step it is in, seconds is the time taken to write it and,
+    # for a group step, its steps
+    #
+    # a span covers the whole lines of the step, indent and line_end are
+    # the lengths of the whitespace before and after its Step element
+
+    def __init__(self, step, parent, depth, start, indent=0, line_end=0):
+        self.step = step
+        self.parent = parent
+        self.depth = depth
+        self.start = start
+        self.indent = indent
+        self.line_end = line_end
+        self.end = None
+        self.seconds = None
+        self._started = time.perf_counter()
+
+    def finish(self, end):
+        self.end = end
+        self.seconds = time.perf_counter() - self._started
+
+
+class FragmentStep(namedtuple(
+        "FragmentStep", ["step_id", "step_index", "step_tag", "step_type"])):
+    # a step of an included subflow, as much of it as can be read back
+    # from its compiled xml, which doesn't keep the StepIndex
+
+    @classmethod
+    def of(cls, step_xml):
+        base = step_xml.find("Base")
+        step_type = _FRAGMENT_STEP_TYPES.get(step_xml.get("Type"), StepType.instruction)
+        if step_type is None:
+            step_type = _FRAGMENT_INPUT_TYPES[step_xml.findtext("InputType")]
+        return cls(base.get("ID"), None, base.findtext("Tag"), step_type)
+
+
+class _DocumentWriter():
+
+    line_end_length = 1
+
+    def __init__(self):
+        self.parts = []
+        self.locales = set()
+        self.buf = bytearray()
+        # the length of the parts written so far, in the default locale
+        self._written = 0
+        self._indents = [_MAX_INDENT[:2 * z] for z in range(31)]
+        self._indent_runs = {}
+
+    def indent(self, depth):
+        return self._indents[depth] if depth < 31 else _MAX_INDENT
+
+    def indents(self, depth, count):
+        # the indents of count levels from depth, cached as every step
+        # at the same depth needs the same ones
+        key = (depth, count)
+        indents = self._indent_runs.get(key)
+        if indents is None:
+            indents = self._indent_runs[key] = tuple(
+                self.indent(depth + z) for z in range(count))
+        return indents
+
+    def start(self, depth, tag, attributes=b""):
+        self.buf += self.indent(depth) + b"<" + tag + attributes + b">\n"
+
+    def end(self, depth, tag):
+        self.buf += self.indent(depth) + b"</" + tag + b">\n"
+
+    def empty(self, depth, tag, attributes=b""):
+        self.buf += self.indent(depth) + b"<" + tag + attributes + b"/>\n"
+
+    def element(self, depth, tag, text):
+        # text is already escaped
+        self.buf += self.indent(depth) + b"<" + tag + b">" + text + b"</" + tag + b">\n"
+
+    def text_element(self, depth, tag, text):
+        self.element(depth, tag, escape_text(text))
+
+    def localised_element(self, depth, tag, text, field, translations):
+        if not translations:
+            self.text_element(depth, tag, text)
+            return
+        _check(text)
+        self.buf += self.indent(depth) + b"<" + tag + b">"
+        self._written += len(self.buf) + len(escape_text(text))
+        self.parts.append(self.buf)
+        self.parts.append((translations, field, text))
+        self.locales.update(translations)
+        self.buf = bytearray(b"</" + tag + b">\n")
+
+    def offset(self):
+        return self._written + len(self.buf)
+
+    def lxml_element(self, depth, element, step_spans=None, parent=None):
+        # a precompiled fragment such as a subflow or catalog, these are
+        # built by the step classes so never hold mixed content
+        #
+        # if step_spans is a list a StepSpan is added to it for every Step
+        # element, parent is the position of the span of the step the
+        # fragment is written in
+        stack = [(element, depth, parent)]
+        while stack:
+            element, depth, parent = stack.pop()
+            if depth is None:
+                tag, depth, span = element
+                self.end(depth, tag)
+                if span is not None:
+                    step_spans[span].finish(self.offset())
+                continue
+            if self.omitted(element, depth):
+                continue
+            tag = element.tag.encode("ascii")
+            attributes = b"".join(
+                b" " + k.encode("ascii") + b'="' + escape_attribute(v) + b'"'
+                for k, v in element.attrib.items()
+            )
+            if len(element):
+                span = None
+                if step_spans is not None and tag == b"Step":
+                    step_spans.append(StepSpan(
+                        FragmentStep.of(element), parent,
+                        step_spans[parent].depth + 1 if parent is not None else 0,
+                        self.offset(), len(self.indent(depth)), self.line_end_length))
+                    parent = span = len(step_spans) - 1
+                self.start(depth, tag, attributes)
+                stack.append(((tag, depth, span), None, None))
+                stack.extend((z, depth + 1, parent) for z in reversed(element))
+            elif element.text is None:
+                self.empty(depth, tag, attributes)
+            else:
+                self.attributed_element(depth, tag, attributes, escape_text(element.text))
+
+    def omitted(self, element, depth):
+        # whether an element of a precompiled fragment is left out
+        return False
+
+    def attributed_element(self, depth, tag, attributes, text):
+        self.buf += self.indent(depth) + b"<" + tag + attributes + b">" \
+            + text + b"</" + tag + b">\n"
+
+    def document(self):
+        self.parts.append(self.buf)
+        self.buf = bytearray()
+        return WorkflowDocument(self.parts, self.locales)
+
+
+def _pretty_length(depth, content):
+    # the length of a line of the pretty printed document
+    return min(2 * depth, len(_MAX_INDENT)) + len(content) + 1
+
+
+class _CompactDocumentWriter(_DocumentWriter):
+    # every line is written without its indentation or line break, the
+    # length of those is added to saved
+
+    line_end_length = 0
+
+    def __init__(self):
+        super().__init__()
+        self.saved = 0
+        self.pruned_step_count = 0
+
+    def indent(self, depth):
+        return b""
+
+    def _saved_line(self, depth):
+        self.saved += min(2 * depth, len(_MAX_INDENT)) + 1
+
+    def start(self, depth, tag, attributes=b""):
+        self.buf += b"<" + tag + attributes + b">"
+        self._saved_line(depth)
+
+    def end(self, depth, tag):
+        self.buf += b"</" + tag + b">"
+        self._saved_line(depth)
+
+    def empty(self, depth, tag, attributes=b""):
+        self.buf += b"<" + tag + attributes + b"/>"
+        self._saved_line(depth)
+
+    def element(self, depth, tag, text):
+        self.buf += b"<" + tag + b">" + text + b"</" + tag + b">"
+        self._saved_line(depth)
+
+    def attributed_element(self, depth, tag, attributes, text):
+        self.buf += b"<" + tag + attributes + b">" + text + b"</" + tag + b">"
+        self._saved_line(depth)
+
+    def localised_element(self, depth, tag, text, field, translations):
+        if not translations:
+            self.text_element(depth, tag, text)
+            return
+        _check(text)
+        self.buf += b"<" + tag + b">"
+        self._written += len(self.buf) + len(escape_text(text))
+        self.parts.append(self.buf)
+        self.parts.append((translations, field, text))
+        self.locales.update(translations)
+        self.buf = bytearray(b"</" + tag + b">")
+        self._saved_line(depth)
+
+    def omit(self, depth, content):
+        # a line of the pretty printed document that is left out
+        self.saved += _pretty_length(depth, content)
+
+    def omitted(self, element, depth):
+        # subflows are precompiled with the COMPACT_OMITTED elements, the
+        # ones within a step are left out here, measured pretty printed
+        if element.tag in ("Size", "ConnectionAnchors") or (
+                element.tag == "Description" and not element.text
+                and element.getparent() is not None
+                and element.getparent().tag == "Base"):
+            pretty = _DocumentWriter()
+            pretty.lxml_element(depth, element)
+            self.saved += pretty.offset()
+            return True
+        return False
+
+    def document(self):
+        self.parts.append(self.buf)
+        self.buf = bytearray()
+        return WorkflowDocument(
+            self.parts, self.locales, self.saved, self.pruned_step_count)
+
+
+def _optional(step):
+    optional = step.config.get("optional")
+    return str(optional if optional is not None else "False").lower()
+
+
+def _write_step_start(w, step, step_number, depth):
+    # the step up to the end of its "Base" element, this is most of the
+    # output so it is formatted in a few large pieces
+    i0, i1, i2, i3, i4 = w.indents(depth, 5)
+    attributes = b' Type="' + _STEP_TYPES.get(step.step_type, b"ConfirmStep") + b'"'
+    if step.step_type == StepType.group:
+        is_form = step.config.get("form")
+        attributes += b' IsReport="' + escape_attribute(
+            str(is_form if is_form is not None else "false").lower()) + b'"'
+    w.buf += b'%s<Step%s>\n%s<Base ID="%s">\n' % (
+        i0, attributes, i1, escape_attribute(step.step_id))
+    if step.translations:
+        w.localised_element(depth + 2, b"Title", step.title, "title", step.translations)
+        w.localised_element(
+            depth + 2, b"Description", step.description, "description", step.translations)
+    else:
+        w.buf += b"%s<Title>%s</Title>\n%s<Description>%s</Description>\n" % (
+            i2, escape_text(step.title), i2, escape_text(step.description))
+    if step.step_tag:
+        w.buf += b"%s<Tag>%s</Tag>\n" % (i2, escape_text(step.step_tag))
+
+    connections = [
+        (
+            escape_attribute(z.connection_type), escape_attribute(z.connection_id),
+            escape_attribute(z.source), escape_attribute(z.sink),
+        )
+        for z in step.connections
+    ]
+    if connections:
+        w.buf += i2 + b"<Connections>\n" + b"".join(
+            b'%s<Connection Type="%s" ID="%s" Source="%s" Sink="%s"/>\n' % ((i3,) + z)
+            for z in connections
+        ) + i2 + b"</Connections>\n"
+    w.buf += b"%s<DesignerData>\n%s<Position>50,%d</Position>\n%s<Size>0,0</Size>\n" % (
+        i2, i3, (1 + step_number) * 100, i3)
+    if connections:
+        w.buf += i3 + b"<ConnectionAnchors>\n" + b"".join(
+            b'%s<Connection ID="%s" Anchor="Bottom|Top"/>\n' % (i4, z[1])
+            for z in connections
+        ) + i3 + b"</ConnectionAnchors>\n"
+    w.buf += b"%s</DesignerData>\n%s</Base>\n" % (i2, i1)
+
+
+def _write_compact_step_start(w, step, step_number, depth):
+    # _write_step_start for compact output, without the COMPACT_OMITTED
+    # elements
+    attributes = b' Type="' + _STEP_TYPES.get(step.step_type, b"ConfirmStep") + b'"'
+    if step.step_type == StepType.group:
+        is_form = step.config.get("form")
+        attributes += b' IsReport="' + escape_attribute(
+            str(is_form if is_form is not None else "false").lower()) + b'"'
+    w.start(depth, b"Step", attributes)
+    w.start(depth + 1, b"Base", b' ID="' + escape_attribute(step.step_id) + b'"')
+    w.localised_element(depth + 2, b"Title", step.title, "title", step.translations)
+    if step.description or any("description" in z for z in step.translations.values()):
+        w.localised_element(
+            depth + 2, b"Description", step.description, "description", step.translations)
+    else:
+        w.omit(depth + 2, b"<Description></Description>")
+    if step.step_tag:
+        w.text_element(depth + 2, b"Tag", step.step_tag)
+
+    if step.connections:
+        w.start(depth + 2, b"Connections")
+        for connection in step.connections:
+            w.empty(depth + 3, b"Connection", b' Type="%s" ID="%s" Source="%s" Sink="%s"' % (
+                escape_attribute(connection.connection_type),
+                escape_attribute(connection.connection_id),
+                escape_attribute(connection.source), escape_attribute(connection.sink),
+            ))
+        w.end(depth + 2, b"Connections")
+    w.start(depth + 2, b"DesignerData")
+    w.element(depth + 3, b"Position", b"50,%d" % ((1 + step_number) * 100))
+    w.omit(depth + 3, b"<Size>0,0</Size>")
+    if step.connections:
+        w.omit(depth + 3, b"<ConnectionAnchors>")
+        for connection in step.connections:
+            w.omit(depth + 4, b'<Connection ID="%s" Anchor="Bottom|Top"/>' % (
+                escape_attribute(connection.connection_id),))
+        w.omit(depth + 3, b"</ConnectionAnchors>")
+    w.end(depth + 2, b"DesignerData")
+    w.end(depth + 1, b"Base")
+
+
+def _write_input(w, step, depth):
+    # the elements after "Base" of an input step
+    step_type = step.step_type
+    if step_type in _INPUT_TYPES:
+        w.element(depth + 1, b"InputType", _INPUT_TYPES[step_type])
+        w.text_element(depth + 1, b"IsOptional", _optional(step))
+        w.start(depth + 1, b"InputParameter")
+        w.start(depth + 2, b"Constraint")
+        w.element(depth + 3, b"ConstraintType", b"None")
+    elif step_type == StepType.datetime:
+        w.element(depth + 1, b"InputType", b"DateTime")
+        w.text_element(depth + 1, b"IsOptional", _optional(step))
+        w.start(depth + 1, b"InputParameter")
+        w.start(depth + 2, b"Constraint")
+        w.element(depth + 3, b"DisplayDate", b"true")
+        w.element(depth + 3, b"DisplayTime", b"true")
+    else:
+        dynamic = step.config.get("dynamic")
+        fixed = step.config.get("fixed")
+        multi = step.config.get("multi")
+        fixed = fixed if fixed is not None else "true"
+        multi = multi if multi is not None else "false"
+        w.element(depth + 1, b"InputType", b"Selection")
+        w.text_element(depth + 1, b"IsOptional", _optional(step))
+        if bool(dynamic):
+            w.text_element(depth + 1, b"DynamicUrl", step.choices[0])
+        w.start(depth + 1, b"InputParameter")
+        w.start(depth + 2, b"Constraint")
+        if bool(dynamic):
+            w.empty(depth + 3, b"Choices")
+        elif step.catalog is not None:
+            w.lxml_element(depth + 3, step.catalog.choices_xml)
+        elif step.choices:
+            w.start(depth + 3, b"Choices")
+            for choice in step.choices:
+                w.text_element(depth + 4, b"Choice", choice.strip())
+            w.end(depth + 3, b"Choices")
+        else:
+            w.empty(depth + 3, b"Choices")
+        w.text_element(depth + 3, b"FixedMode", str(fixed).lower())
+        w.element(depth + 3, b"MinSelection", b"1")
+        max_selection = "1" if multi == "false" else str(
+            step.catalog.option_count if step.catalog is not None
+            else len(step.choices))
+        w.text_element(depth + 3, b"MaxSelection", max_selection)
+    w.end(depth + 2, b"Constraint")
+    w.end(depth + 1, b"InputParameter")
+
+
+def measure_step(step, step_number, depth, step_spans=None):
+    # the length of a step pretty printed at depth, along with the steps of
+    # its group or subflow, this is how analysis.py estimates the size of a
+    # workflow without writing it
+    pretty = _DocumentWriter()
+    _write_steps(pretty, CompiledGroup("", "", (step,)), depth - 1, step_spans, step_number)
+    return pretty.offset() - _pretty_length(depth - 1, b"<Steps>") \
+        - _pretty_length(depth - 1, b"</Steps>")
+
+
+def measure_fragment(element, depth):
+    # the length of a precompiled fragment pretty printed at depth
+    pretty = _DocumentWriter()
+    pretty.lxml_element(depth, element)
+    return pretty.offset()
+
+
+def _prune_step(w, step, step_number, depth):
+    # the step and any steps within it are measured, pretty printed,
+    # rather than written
+    step_spans = []
+    w.saved += measure_step(step, step_number, depth + 1, step_spans)
+    w.pruned_step_count += len(step_spans)
+
+
+def _write_steps(w, compiled_group, depth, step_spans=None, first_step_number=0,
+                 reachable=None, subflow_steps=False):
+    # nested groups are walked with an explicit stack, as in
+    # workflow_generator.render_steps_xml, each entry has the position in
+    # step_spans of the group step whose steps are being written
+    #
+    # steps whose ids aren't in reachable, if it is given, are left out,
+    # and with subflow_steps set the steps of included subflows get spans
+    write_step_start = _write_compact_step_start \
+        if isinstance(w, _CompactDocumentWriter) else _write_step_start
+    w.start(depth, b"Steps")
+    stack = [(depth, enumerate(compiled_group.steps, first_step_number), None)]
+    while stack:
+        depth, remaining_steps, group_span = stack[-1]
+        for i, step in remaining_steps:
+            memory.checkpoint()
+            cancellation.checkpoint()
+            if reachable is not None and step.step_id not in reachable:
+                _prune_step(w, step, i, depth)
+                continue
+            step_span = None
+            if step_spans is not None:
+                step_spans.append(StepSpan(
+                    step, group_span, len(stack) - 1, w.offset(),
+                    len(w.indent(depth + 1)), w.line_end_length))
+                step_span = len(step_spans) - 1
+            write_step_start(w, step, i, depth + 1)
+            if step.group is not None:
+                w.start(depth + 2, b"Steps")
+                stack.append((
+                    depth + 2, enumerate(step.group.steps), step_span))
+                break
+            if step.subflow is not None:
+                w.lxml_element(
+                    depth + 2, step.subflow.instantiate(),
+                    step_spans if subflow_steps else None, step_span)
+            elif step.step_type in _INPUT_STEP_TYPES:
+                _write_input(w, step, depth + 1)
+            w.end(depth + 1, b"Step")
+            if step_spans is not None:
+                step_spans[step_span].finish(w.offset())
+        else:
+            stack.pop()
+            w.end(depth, b"Steps")
+            if stack:
+                w.end(depth - 1, b"Step")
+                if step_spans is not None:
+                    step_spans[group_span].finish(w.offset())
+
+
+def render_workflow_document(compiled, step_spans=None, compact=False,
+                             prune_unreachable=False, subflow_steps=False):
+    # the bytes backend equivalent of workflow_generator.render_workflow_xml
+    # if step_spans is a list a StepSpan is added to it for every step, and
+    # with subflow_steps set for the steps of included subflows as well
+    #
+    # with compact set the document is written without formatting or the
+    # COMPACT_OMITTED elements, see _CompactDocumentWriter, and with
+    # prune_unreachable as well the steps that can't be reached are left out
+    w = _CompactDocumentWriter() if compact else _DocumentWriter()
+    w.start(0, b"Procedure", b' IsReport="false"')
+    w.text_element(1, b"ID", compiled.workflow_id)
+    w.localised_element(1, b"Title", compiled.title, "title", compiled.translations)
+    if compact and not compiled.description and not any(
+            "description" in z for z in compiled.translations.values()):
+        w.omit(1, b"<Description></Description>")
+    else:
+        w.localised_element(
+            1, b"Description", compiled.description, "description", compiled.translations)
+    for tag in (b"DocVersion", b"Version", b"Author", b"Metadata"):
+        if compact:
+            w.omit(1, b"<" + tag + b"></" + tag + b">")
+        else:
+            w.element(1, tag, b"")
+    w.element(1, b"Interlocked", b"false")
+    w.empty(1, b"Report", b' Export="false"')
+    w.text_element(1, b"DateModified", datetime.now().isoformat())
+    w.start(1, b"Capabilities")
+    for capability in CAPABILITIES:
+        w.text_element(2, b"Capability", capability)
+    w.end(1, b"Capabilities")
+    reachable = reachable_step_ids(compiled.group) \
+        if compact and prune_unreachable else None
+    _write_steps(w, compiled.group, 1, step_spans, reachable=reachable,
+                 subflow_steps=subflow_steps)
+    w.end(0, b"Procedure")
+    return w.document()
@@ -0,0 +1,384 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+import lxml.etree as et
+from datetime import datetime
+import os
+import re
+import shutil
+import zipfile
+import logging
+import tempfile
+
+from . import cancellation
+from . import memory
+from . import zip_index
+from .exceptions import WorkflowValidationError
+from .xml_writer import WorkflowDocument, escape_text
+
+# zips smaller than this are kept in memory, larger ones are spilled
+# to an anonymous temporary file that is removed when it is closed
+DEFAULT_SPOOL_THRESHOLD = 16 * 2**20
+DEFAULT_CHUNK_SIZE = 64 * 2**10
+
+_spool_threshold = DEFAULT_SPOOL_THRESHOLD
+
+def configure(spool_threshold=DEFAULT_SPOOL_THRESHOLD):
+    global _spool_threshold
+    _spool_threshold = spool_threshold
+
+
+def _output_buffer():
+    return tempfile.SpooledTemporaryFile(max_size=_spool_threshold)
+
+
+class _CheckpointWriter():
+    # lxml serialises to a file object in chunks, checking in with the
+    # memory tracker and for cancellation on each write lets the memory limit,
+    # a deadline or a disconnected client abort the zip
+
+    def __init__(self, file_object):
+        self.file_object = file_object
+
+    def write(self, data):
+        memory.checkpoint()
+        # each write is a whole chunk, so the clock is read every time
+        cancellation.check()
+        return self.file_object.write(data)
+
+
+def zip_path(path):
+
+    # Check path exists
+    if not path or not os.path.exists(path):
+        logging.warning("No files/folders to add, not creating zip file")
+        return None
+
+    logging.debug("Creating zip file")
+    zip_stream = _output_buffer()
+    try:
+        zfile = zipfile.ZipFile(
+            zip_stream, 'w', compression=zipfile.ZIP_DEFLATED
+        )
+    except EnvironmentError as e:
+        logging.warning("Couldn't create zip file")
+        zip_stream.close()
+        return None
+
+    if os.path.isdir(path):
+        root_len = len(os.path.abspath(path))
+
+        # Walk through the directory, adding all files
+        for root, dirs, files in os.walk(path):
+            archive_root = os.path.abspath(root)[root_len:]
+            for f in files:
+                fullpath = os.path.join(root, f)
+                archive_name = os.path.join(archive_root, f)
+                try:
+                    zfile.write(
+                        fullpath, archive_name, zipfile.ZIP_DEFLATED
+                    )
+                except EnvironmentError as e:
+                    logging.warning("Couldn't add file: %s", (str(e),))
+    else:
+        # Exists and not a directory, assume a file
+        try:
+            zfile.write(path, os.path.basename(path), zipfile.ZIP_DEFLATED)
+        except EnvironmentError as e:
+            logging.warning("Couldn't add file: %s", (str(e),))
+    zfile.close()
+    zip_stream.seek(0)
+    return zip_stream
+
+
+def _write_workflow_xml(zfile, name, workflow_xml, locale=None):
+    with zfile.open(name, 'w') as f:
+        if isinstance(workflow_xml, WorkflowDocument):
+            workflow_xml.write(_CheckpointWriter(f), locale)
+        else:
+            et.ElementTree(workflow_xml).write(
+                _CheckpointWriter(f), pretty_print=True
+            )
+
+
+def construct_zip(workflow_xml, localised_text=None, step_spans=None):
+    # the xml is serialised straight into the zip entry rather than being
+    # built up as one bytes object and written out to a temporary directory
+    #
+    # workflow_xml is either an lxml element or, from the bytes backend, an
+    # xml_writer.WorkflowDocument which holds its own translated text
+    #
+    # if the workflow has translations the same tree is written again as
+    # {locale}/workflow.xml for each locale, with only the translated text
+    # swapped in, and the default text is restored afterwards
+    #
+    # given the step_spans recorded as a WorkflowDocument was written, an
+    # index.json is written alongside each workflow.xml, see zip_index.py
+    buf = _output_buffer()
+    try:
+        with memory.stage("zip"):
+            with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zfile:
+                _write_workflow_xml(zfile, 'workflow.xml', workflow_xml)
+                if isinstance(workflow_xml, WorkflowDocument):
+                    if step_spans is not None:
+                        zfile.writestr(
+                            zip_index.INDEX_NAME,
+                            zip_index.index_json(workflow_xml, step_spans))
+                    for locale in workflow_xml.locales():
+                        _write_workflow_xml(
+                            zfile, locale + '/workflow.xml', workflow_xml, locale)
+                        if step_spans is not None:
+                            zfile.writestr(
+                                locale + '/' + zip_index.INDEX_NAME,
+                                zip_index.index_json(workflow_xml, step_spans, locale))
+                elif localised_text is not None:
+                    try:
+                        for locale in localised_text.locales():
+                            localised_text.apply(locale)
+                            _write_workflow_xml(
+                                zfile, locale + '/workflow.xml', workflow_xml)
+                    finally:
+                        localised_text.apply(None)
+    except BaseException:
+        buf.close()
+        raise
+    buf.seek(0)
+    return buf
+
+
+def buffer_size(buf):
+    position = buf.tell()
+    buf.seek(0, os.SEEK_END)
+    size = buf.tell()
+    buf.seek(position)
+    return size
+
+
+def iter_chunks(buf, chunk_size=DEFAULT_CHUNK_SIZE):
+    # yields the buffer in fixed size chunks and always closes it, whether
+    # it is read to the end, the reader stops early or an error is raised
+    try:
+        while True:
+            chunk = buf.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        buf.close()
+
+
+# the Procedure level elements that rewrite_workflow_metadata can change, by
+# the name of the argument, they come before the <Steps> element and are
+# only ever written as single elements, one level into the document
+METADATA_FIELDS = {
+    "workflow_title": b"Title",
+    "workflow_description": b"Description",
+    "doc_version": b"DocVersion",
+    "version": b"Version",
+    "author": b"Author",
+}
+
+# the elements before <Steps> in the order they are written, compact
+# output leaves out those that are empty, see xml_writer.py, and they are
+# found whatever whitespace there is between them
+_HEADER_TAGS = (
+    b"ID", b"Title", b"Description", b"DocVersion", b"Version", b"Author",
+    b"Metadata", b"Interlocked", b"Report", b"DateModified",
+)
+_HEADER_ELEMENT_PATTERN = re.compile(
+    rb"(\s*)<(" + b"|".join(_HEADER_TAGS) + rb")\b[^>]*?(?:/>|>(.*?)</\2\s*>)",
+    re.DOTALL)
+_STEPS_PATTERN = re.compile(rb"<Steps[\s/>]")
+_COPY_CHUNK_SIZE = 2**20
+
+
+def _not_a_workflow(name):
+    return WorkflowValidationError("{0} is not a workflow zip".format(name))
+
+
+def _read_header(source, name):
+    # the start of the document up to the <Steps> element, and whatever
+    # was read after it
+    data = b""
+    while True:
+        chunk = source.read(_COPY_CHUNK_SIZE)
+        data += chunk
+        match = _STEPS_PATTERN.search(data)
+        if match is not None:
+            return data[:match.start()], data[match.start():]
+        if not chunk:
+            raise _not_a_workflow(name)
+
+
+def _header_text(header):
+    # the text of each element of the header, unescaped
+    return {
+        match.group(2): et.fromstring(
+            b"<a>" + (match.group(3) or b"") + b"</a>").text or ""
+        for match in _HEADER_ELEMENT_PATTERN.finditer(header)
+    }
+
+
+def _rewrite_header(header, values, name):
+    # values maps the tag of each element to change to its escaped text, an
+    # element that isn't there, e.g. left out of compact output for being
+    # empty, is added after the element written before it
+    matches = list(_HEADER_ELEMENT_PATTERN.finditer(header))
+    if not matches:
+        raise _not_a_workflow(name)
+    present = [z.group(2) for z in matches]
+    added = {}
+    for tag in _HEADER_TAGS:
+        if tag in values and tag not in present:
+            earlier = [z for z in _HEADER_TAGS[:_HEADER_TAGS.index(tag)] if z in present]
+            added.setdefault(earlier[-1] if earlier else None, []).append(tag)
+
+    def element(space, tag):
+        return space + b"<" + tag + b">" + values[tag] + b"</" + tag + b">"
+
+    parts = []
+    position = 0
+    for match in matches:
+        space, tag = match.group(1), match.group(2)
+        parts.append(header[position:match.start()])
+        if match is matches[0]:
+            parts.extend(element(space, z) for z in added.get(None, ()))
+        parts.append(element(space, tag) if tag in values else match.group(0))
+        parts.extend(element(space, z) for z in added.get(tag, ()))
+        position = match.end()
+    parts.append(header[position:])
+    return b"".join(parts)
+
+
+def _localise_values(values, localised_text, header_text, default_text):
+    # the new title and description of a locale's workflow.xml
+    for field, tag in (("title", b"Title"), ("description", b"Description")):
+        if localised_text.get(field) is not None:
+            values[tag] = localised_text[field]
+        elif header_text.get(tag) != default_text.get(tag):
+            # the locale has its own text, which is kept
+            values.pop(tag, None)
+
+
+def _copy_entry(zsource, zfile, info):
+    # an entry other than the documents, with its data as it was, compressed
+    # the same way
+    copied = zipfile.ZipInfo(info.filename, info.date_time)
+    for attribute in ("compress_type", "comment", "create_system", "external_attr"):
+        setattr(copied, attribute, getattr(info, attribute))
+    with zsource.open(info) as source, zfile.open(copied, 'w') as f:
+        shutil.copyfileobj(source, _CheckpointWriter(f), _COPY_CHUNK_SIZE)
+
+
+def _index_document(name):
+    return name[:-len(zip_index.INDEX_NAME)] + "workflow.xml"
+
+
+def _write_shifted_index(zsource, zfile, info, header_shifts):
+    zfile.writestr(
+        info.filename,
+        zip_index.shift_index_json(
+            zsource.read(info), header_shifts[_index_document(info.filename)]))
+
+
+def rewrite_workflow_metadata(zip_file, workflow_title=None, workflow_description=None,
+                              doc_version=None, version=None, author=None,
+                              translations=None):
+    # a copy of an existing workflow zip with new Procedure level fields,
+    # only the elements before <Steps> are rewritten, the rest of each
+    # workflow.xml, pretty printed or compact, is streamed through as it is
+    # and every other entry is copied with the same data and compression
+    #
+    # a locale's title and description are taken from translations, as in
+    # LocalisedText, and otherwise follow the new default where the locale
+    # had the same text as the old default; DateModified is set to now
+    #
+    # the offsets in an index.json, see zip_index.py, are moved along by
+    # the change in length of the header of its workflow.xml
+    values = {
+        METADATA_FIELDS[name]: value
+        for name, value in (
+            ("workflow_title", workflow_title),
+            ("workflow_description", workflow_description),
+            ("doc_version", doc_version), ("version", version), ("author", author),
+        )
+        if value is not None
+    }
+    values[b"DateModified"] = datetime.now().isoformat()
+    translations = translations or {}
+
+    try:
+        zsource = zipfile.ZipFile(zip_file)
+    except zipfile.BadZipFile:
+        raise _not_a_workflow("The upload")
+
+    buf = _output_buffer()
+    try:
+        with zsource, memory.stage("zip"):
+            if "workflow.xml" not in zsource.namelist():
+                raise _not_a_workflow("The upload")
+            with zsource.open("workflow.xml") as source:
+                default_text = _header_text(_read_header(source, "workflow.xml")[0])
+
+            header_shifts = {}
+            indexes = []
+            with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zfile:
+                for info in zsource.infolist():
+                    name = info.filename
+                    if name == zip_index.INDEX_NAME \
+                            or name.endswith("/" + zip_index.INDEX_NAME):
+                        # written after its workflow.xml, which is where it
+                        # is in the zips this service builds, otherwise once
+                        # the header of its workflow.xml has been rewritten
+                        if _index_document(name) in header_shifts:
+                            _write_shifted_index(zsource, zfile, info, header_shifts)
+                        else:
+                            indexes.append(info)
+                        continue
+                    if name != "workflow.xml" and not name.endswith("/workflow.xml"):
+                        _copy_entry(zsource, zfile, info)
+                        continue
+                    with zsource.open(info) as source:
+                        header, rest = _read_header(source, name)
+                        header_values = dict(values)
+                        if name != "workflow.xml":
+                            _localise_values(
+                                header_values, translations.get(name.split("/")[0], {}),
+                                _header_text(header), default_text)
+                        rewritten_header = _rewrite_header(header, {
+                            tag: escape_text(value) for tag, value in header_values.items()
+                        }, name)
+                        header_shifts[name] = len(rewritten_header) - len(header)
+                        header = rewritten_header
+                        with zfile.open(name, 'w') as f:
+                            target = _CheckpointWriter(f)
+                            target.write(header)
+                            target.write(rest)
+                            shutil.copyfileobj(source, target, _COPY_CHUNK_SIZE)
+
+                for info in indexes:
+                    if _index_document(info.filename) in header_shifts:
+                        _write_shifted_index(zsource, zfile, info, header_shifts)
+                    else:
+                        # not the index of any of the documents, kept as it is
+                        _copy_entry(zsource, zfile, info)
+    except BaseException:
+        buf.close()
+        raise
+    buf.seek(0)
+    return buf
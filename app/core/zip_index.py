@@ -0,0 +1,118 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# the index.json written alongside each workflow.xml in the zip, so that
+# a reader can go straight to a step rather than parsing the whole document
+#
+# for every step it gives the byte offset and length of its Step element
+# in the uncompressed workflow.xml, along with its id, StepIndex, tag, type
+# and the group step it is in, and the number of steps of each type; the
+# steps of an included subflow are listed as being in the group step that
+# includes them, their StepIndex is null as their compiled xml doesn't
+# keep it, see xml_writer.FragmentStep
+#
+# the offsets are those recorded by the bytes backend as it writes the
+# default locale's document, see xml_writer.StepSpan, for another locale
+# they are moved along by the difference in length of each translated text
+# before them, so the index costs a pass over the translated text at most
+
+from bisect import bisect_right
+import json
+
+from .xml_writer import escape_text
+
+INDEX_NAME = "index.json"
+INDEX_VERSION = 1
+
+
+def _locale_shifts(document, locale):
+    # the offset in the default locale's document at the end of each
+    # translated text that differs in length, and the total shift so far
+    ends = []
+    shifts = []
+    if locale is None:
+        return ends, shifts
+    offset = 0
+    shift = 0
+    for part in document.parts:
+        if not isinstance(part, tuple):
+            offset += len(part)
+            continue
+        translations, field, default_text = part
+        default_length = len(escape_text(default_text))
+        offset += default_length
+        text = translations.get(locale, {}).get(field)
+        if text is not None:
+            length = len(escape_text(text))
+            if length != default_length:
+                shift += length - default_length
+                ends.append(offset)
+                shifts.append(shift)
+    return ends, shifts
+
+
+def build_index(document, step_spans, locale=None):
+    # the steps are in document order, as a list per field rather than an
+    # object per step to keep the index small, parent is the position of
+    # the group step a step is in, or None at the top level
+    ends, shifts = _locale_shifts(document, locale)
+
+    def shifted(offset):
+        position = bisect_right(ends, offset)
+        return offset + shifts[position - 1] if position else offset
+
+    offsets = []
+    lengths = []
+    type_counts = {}
+    for span in step_spans:
+        start = shifted(span.start + span.indent)
+        offsets.append(start)
+        lengths.append(shifted(span.end - span.line_end) - start)
+        step_type = span.step.step_type.value
+        type_counts[step_type] = type_counts.get(step_type, 0) + 1
+
+    return {
+        "version": INDEX_VERSION,
+        "document": "workflow.xml" if locale is None else locale + "/workflow.xml",
+        "size": document.size() + (shifts[-1] if shifts else 0),
+        "step_count": len(step_spans),
+        "type_counts": type_counts,
+        "id": [z.step.step_id for z in step_spans],
+        "step_index": [z.step.step_index for z in step_spans],
+        "tag": [z.step.step_tag or None for z in step_spans],
+        "type": [z.step.step_type.value for z in step_spans],
+        "parent": [z.parent for z in step_spans],
+        "offset": offsets,
+        "length": lengths,
+    }
+
+
+def index_json(document, step_spans, locale=None):
+    return json.dumps(
+        build_index(document, step_spans, locale), separators=(",", ":")
+    ).encode("utf-8")
+
+
+def shift_index_json(data, shift):
+    # the index of a document whose text before the first step has changed
+    # length by shift, e.g. once zip_converter.rewrite_workflow_metadata has
+    # rewritten its header, the steps themselves are unchanged
+    index = json.loads(data)
+    index["size"] += shift
+    index["offset"] = [z + shift for z in index["offset"]]
+    return json.dumps(index, separators=(",", ":")).encode("utf-8")
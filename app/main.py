@@ -16,20 +16,212 @@
 # along with this program. 
 # If not, see <https://www.gnu.org/licenses/>.
 
-from fastapi import FastAPI, HTTPException, File, UploadFile, Response
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi import FastAPI, File, UploadFile, Request, Response, HTTPException
+from fastapi.responses import (
+    StreamingResponse, HTMLResponse, JSONResponse, FileResponse, PlainTextResponse
+)
+from fastapi.routing import APIRoute
+from starlette.background import BackgroundTask
+from contextlib import contextmanager
 from typing import Optional
-import pandas as pd
+import asyncio
+import concurrent.futures
+import hmac
+import os
+import tempfile
 import markdown
+# the core package only imports pandas when a csv is converted, importing it
+# here means the first csv request doesn't pay for the import
+import pandas
 
-from models import *
-
-from workflow_generator import Workflow
-from zip_converter import construct_zip
-from csv_to_import_steps import convert_csv_to_import_steps
+from core import (
+    ImportWorkflow,
+    ImportSubflow,
+    ImportCatalog,
+    StagedOverrides,
+    WorkflowGeneratorError,
+    WorkflowValidationError,
+    MemoryBudgetExceeded,
+    SubflowNotFound,
+    CatalogNotFound,
+    ProfileNotFound,
+    ProfilerBusy,
+    StagedUploadNotFound,
+    ConversionCancelled,
+    PrebuiltWorkflowNotFound,
+    read_csv_steps,
+    convert_csv_to_import_steps,
+    generate_workflow_zip,
+    analyse_import_steps,
+    explain_workflow,
+    rewrite_workflow_metadata,
+)
+from core import cancellation
+from core import catalogs
+from core import json_decoding
+from core import localisation
+from core import memory
+from core import pipeline
+from core import prebuilt
+from core import profiling
+from core import staging
+from core import subflows
+from core import zip_converter
 
 app = FastAPI()
 
+EVENT_LOOP_SCOPE_KEY = "workflow_event_loop"
+
+# how long a worker thread waits for the event loop to check on the client,
+# a loop too busy to answer in time is taken to mean it is still connected
+DISCONNECT_CHECK_TIMEOUT_SECONDS = 1.0
+
+
+class EventLoopMiddleware():
+    # records the event loop a request is served on so that a conversion
+    # running in a worker thread can check on the client, this works
+    # whether sync endpoints are run by the loop's executor or in anyio
+    # worker threads, depending on the version of starlette
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope[EVENT_LOOP_SCOPE_KEY] = asyncio.get_event_loop()
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(EventLoopMiddleware)
+
+
+class WorkflowRequest(Request):
+    # a request whose json body is decoded however deeply it is nested,
+    # see core.json_decoding, a workflow nested a thousand groups deep is
+    # too deep for the json module's recursion
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            self._json = json_decoding.loads(await self.body())
+        return self._json
+
+
+class WorkflowRoute(APIRoute):
+
+    def get_route_handler(self):
+        route_handler = super().get_route_handler()
+
+        async def workflow_route_handler(request):
+            return await route_handler(WorkflowRequest(request.scope, request.receive))
+
+        return workflow_route_handler
+
+
+# set before any endpoint is added so that every one of them uses it
+app.router.route_class = WorkflowRoute
+
+# the core package raises its own exceptions, they are only
+# mapped on to HTTP status codes here in the web layer
+CORE_ERROR_STATUS_CODES = {
+    WorkflowValidationError: 422,
+    MemoryBudgetExceeded: 413,
+    SubflowNotFound: 404,
+    CatalogNotFound: 404,
+    ProfileNotFound: 404,
+    ProfilerBusy: 409,
+    StagedUploadNotFound: 404,
+    ConversionCancelled: 504,
+    PrebuiltWorkflowNotFound: 404,
+}
+
+# per-request memory tracking is off by default as tracemalloc slows down
+# every allocation, the memory limit of the worker process doesn't need it,
+# WORKFLOW_MEMORY_BUDGET_MB is the name the limit was first given
+_memory_limit_mb = os.environ.get("WORKFLOW_MEMORY_LIMIT_MB") \
+    or os.environ.get("WORKFLOW_MEMORY_BUDGET_MB")
+memory.configure(
+    enabled=os.environ.get("WORKFLOW_MEMORY_TRACKING", "").lower() in ("1", "true"),
+    limit_bytes=int(float(_memory_limit_mb) * 2**20) if _memory_limit_mb else None,
+    top_sites=int(os.environ.get("WORKFLOW_MEMORY_TOP_SITES", 5)),
+    history=int(os.environ.get("WORKFLOW_MEMORY_HISTORY", 20)),
+)
+
+# zips above this size are buffered in a temporary file rather than in memory
+zip_converter.configure(
+    spool_threshold=int(float(os.environ.get("WORKFLOW_ZIP_SPOOL_MB", 16)) * 2**20)
+)
+
+# the xml is built as an lxml tree by default, "bytes" writes it directly
+pipeline.configure(xml_backend=os.environ.get("WORKFLOW_XML_BACKEND", "lxml"))
+
+# subflows and catalogs are shared between worker processes through these directories
+subflows.configure(
+    directory=os.environ.get(
+        "WORKFLOW_SUBFLOW_DIR",
+        os.path.join(tempfile.gettempdir(), "workflow_subflows")
+    )
+)
+catalogs.configure(
+    directory=os.environ.get(
+        "WORKFLOW_CATALOG_DIR",
+        os.path.join(tempfile.gettempdir(), "workflow_catalogs")
+    )
+)
+
+# conversions are abandoned after this many seconds, a request can set a
+# shorter limit of its own with the X-Workflow-Timeout header
+CONVERSION_TIMEOUT_SECONDS = float(os.environ["WORKFLOW_CONVERSION_TIMEOUT_SECONDS"]) \
+    if os.environ.get("WORKFLOW_CONVERSION_TIMEOUT_SECONDS") else None
+
+# the admin endpoints, and profiling, are only available once a token is set
+ADMIN_TOKEN = os.environ.get("WORKFLOW_ADMIN_TOKEN")
+
+# profiles of flagged requests are written here, see profiling.py
+profiling.configure(
+    directory=os.environ.get(
+        "WORKFLOW_PROFILE_DIR",
+        os.path.join(tempfile.gettempdir(), "workflow_profiles")
+    ),
+    history=int(os.environ.get("WORKFLOW_PROFILE_HISTORY", 20)),
+)
+
+# parsed uploads are kept for regeneration, in memory unless a directory is
+# set, which is needed for a handle to work with every worker process
+staging.configure(
+    directory=os.environ.get("WORKFLOW_STAGED_DIR"),
+    ttl_seconds=int(os.environ.get(
+        "WORKFLOW_STAGED_TTL_SECONDS", staging.DEFAULT_TTL_SECONDS)),
+)
+
+# prebuilt workflows are converted from the definitions in this directory,
+# the cache directory lets worker processes share the converted zips
+prebuilt.configure(
+    directory=os.environ.get("WORKFLOW_PREBUILT_DIR"),
+    cache_directory=os.environ.get(
+        "WORKFLOW_PREBUILT_CACHE_DIR",
+        os.path.join(tempfile.gettempdir(), "workflow_prebuilt")
+    ),
+)
+
+
+@app.on_event("startup")
+def load_prebuilt_workflows():
+    # so that the first request for each doesn't wait for its conversion
+    prebuilt.load_prebuilt()
+
+
+@app.exception_handler(WorkflowGeneratorError)
+async def core_error_handler(request: Request, exc: WorkflowGeneratorError):
+    status_code = next(
+        (
+            CORE_ERROR_STATUS_CODES[error_type]
+            for error_type in type(exc).__mro__
+            if error_type in CORE_ERROR_STATUS_CODES
+        ),
+        500
+    )
+    return JSONResponse({"detail": exc.detail}, status_code)
+
 
 @app.get("/")
 async def root():
@@ -45,61 +237,478 @@ async def userguide():
     return HTMLResponse(html, 200)
 
 
+@app.get("/debug/memory")
+async def debug_memory(request: Request):
+    # the stage by stage memory use and top allocation sites
+    # of the most recent requests, newest last
+    require_admin(request)
+    return {
+        "enabled": memory.is_enabled(),
+        "limit_bytes": memory.limit_bytes(),
+        "requests": memory.recent_reports(),
+    }
+
+
+@app.get("/debug/cancellations")
+async def debug_cancellations():
+    # the number of conversions abandoned since the worker started
+    return {"cancelled": cancellation.cancellation_counts()}
+
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request):
+    # the metadata of the stored profiles, newest first
+    require_admin(request)
+    return {"profiles": profiling.list_profiles()}
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def download_profile(request: Request, profile_id: str):
+    # the pstats file, e.g. for snakeviz or python -m pstats
+    require_admin(request)
+    return FileResponse(
+        profiling.profile_path(profile_id),
+        media_type="application/octet-stream",
+        filename=profile_id + ".prof",
+    )
+
+
+@app.get("/admin/profiles/{profile_id}/summary")
+def profile_summary(request: Request, profile_id: str, sort: str = "cumulative"):
+    require_admin(request)
+    return PlainTextResponse(profiling.profile_summary(profile_id, sort))
+
+
 @app.post("/api/json/v1")
-async def convert_json_v1(
+def convert_json_v1(
+    request: Request,
     workflow_definition: ImportWorkflow
     #files: List[UploadFile] = File(...)
 ):
-    return convert_to_workflow(
+    with conversion_request(request, "/api/json/v1") as profile_capture:
+        response = convert_to_workflow(
+            request,
+            workflow_definition.workflow_steps,
+            workflow_definition.workflow_title,
+            workflow_definition.workflow_description,
+            workflow_definition.translations,
+        )
+    return with_profile_id(response, profile_capture)
+
+
+@app.post("/api/csv/v1")
+def convert_csv_v1(
+    request: Request,
+    workflow_title: str,
+    workflow_description: Optional[str] = "",
+    workflow_steps: UploadFile = File(...)
+):
+    # localised titles and descriptions are passed as query parameters
+    # such as workflow_title_fr, alongside columns such as StepTitle_fr
+    workflow_translations = query_translations(request)
+
+    with conversion_request(request, "/api/csv/v1") as profile_capture:
+        with memory.stage("ingest"):
+            workflow_steps_df = read_csv_steps(workflow_steps.file)
+            workflow_steps = convert_csv_to_import_steps(workflow_steps_df)
+
+        response = convert_to_workflow(
+            request,
+            workflow_steps,
+            workflow_title,
+            workflow_description,
+            workflow_translations,
+        )
+    return with_profile_id(response, profile_capture)
+
+
+@app.post("/api/json/v1/analyze")
+async def analyze_json_v1(workflow_definition: ImportWorkflow):
+    # validates the workflow and returns structural statistics
+    # without generating the xml or the zip
+    return analyse_import_steps(
         workflow_definition.workflow_steps,
         workflow_definition.workflow_title,
         workflow_definition.workflow_description,
     )
 
 
-@app.post("/api/csv/v1")
-def convert_csv_v1(
-    workflow_title: str,
+@app.post("/api/csv/v1/analyze")
+def analyze_csv_v1(
+    workflow_title: Optional[str] = "",
     workflow_description: Optional[str] = "",
     workflow_steps: UploadFile = File(...)
 ):
+    workflow_steps_df = read_csv_steps(workflow_steps.file)
+    return analyse_import_steps(
+        convert_csv_to_import_steps(workflow_steps_df),
+        workflow_title,
+        workflow_description,
+    )
 
-    try:
-        workflow_steps.file.seek(0)
-        workflow_steps_df = pd.read_csv(workflow_steps.file)
-    except Exception as e:
-        raise HTTPException(422, e)
 
-    workflow_steps = convert_csv_to_import_steps(workflow_steps_df)
+@app.post("/api/zip/v1/metadata")
+def rewrite_zip_metadata_v1(
+    request: Request,
+    workflow_title: Optional[str] = None,
+    workflow_description: Optional[str] = None,
+    doc_version: Optional[str] = None,
+    version: Optional[str] = None,
+    author: Optional[str] = None,
+    workflow_zip: UploadFile = File(...)
+):
+    # a copy of a generated workflow zip with new Procedure level fields,
+    # the steps are copied as they are rather than generated again, fields
+    # that aren't given keep their values
+    workflow_translations = query_translations(request)
+    with memory.track_request("/api/zip/v1/metadata"):
+        zip_buffer = rewrite_workflow_metadata(
+            workflow_zip.file,
+            workflow_title=workflow_title,
+            workflow_description=workflow_description,
+            doc_version=doc_version,
+            version=version,
+            author=author,
+            translations=workflow_translations,
+        )
+    return zip_response(zip_buffer)
+
 
-    return convert_to_workflow(
-        workflow_steps,
+@app.post("/api/json/v1/stage")
+def stage_json_v1(workflow_definition: ImportWorkflow):
+    # parses and validates the workflow once, the handle returned can be
+    # used to generate it any number of times until it expires
+    staged = staging.stage_upload(
+        workflow_definition.workflow_steps,
+        workflow_definition.workflow_title,
+        workflow_definition.workflow_description,
+        workflow_definition.translations,
+    )
+    return staged_response(staged)
+
+
+@app.post("/api/csv/v1/stage")
+def stage_csv_v1(
+    request: Request,
+    workflow_title: Optional[str] = None,
+    workflow_description: Optional[str] = "",
+    workflow_steps: UploadFile = File(...)
+):
+    workflow_translations = query_translations(request)
+    workflow_steps_df = read_csv_steps(workflow_steps.file)
+    staged = staging.stage_upload(
+        convert_csv_to_import_steps(workflow_steps_df),
         workflow_title,
         workflow_description,
+        workflow_translations,
+    )
+    return staged_response(staged)
+
+
+@app.post("/api/staged/v1/{handle}")
+def convert_staged_v1(
+    request: Request,
+    handle: str,
+    overrides: Optional[StagedOverrides] = None
+):
+    # generates the workflow from a staged upload, the csv or json is not
+    # read again, overrides only apply to this workflow
+    overrides = overrides or StagedOverrides()
+    staged = staging.get_staged_upload(handle)
+    staging.apply_step_config(staged.import_steps, overrides.step_config)
+
+    workflow_translations = dict(staged.translations)
+    for locale, texts in (overrides.translations or {}).items():
+        workflow_translations[locale] = dict(
+            workflow_translations.get(locale, {}), **texts)
+
+    with conversion_request(request, "/api/staged/v1") as profile_capture:
+        response = convert_to_workflow(
+            request,
+            staged.import_steps,
+            overrides.workflow_title or staged.workflow_title,
+            overrides.workflow_description
+            if overrides.workflow_description is not None
+            else staged.workflow_description,
+            workflow_translations,
+        )
+    return with_profile_id(response, profile_capture)
+
+
+@app.delete("/api/staged/v1/{handle}")
+def remove_staged_v1(handle: str):
+    staging.remove_staged_upload(handle)
+    return Response(status_code=204)
+
+
+@app.get("/api/subflows/v1")
+async def list_subflows_v1():
+    return {"subflows": subflows.list_subflows()}
+
+
+@app.put("/api/subflows/json/v1/{subflow_name}")
+def register_subflow_json_v1(subflow_name: str, subflow_definition: ImportSubflow):
+    subflow = subflows.register_subflow(
+        subflow_name, subflow_definition.subflow_steps
     )
+    return {"name": subflow.name, "step_count": subflow.step_count}
+
+
+@app.put("/api/subflows/csv/v1/{subflow_name}")
+def register_subflow_csv_v1(
+    subflow_name: str,
+    subflow_steps: UploadFile = File(...)
+):
+    subflow_steps_df = read_csv_steps(subflow_steps.file)
+    subflow = subflows.register_subflow(
+        subflow_name, convert_csv_to_import_steps(subflow_steps_df)
+    )
+    return {"name": subflow.name, "step_count": subflow.step_count}
+
 
+@app.delete("/api/subflows/v1/{subflow_name}")
+def remove_subflow_v1(subflow_name: str):
+    subflows.remove_subflow(subflow_name)
+    return Response(status_code=204)
 
-def convert_to_workflow(workflow_steps, workflow_title, workflow_description):
 
-    if workflow_title is None:
-        workflow_title = "My Workflow"
+@app.get("/api/catalogs/v1")
+async def list_catalogs_v1():
+    return {"catalogs": catalogs.list_catalogs()}
 
-    if workflow_description is None:
-        workflow_description = ""
 
-    workflow_object = Workflow(
-        workflow_steps, workflow_title, workflow_description
+@app.put("/api/catalogs/json/v1/{catalog_name}")
+def register_catalog_json_v1(catalog_name: str, catalog_definition: ImportCatalog):
+    catalog = catalogs.register_catalog(catalog_name, catalog_definition.options)
+    return {"name": catalog.name, "option_count": catalog.option_count}
+
+
+@app.put("/api/catalogs/csv/v1/{catalog_name}")
+def register_catalog_csv_v1(
+    catalog_name: str,
+    catalog_options: UploadFile = File(...)
+):
+    # the options are taken from the Option column, or the first column,
+    # and read as strings so that e.g. part numbers keep leading zeros
+    catalog_options_df = read_csv_steps(catalog_options.file, dtype=str)
+    column = "Option" if "Option" in catalog_options_df.columns \
+        else catalog_options_df.columns[0]
+    catalog = catalogs.register_catalog(
+        catalog_name,
+        [str(z) for z in catalog_options_df[column].dropna()]
     )
+    return {"name": catalog.name, "option_count": catalog.option_count}
+
+
+@app.delete("/api/catalogs/v1/{catalog_name}")
+def remove_catalog_v1(catalog_name: str):
+    catalogs.remove_catalog(catalog_name)
+    return Response(status_code=204)
+
+
+@app.get("/api/prebuilt/v1")
+def list_prebuilt_v1():
+    return {"workflows": prebuilt.list_prebuilt()}
+
 
-    workflow_xml = workflow_object.return_xml()
+@app.get("/api/prebuilt/v1/{workflow_name}")
+def get_prebuilt_v1(request: Request, workflow_name: str):
+    # served from the zip converted when the definition was loaded, a
+    # changed definition is converted again first
+    workflow = prebuilt.get_prebuilt(workflow_name)
+    return bytes_response(
+        request, workflow.zip_bytes, workflow.etag, workflow.name + ".zip")
 
-    new_workflow_zip_buffer = construct_zip(
-        workflow_xml
+
+def byte_range(range_header, size):
+    # the first and last byte of a "bytes=" range, None if the header
+    # should be ignored, multiple ranges are served as the whole body
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, separator, last = (z.strip() for z in spec.strip().partition("-"))
+    if not separator or not (first or last) \
+            or not all(z.isdigit() for z in (first, last) if z):
+        return None
+    if first:
+        first = int(first)
+        if last and int(last) < first:
+            # not a valid range, which is ignored rather than refused
+            # (RFC 7233 section 3.1)
+            return None
+        last = min(int(last), size - 1) if last else size - 1
+    else:
+        # a suffix, the last n bytes
+        first = max(size - int(last), 0)
+        last = size - 1
+    if first > last or first >= size:
+        raise HTTPException(416, "The range is not satisfiable",
+                            headers={"Content-Range": "bytes */{0}".format(size)})
+    return first, last
+
+
+def bytes_response(request, body, etag, filename):
+    # a response with a strong ETag that supports conditional and single
+    # range requests
+    headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None and (
+            if_none_match.strip() == "*"
+            or etag in (z.strip() for z in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = "attachment;filename=" + filename
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    requested = byte_range(range_header, len(body)) \
+        if range_header and (if_range is None or if_range.strip() == etag) else None
+    if requested is None:
+        return Response(body, 200, media_type="application/zip", headers=headers)
+
+    first, last = requested
+    headers["Content-Range"] = "bytes {0}-{1}/{2}".format(first, last, len(body))
+    return Response(body[first:last + 1], 206, media_type="application/zip", headers=headers)
+
+
+def require_admin(request):
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(
+        token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")
+    ):
+        raise HTTPException(403, "A valid X-Admin-Token header is required")
+
+
+def flag_requested(request, name, header):
+    flag = request.query_params.get(name) or request.headers.get(header)
+    return flag is not None and flag.lower() in ("1", "true")
+
+
+def profile_requested(request):
+    return flag_requested(request, "profile", "X-Workflow-Profile")
+
+
+def conversion_timeout(request):
+    timeout = CONVERSION_TIMEOUT_SECONDS
+    header = request.headers.get("X-Workflow-Timeout")
+    if header is not None:
+        try:
+            requested = float(header)
+        except ValueError:
+            raise HTTPException(400, "X-Workflow-Timeout must be a number of seconds")
+        timeout = requested if timeout is None else min(timeout, requested)
+    return timeout
+
+
+def client_disconnected(request):
+    # conversions run in a worker thread, the check is made on the event loop
+    loop = request.scope.get(EVENT_LOOP_SCOPE_KEY)
+    if loop is None:
+        return None
+
+    def is_disconnected():
+        future = asyncio.run_coroutine_threadsafe(request.is_disconnected(), loop)
+        try:
+            return future.result(DISCONNECT_CHECK_TIMEOUT_SECONDS)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return False
+    return is_disconnected
+
+
+@contextmanager
+def conversion_request(request, name):
+    # every conversion is wrapped in memory tracking and can be cancelled,
+    # see cancellation.py, an admin can also have a single conversion
+    # profiled with ?profile=true or the X-Workflow-Profile header, other
+    # requests skip the profiler entirely
+    with cancellation.watch(conversion_timeout(request), client_disconnected(request)):
+        if not profile_requested(request):
+            with memory.track_request(name):
+                yield None
+            return
+
+        require_admin(request)
+        with memory.track_request(name, always=True) as tracker:
+            with profiling.capture(name, tracker) as profile_capture:
+                yield profile_capture
+
+
+def query_translations(request):
+    # localised workflow titles and descriptions passed as query parameters
+    # such as workflow_title_fr
+    try:
+        return localisation.extract_translations(
+            request.query_params, localisation.WORKFLOW_TEXT_FIELDS)
+    except ValueError as e:
+        raise WorkflowValidationError(str(e))
+
+
+def staged_response(staged):
+    return {
+        "handle": staged.handle,
+        "step_count": staging.count_steps(staged.import_steps),
+        "expires_at": staged.expires_at,
+    }
+
+
+def with_profile_id(response, profile_capture):
+    if profile_capture is not None:
+        response.headers["X-Workflow-Profile-Id"] = profile_capture.profile_id
+    return response
+
+
+def convert_to_workflow(request, workflow_steps, workflow_title, workflow_description, workflow_translations=None):
+
+    # with ?explain=true the breakdown of the size and build time of the
+    # workflow.xml is returned instead of the zip, see core/explain.py
+    if flag_requested(request, "explain", "X-Workflow-Explain"):
+        return JSONResponse(explain_workflow(
+            workflow_steps, workflow_title, workflow_description,
+            workflow_translations
+        ))
+
+    # with ?index=true an index.json of where each step is in the
+    # workflow.xml is added to the zip, see core/zip_index.py
+    with_index = flag_requested(request, "index", "X-Workflow-Index")
+
+    # with ?compact=true the workflow.xml is written without formatting or
+    # the elements that hold their default, and with ?prune=true as well
+    # without the steps that can't be reached, see core/xml_writer.py
+    if not flag_requested(request, "compact", "X-Workflow-Compact"):
+        new_workflow_zip_buffer = generate_workflow_zip(
+            workflow_steps, workflow_title, workflow_description,
+            workflow_translations, with_index=with_index
+        )
+        return zip_response(new_workflow_zip_buffer)
+
+    report = {}
+    new_workflow_zip_buffer = generate_workflow_zip(
+        workflow_steps, workflow_title, workflow_description,
+        workflow_translations, compact=True,
+        prune_unreachable=flag_requested(request, "prune", "X-Workflow-Prune"),
+        report=report, with_index=with_index
     )
 
+    return zip_response(new_workflow_zip_buffer, headers={
+        "X-Workflow-Xml-Bytes": str(report["xml_bytes"]),
+        "X-Workflow-Bytes-Saved": str(report["bytes_saved"]),
+        "X-Workflow-Pruned-Steps": str(report["pruned_step_count"]),
+    })
+
+
+def zip_response(zip_buffer, filename="workflow.zip", headers=None):
+    # the buffer is closed by iter_chunks once it has been streamed, the
+    # background task also closes it in case the client disconnects first
+    response_headers = {
+        "Content-Disposition": "attachment;filename=" + filename,
+        "Content-Length": str(zip_converter.buffer_size(zip_buffer)),
+    }
+    if headers:
+        response_headers.update(headers)
     return StreamingResponse(
-        new_workflow_zip_buffer,
+        zip_converter.iter_chunks(zip_buffer),
         200,
         media_type="application/zip",
-        headers={"Content-Disposition": "attachment;filename=workflow.zip"}
+        headers=response_headers,
+        background=BackgroundTask(zip_buffer.close)
     )
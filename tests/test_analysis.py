@@ -0,0 +1,183 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import copy
+import json
+
+import lxml.etree as et
+import pytest
+
+from core import (
+    DecisionPath,
+    ImportStep,
+    ImportWorkflow,
+    StepType,
+    Workflow,
+    WorkflowValidationError,
+    analyse_import_steps,
+    generate_workflow_zip,
+)
+from core import catalogs
+from core import subflows
+from tools.synthetic_workflows import SCENARIOS, deep_groups, rows_to_json
+
+
+def _steps(rows):
+    return ImportWorkflow(**json.loads(rows_to_json(rows))).workflow_steps
+
+
+def test_estimated_size_is_close_to_actual():
+    for name, scenario in list(SCENARIOS.items()) + [("deeper", lambda: deep_groups(40, 1))]:
+        import_steps = _steps(scenario())
+        estimate = analyse_import_steps(import_steps, "Title", "")["estimated_xml_bytes"]
+        actual = len(et.tostring(
+            Workflow(import_steps, "Title", "").return_xml(), pretty_print=True))
+        assert abs(estimate - actual) / actual < 0.01, name
+
+
+@pytest.fixture
+def library(tmp_path):
+    catalogs.configure(directory=str(tmp_path / "catalogs"))
+    subflows.configure(directory=str(tmp_path / "subflows"))
+    catalogs.register_catalog("sites", ["North", " South & East ", ""])
+    subflows.register_subflow("safety", [
+        ImportStep(step_index=1, step_title="Gloves"),
+        ImportStep(step_index=2, step_title="Goggles", step_type="text"),
+    ])
+    yield
+    catalogs.configure()
+    subflows.configure()
+
+
+def test_estimated_size_of_subflows_and_catalogs(library):
+    import_steps = [
+        ImportStep(step_index=1, step_type=StepType.group, steps=[
+            ImportStep(step_index=1, step_type=StepType.group, config={"include": "safety"}),
+            ImportStep(step_index=2, step_type=StepType.selection,
+                       selection_options=["catalog:sites"], config={"multi": "true"}),
+        ]),
+        ImportStep(step_index=2, step_type=StepType.selection,
+                   selection_options=["https://example.com/options"],
+                   config={"dynamic": True}),
+        ImportStep(step_index=3, step_type=StepType.group, steps=[]),
+    ]
+
+    estimate = analyse_import_steps(import_steps, "Title", "")["estimated_xml_bytes"]
+
+    actual = len(et.tostring(
+        Workflow(import_steps, "Title", "").return_xml(), pretty_print=True))
+    assert estimate == actual
+
+
+def test_input_is_not_modified():
+    import_steps = _steps(SCENARIOS["small_form"]())
+    before = copy.deepcopy(import_steps)
+
+    analyse_import_steps(import_steps)
+
+    assert import_steps == before
+
+
+def test_structure():
+    import_steps = [
+        ImportStep(step_index=1),
+        ImportStep(step_index=2, step_type=StepType.decision, decision_paths=[
+            DecisionPath(step_index=1, decision_name="Again"),
+            DecisionPath(step_index=4, decision_name="Group"),
+            DecisionPath(step_index=-2, decision_name="Done"),
+        ]),
+        ImportStep(step_index=3, step_title="Never reached"),
+        ImportStep(step_index=4, step_type=StepType.group, steps=[
+            ImportStep(step_index=1),
+            ImportStep(step_index=2),
+        ]),
+    ]
+
+    analysis = analyse_import_steps(import_steps)
+
+    assert analysis["valid"]
+    assert analysis["step_count"] == 6
+    assert analysis["step_counts"]["instruction"] == 4
+    assert analysis["max_depth"] == 1
+    assert analysis["decision_fan_out"] == {
+        "decision_steps": 1, "max": 3, "mean": 3.0}
+    assert analysis["unreachable_steps"] == [{"group": [], "step_index": 3}]
+    # 1 -> 2 -> the group (itself and its 2 steps), the loop back to 1 is ignored
+    assert analysis["longest_path"] == 5
+
+
+def test_errors():
+    import_steps = [
+        ImportStep(step_index=1, step_type=StepType.decision, decision_paths=[
+            DecisionPath(step_index=9, decision_name="Missing"),
+        ]),
+        ImportStep(step_index=4),
+        ImportStep(step_index=4),
+        ImportStep(step_index=2, step_type=StepType.selection),
+        ImportStep(step_index=3, step_type=StepType.group,
+                   config={"include": "missing"}),
+    ]
+
+    analysis = analyse_import_steps(import_steps)
+
+    assert not analysis["valid"]
+    assert len(analysis["errors"]) == 4
+
+
+def test_errors_after_a_repeated_step_index():
+    import_steps = [
+        ImportStep(step_index=1, step_type=StepType.decision, decision_paths=[
+            DecisionPath(step_index=9, decision_name="Missing"),
+        ]),
+        ImportStep(step_index=1),
+        ImportStep(step_index=2, step_type=StepType.decision, decision_paths=[
+            DecisionPath(step_index=8, decision_name="Missing too"),
+        ]),
+        ImportStep(step_index=2),
+    ]
+
+    errors = analyse_import_steps(import_steps)["errors"]
+
+    assert [z["message"] for z in errors] == [
+        "All StepIndex values must be unique within a group",
+        "Decision path to unknown StepIndex 9",
+        "Decision path to unknown StepIndex 8",
+    ]
+
+
+@pytest.mark.parametrize("import_steps, valid", [
+    ([ImportStep(step_index=1, step_type=StepType.selection, selection_options=[])], True),
+    ([ImportStep(step_index=1, step_type=StepType.selection)], False),
+    ([ImportStep(step_index=1, step_type=StepType.selection, selection_options=[],
+                 config={"dynamic": True})], False),
+    ([ImportStep(step_index=1), ImportStep(step_index=1)], False),
+    ([ImportStep(step_index=1, step_type=StepType.group, steps=[
+        ImportStep(step_index=1), ImportStep(step_index=2), ImportStep(step_index=2),
+    ])], False),
+    ([ImportStep(step_index=1, step_type=StepType.group, steps=[
+        ImportStep(step_index=1),
+    ]), ImportStep(step_index=2)], True),
+])
+def test_valid_matches_conversion(import_steps, valid):
+    assert analyse_import_steps(import_steps)["valid"] == valid
+    if valid:
+        generate_workflow_zip(import_steps, "Title", "").close()
+    else:
+        with pytest.raises(WorkflowValidationError):
+            generate_workflow_zip(import_steps, "Title", "")
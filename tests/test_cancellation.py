@@ -0,0 +1,128 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from core import (
+    ConversionCancelled,
+    ImportStep,
+    generate_workflow_zip,
+)
+from core import cancellation
+
+
+def _import_steps(count=500):
+    return [
+        ImportStep(step_index=i, step_title="Step {0}".format(i))
+        for i in range(1, count + 1)
+    ]
+
+
+@pytest.mark.parametrize("xml_backend", ["lxml", "bytes"])
+def test_conversion_is_cancelled_once_the_deadline_passes(xml_backend):
+    before = cancellation.cancellation_counts()
+
+    with cancellation.watch(timeout_seconds=0):
+        with pytest.raises(ConversionCancelled):
+            generate_workflow_zip(_import_steps(), "Title", "", xml_backend=xml_backend)
+
+    after = cancellation.cancellation_counts()
+    assert after[cancellation.DEADLINE] == before[cancellation.DEADLINE] + 1
+    assert after[cancellation.DISCONNECT] == before[cancellation.DISCONNECT]
+
+
+def test_conversion_is_cancelled_from_inside_the_step_loop(monkeypatch):
+    # the client goes between stages, so only a check inside a loop sees it
+    monkeypatch.setattr(cancellation, "_DISCONNECT_POLL_SECONDS", 0)
+    polls = []
+
+    def is_disconnected():
+        polls.append(None)
+        return len(polls) > 1
+
+    before = cancellation.cancellation_counts()
+    with cancellation.watch(is_disconnected=is_disconnected):
+        with pytest.raises(ConversionCancelled):
+            generate_workflow_zip(_import_steps(), "Title", "")
+
+    after = cancellation.cancellation_counts()
+    assert after[cancellation.DISCONNECT] == before[cancellation.DISCONNECT] + 1
+
+
+def test_conversion_without_a_token_is_unaffected():
+    with cancellation.watch() as token:
+        assert token is None
+        generate_workflow_zip(_import_steps(10), "Title", "").close()
+
+    with cancellation.watch(timeout_seconds=60, is_disconnected=lambda: False) as token:
+        generate_workflow_zip(_import_steps(10), "Title", "").close()
+    assert token.reason is None
+    assert cancellation.current_token() is None
+
+
+def test_app_checks_on_the_client_from_the_worker_thread(monkeypatch):
+    monkeypatch.setattr(cancellation, "_DISCONNECT_POLL_SECONDS", 0)
+    checks = []
+    client_disconnected = main.client_disconnected
+
+    def recording_client_disconnected(request):
+        is_disconnected = client_disconnected(request)
+
+        def check():
+            checks.append(is_disconnected())
+            return checks[-1]
+        return check
+
+    monkeypatch.setattr(main, "client_disconnected", recording_client_disconnected)
+    response = TestClient(main.app).post("/api/json/v1", json={
+        "workflowTitle": "Title",
+        "workflowSteps": [
+            {"stepIndex": i, "stepTitle": "Step {0}".format(i)} for i in range(1, 501)
+        ],
+    })
+
+    assert response.status_code == 200
+    assert checks and not any(checks)
+
+
+def test_client_disconnected_asks_the_event_loop():
+    class Request():
+        def __init__(self, loop):
+            self.scope = {main.EVENT_LOOP_SCOPE_KEY: loop}
+
+        async def is_disconnected(self):
+            return True
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        assert main.client_disconnected(Request(loop))() is True
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    # without the middleware there is nothing to ask
+    assert main.client_disconnected(Request(None)) is None
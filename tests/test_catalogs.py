@@ -0,0 +1,92 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import pytest
+
+from core import (
+    ImportStep,
+    StepType,
+    Workflow,
+    CatalogNotFound,
+    WorkflowValidationError,
+)
+from core import catalogs
+
+
+@pytest.fixture(params=["memory", "directory"])
+def library(request, tmp_path):
+    catalogs.configure(
+        directory=str(tmp_path) if request.param == "directory" else None
+    )
+    yield
+    catalogs.configure()
+
+
+SITES = ["Site " + str(i) for i in range(1000)]
+
+
+def _selection_constraint(selection_options, config=None):
+    workflow = Workflow(
+        [
+            ImportStep(step_index=1, step_type=StepType.selection,
+                       selection_options=selection_options,
+                       config=config or {}),
+        ],
+        "Title", ""
+    )
+    step_xml = workflow.return_xml().find("Steps").find("Step[@Type='InputStep']")
+    return step_xml.find("InputParameter").find("Constraint")
+
+
+def test_catalog_reference():
+    assert catalogs.catalog_reference(["@catalog:sites"]) == "sites"
+    assert catalogs.catalog_reference([" @catalog: sites "]) == "sites"
+    assert catalogs.catalog_reference(["A", "B"]) is None
+    assert catalogs.catalog_reference(None) is None
+
+
+def test_catalog_matches_inline_options(library):
+    catalogs.register_catalog("sites", SITES)
+
+    from_catalog = _selection_constraint(["@catalog:sites"], {"multi": "True"})
+    inline = _selection_constraint(SITES, {"multi": "True"})
+
+    assert [z.text for z in from_catalog.find("Choices")] == SITES
+    assert [z.text for z in from_catalog.find("Choices")] == \
+        [z.text for z in inline.find("Choices")]
+    assert from_catalog.find("MaxSelection").text == "1000"
+
+
+def test_unknown_catalog(library):
+    with pytest.raises(WorkflowValidationError):
+        _selection_constraint(["@catalog:missing"])
+    with pytest.raises(CatalogNotFound):
+        catalogs.get_catalog("missing")
+
+
+def test_register_remove_and_list(library):
+    catalogs.register_catalog("sites", SITES)
+    catalogs.register_catalog("parts", ["A", "B"])
+    assert catalogs.list_catalogs() == [
+        {"name": "parts", "option_count": 2},
+        {"name": "sites", "option_count": 1000},
+    ]
+
+    catalogs.remove_catalog("sites")
+    assert [z["name"] for z in catalogs.list_catalogs()] == ["parts"]
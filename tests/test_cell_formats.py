@@ -0,0 +1,92 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import pytest
+
+from core import WorkflowValidationError
+from core import cell_formats
+
+
+def _paths(decision_paths):
+    return [(z.decision_name, z.step_index) for z in decision_paths]
+
+
+def test_unquoted_cells_are_read_as_before():
+    decision_paths, empty = cell_formats.parse_decision_paths(["Yes:1; No : 13", ""])
+    assert _paths(decision_paths) == [("Yes", 1), ("No", 13)]
+    assert empty is None
+
+    assert cell_formats.parse_config(["Multi:True;Fixed:False", ""]) == [
+        {"multi": "True", "fixed": "False"}, {}
+    ]
+    # options are taken as written, including any whitespace and colons
+    assert cell_formats.parse_selection_options(["Red; Amber;@catalog:sites", ""]) == [
+        ["Red", " Amber", "@catalog:sites"], [""]
+    ]
+
+
+def test_separators_can_be_quoted():
+    decision_paths, = cell_formats.parse_decision_paths(
+        ['"Fail; retry":3; "Fail: stop" :4;" padded ":5'])
+    assert _paths(decision_paths) == [("Fail; retry", 3), ("Fail: stop", 4), (" padded ", 5)]
+
+    assert cell_formats.parse_config(['Link:"http://example.com/a;b"']) == [
+        {"link": "http://example.com/a;b"}
+    ]
+    assert cell_formats.parse_selection_options(['"A;B";"C\\\\D";"say \\"hi\\""']) == [
+        ["A;B", "C\\D", 'say "hi"']
+    ]
+
+
+def test_quotes_and_backslashes_inside_a_field_are_text():
+    # as they were read before quoting was added
+    assert cell_formats.parse_selection_options(
+        ['1/2" bolt;3/4" bolt;M8', "C:\\temp;D:\\new", '6" pipe;8 pipe']) == [
+        ['1/2" bolt', '3/4" bolt', "M8"], ["C:\\temp", "D:\\new"], ['6" pipe', "8 pipe"]
+    ]
+    decision_paths, = cell_formats.parse_decision_paths(['12" pipe:2;3/4" pipe:3'])
+    assert _paths(decision_paths) == [('12" pipe', 2), ('3/4" pipe', 3)]
+    # a backslash is only an escape within quotes
+    assert cell_formats.parse_config(['Path:"C:\\\\temp";Note:say \\"hi']) == [
+        {"path": "C:\\temp", "note": 'say \\"hi'}
+    ]
+
+
+def test_trailing_separators_are_ignored():
+    decision_paths, = cell_formats.parse_decision_paths(["Yes:1;"])
+    assert _paths(decision_paths) == [("Yes", 1)]
+    assert cell_formats.parse_config(["Units:mm;"]) == [{"units": "mm"}]
+
+
+@pytest.mark.parametrize("parse, values, message", [
+    (cell_formats.parse_decision_paths, ["Yes:1", "Yes:1;No:x"],
+     "Row 2: DecisionPaths character 10: StepIndex must be a whole number"),
+    (cell_formats.parse_decision_paths, ["Yes;No:2"],
+     "Row 1: DecisionPaths character 1: expected {DecisionName}:{StepIndex}"),
+    (cell_formats.parse_config, ["Link:http://example.com"],
+     "Row 1: Config character 10: unexpected ':', quote or escape it"),
+    (cell_formats.parse_config, ['Units:"mm'],
+     "Row 1: Config character 7: unterminated quote"),
+    (cell_formats.parse_selection_options, ['A;"B" C'],
+     "Row 1: SelectionOptions character 7: unexpected text after the closing quote"),
+])
+def test_errors_give_the_row_column_and_character(parse, values, message):
+    with pytest.raises(WorkflowValidationError) as e:
+        parse(values)
+    assert e.value.detail == message
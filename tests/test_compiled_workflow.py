@@ -0,0 +1,120 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+from concurrent.futures import ThreadPoolExecutor
+import re
+
+import lxml.etree as et
+import pytest
+
+from core import (
+    ImportStep,
+    StepType,
+    DecisionPath,
+    WorkflowValidationError,
+    compile_workflow,
+    generate_workflow_zip,
+    render_workflow_xml,
+)
+
+
+def _import_steps():
+    return [
+        ImportStep(step_index=1, step_title="First", decision_paths=[]),
+        ImportStep(step_index=2, step_title="Choose", step_type=StepType.decision,
+                   decision_paths=[
+                       DecisionPath(step_index=3, decision_name="Yes"),
+                       DecisionPath(step_index=1, decision_name="No"),
+                   ]),
+        ImportStep(step_index=3, step_title="Group", step_type=StepType.group,
+                   steps=[ImportStep(step_index=1, step_title="Inner")]),
+    ]
+
+
+def _render(compiled):
+    xml = et.tostring(render_workflow_xml(compiled)).decode()
+    return re.sub(r"<DateModified>[^<]*</DateModified>", "", xml)
+
+
+def test_input_is_not_modified():
+    import_steps = _import_steps()
+    before = [z.copy(deep=True) for z in import_steps]
+
+    compile_workflow(import_steps, "Title", "")
+    generate_workflow_zip(import_steps, "Title", "").close()
+
+    assert import_steps == before
+    assert len(import_steps[2].steps) == 1
+    assert import_steps[0].decision_paths == []
+
+
+def test_compiled_workflow_resolves_groups_and_connections():
+    compiled = compile_workflow(_import_steps(), "Title", "")
+    steps = compiled.group.steps
+    ids = {z.step_index: z.step_id for z in steps}
+
+    assert [z.step_type for z in steps] == [
+        StepType.start, StepType.instruction, StepType.decision,
+        StepType.group, StepType.end,
+    ]
+    assert [(z.sink, z.connection_type) for z in steps[2].connections] == [
+        (ids[3], "Yes"), (ids[1], "No")
+    ]
+    # a step without decision paths leads to the next step
+    assert [z.sink for z in steps[1].connections] == [ids[2]]
+    assert steps[4].connections == ()
+    assert [z.title for z in steps[3].group.steps] == ["Start", "Inner", "End"]
+
+
+def test_compiled_workflow_is_immutable():
+    compiled = compile_workflow(_import_steps(), "Title", "")
+    step = compiled.group.steps[1]
+
+    with pytest.raises(AttributeError):
+        step.title = "Changed"
+    with pytest.raises(TypeError):
+        step.config["optional"] = "true"
+    with pytest.raises(TypeError):
+        compiled.group.steps[1] = step
+
+
+def test_repeated_and_concurrent_rendering_is_identical():
+    compiled = compile_workflow(_import_steps(), "Title", "")
+    expected = _render(compiled)
+
+    with ThreadPoolExecutor(4) as executor:
+        rendered = list(executor.map(_render, [compiled] * 20))
+
+    assert rendered == [expected] * 20
+
+
+def test_unknown_decision_path():
+    import_steps = [
+        ImportStep(step_index=1, decision_paths=[
+            DecisionPath(step_index=9, decision_name="Missing")
+        ]),
+    ]
+    with pytest.raises(WorkflowValidationError, match="unknown StepIndex 9"):
+        compile_workflow(import_steps, "Title", "")
+
+
+def test_group_without_steps():
+    import_steps = [ImportStep(step_index=1, step_type=StepType.group)]
+    with pytest.raises(WorkflowValidationError, match="Group step 1"):
+        compile_workflow(import_steps, "Title", "")
@@ -0,0 +1,148 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# complexity regression tests, every stage of a conversion is timed on
+# synthetic workflows of several sizes and shapes and the growth rate is
+# fitted on a log-log scale, a stage fails if it grows noticeably faster
+# than n log n
+#
+# to keep the default run short the sizes are 1,000 and 10,000 steps,
+# the full run adds 100,000:
+#   WORKFLOW_COMPLEXITY_SIZES=1000,10000,100000 python -m pytest tests/test_complexity.py
+#
+# to tolerate noisy machines each size is timed a few times and the fastest
+# run is kept, the garbage collector is paused while timing
+
+import functools
+import gc
+import io
+import math
+import os
+import time
+
+import pytest
+
+from core import (
+    ImportWorkflow,
+    Workflow,
+    analyse_import_steps,
+    construct_zip,
+    convert_csv_to_import_steps,
+    read_csv_steps,
+)
+from tools.synthetic_workflows import (
+    deep_groups,
+    group_tree,
+    large_checklist,
+    rows_to_csv,
+    rows_to_import_steps,
+)
+
+SIZES = [
+    int(z) for z in
+    os.environ.get("WORKFLOW_COMPLEXITY_SIZES", "1000,10000").split(",")
+]
+
+# how much faster than n log n the fitted exponent may grow, enough to
+# absorb timing noise while still catching anything quadratic
+TOLERANCE = 0.3
+
+SHAPES = {
+    # a single level of steps
+    "flat": large_checklist,
+    # a chain of groups nested n / 2 deep
+    "deep": lambda steps: deep_groups(steps // 2, 1),
+    # binary tree of groups
+    "narrow": lambda steps: group_tree(steps, 2),
+    # groups of 50 steps, only two or three levels deep
+    "wide": lambda steps: group_tree(steps, 50),
+}
+
+STAGES = ["ingest", "validate", "analysis", "build", "xml", "zip"]
+
+
+def _time_stages(rows):
+    csv_bytes = rows_to_csv(rows)
+    raw_steps = rows_to_import_steps(rows)
+    timings = {}
+
+    def timed(stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    gc.collect()
+    gc.disable()
+    try:
+        timed("ingest", lambda: convert_csv_to_import_steps(
+            read_csv_steps(io.BytesIO(csv_bytes))))
+        import_steps = timed("validate", lambda: ImportWorkflow(
+            workflow_title="Complexity", workflow_steps=raw_steps).workflow_steps)
+        timed("analysis", analyse_import_steps, import_steps)
+        workflow = timed("build", Workflow, import_steps, "Complexity", "")
+        workflow_xml = timed("xml", workflow.return_xml)
+        timed("zip", construct_zip, workflow_xml).close()
+    finally:
+        gc.enable()
+    return timings
+
+
+@functools.lru_cache(maxsize=None)
+def _shape_timings(shape):
+    # the fastest time of each stage at each size
+    timings = []
+    for steps in SIZES:
+        rows = SHAPES[shape](steps)
+        runs = [_time_stages(rows) for _ in range(max(1, min(3, 10000 // steps)))]
+        timings.append({z: min(run[z] for run in runs) for z in STAGES})
+    return timings
+
+
+def _fitted_exponent(sizes, values):
+    # the least squares slope of log(value) against log(size)
+    xs = [math.log(z) for z in sizes]
+    ys = [math.log(max(z, 1e-9)) for z in values]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) \
+        / sum((x - mean_x) ** 2 for x in xs)
+
+
+def test_fitted_exponent():
+    sizes = [1000, 10000, 100000]
+
+    assert _fitted_exponent(sizes, sizes) == pytest.approx(1)
+    assert _fitted_exponent(sizes, [z * z for z in sizes]) == pytest.approx(2)
+
+
+@pytest.mark.skipif(len(SIZES) < 2, reason="needs at least two sizes")
+@pytest.mark.parametrize("stage", STAGES)
+@pytest.mark.parametrize("shape", sorted(SHAPES))
+def test_stage_grows_no_faster_than_n_log_n(shape, stage):
+    timings = _shape_timings(shape)
+    seconds = [z[stage] for z in timings]
+
+    exponent = _fitted_exponent(SIZES, seconds)
+    limit = _fitted_exponent(SIZES, [z * math.log(z) for z in SIZES]) + TOLERANCE
+
+    assert exponent <= limit, (
+        "{0} grows as n^{1:.2f} on {2} workflows, timings {3}".format(
+            stage, exponent, shape,
+            ", ".join("{0}: {1:.3f}s".format(n, t) for n, t in zip(SIZES, seconds)))
+    )
@@ -0,0 +1,68 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+from core import ImportStep, StepType, Workflow, generate_workflow_zip
+from core.exceptions import WorkflowValidationError
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app")
+
+
+def test_core_import_does_not_pull_in_web_stack():
+    # run in a fresh interpreter so modules imported by other tests
+    # don't hide what importing the core package actually costs
+    output = subprocess.check_output(
+        [
+            sys.executable, "-c",
+            "import sys, core; "
+            "print(','.join(m for m in ('fastapi', 'starlette', 'pandas') "
+            "if m in sys.modules))"
+        ],
+        cwd=APP_DIR
+    )
+    assert output.decode().strip() == ""
+
+
+def test_generate_workflow_zip():
+    import_steps = [
+        ImportStep(step_index=1, step_title="First"),
+        ImportStep(step_index=2, step_title="Second", step_type=StepType.text),
+    ]
+
+    buf = generate_workflow_zip(import_steps, "Title", None)
+
+    with zipfile.ZipFile(buf) as zfile:
+        assert zfile.namelist() == ["workflow.xml"]
+        assert b"<Title>Title</Title>" in zfile.read("workflow.xml")
+
+
+def test_duplicate_step_indexes_raise_core_error():
+    import_steps = [
+        ImportStep(step_index=1),
+        ImportStep(step_index=1),
+    ]
+
+    with pytest.raises(WorkflowValidationError):
+        Workflow(import_steps, "Title", "")
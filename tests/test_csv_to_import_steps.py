@@ -21,11 +21,8 @@ import pandas as pd
 
 import pytest
 
-import sys
-sys.path.append("/Users/timbusfield/PycharmProjects/WorkflowGenerator")
-
-from app.models import ImportStep, StepType, DecisionPath
-from app import csv_to_import_steps
+from core.models import ImportStep, StepType, DecisionPath
+from core import csv_to_import_steps
 
 
 example_1_df = pd.DataFrame.from_records(
@@ -336,3 +333,37 @@ def test_example_1():
     )
 
     assert import_steps == example_1_expected_output
+
+
+def _arranged(rows):
+    steps_df = pd.DataFrame.from_records(
+        [(str(i), "Step " + str(i), "group", p) for i, p in rows],
+        columns=[
+            csv_to_import_steps.STEP_INDEX,
+            csv_to_import_steps.STEP_TITLE,
+            csv_to_import_steps.STEP_TYPE,
+            csv_to_import_steps.PARENT,
+        ]
+    )
+    import_steps = csv_to_import_steps.convert_csv_to_import_steps(steps_df)
+
+    def nested(steps):
+        return [
+            (z.step_index, nested(z.steps) if z.steps is not None else None)
+            for z in steps
+        ]
+    return nested(import_steps)
+
+
+def test_children_keep_the_order_they_were_written_in():
+    # parents may come after their children in the csv
+    assert _arranged([(3, "2"), (1, ""), (2, "1"), (4, "2"), (5, "1")]) == [
+        (1, [(2, [(3, None), (4, None)]), (5, None)]),
+    ]
+
+
+def test_steps_without_a_top_level_ancestor_stay_at_the_top_level():
+    # 2 and 3 are a loop, 4 has a missing parent and 5 is a child of 4
+    assert _arranged([(1, ""), (2, "3"), (3, "2"), (4, "99"), (5, "4")]) == [
+        (1, None), (2, None), (3, None), (4, None), (5, None),
+    ]
@@ -0,0 +1,93 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import zipfile
+
+from core import (
+    ImportStep,
+    StepType,
+    explain_workflow,
+    generate_workflow_zip,
+)
+from core.explain import step_path
+
+
+def _import_steps():
+    return [
+        ImportStep(step_index=1, step_title="First"),
+        ImportStep(step_index=2, step_title="Pick", step_type=StepType.selection,
+                   selection_options=["Red", "Amber", "Green"]),
+        ImportStep(step_index=3, step_title="Group", step_type=StepType.group, steps=[
+            ImportStep(step_index=1, step_title="Check", step_type=StepType.decision,
+                       decision_paths=[{"step_index": 2, "decision_name": "Yes"},
+                                       {"step_index": -2, "decision_name": "No"}]),
+            ImportStep(step_index=2, step_title="Reading", step_type=StepType.numeric),
+        ]),
+    ]
+
+
+def test_step_sizes_add_up_to_the_workflow_xml():
+    report = explain_workflow(_import_steps(), "Title", "")
+
+    with generate_workflow_zip(_import_steps(), "Title", "") as buf:
+        with zipfile.ZipFile(buf) as zfile:
+            workflow_xml = zfile.read("workflow.xml")
+
+    steps = {step_path(report["steps"], z["position"]): z for z in report["steps"]}
+    assert report["workflow_bytes"] == len(workflow_xml)
+    assert report["step_count"] == 9
+    assert steps["3"]["bytes"] == steps["3"]["own_bytes"] + sum(
+        z["bytes"] for path, z in steps.items() if path.startswith("3/"))
+    assert sum(z["own_bytes"] for z in report["step_types"].values()) \
+        == sum(z["bytes"] for z in report["steps"] if z["depth"] == 0)
+    assert steps["3/1"]["depth"] == 1
+
+
+def test_counts_and_aggregates():
+    report = explain_workflow(_import_steps(), "Title", "")
+
+    steps = {step_path(report["steps"], z["position"]): z for z in report["steps"]}
+    assert steps["2"]["choice_count"] == 3
+    assert steps["3/1"]["connection_count"] == 2
+    assert steps["-2"]["connection_count"] == 0
+    assert report["step_types"]["start"]["count"] == 2
+    assert report["step_types"]["decision"]["connection_count"] == 2
+    assert report["groups"] == [{
+        "position": steps["3"]["position"], "parent": None, "step_index": 3, "title": "Group", "subflow": None,
+        "step_count": 2, "bytes": steps["3"]["bytes"],
+        "build_ms": report["groups"][0]["build_ms"],
+    }]
+    assert report["groups"][0]["build_ms"] >= steps["3"]["build_ms"]
+    assert report["largest_steps"][0]["own_bytes"] == max(z["own_bytes"] for z in report["steps"])
+
+
+def test_steps_refer_to_their_group_by_position():
+    report = explain_workflow(_import_steps(), "Title", "")
+
+    steps = report["steps"]
+    assert [z["position"] for z in steps] == list(range(len(steps)))
+    for step in steps:
+        assert "path" not in step
+        if step["parent"] is None:
+            assert step["depth"] == 0
+        else:
+            assert steps[step["parent"]]["step_type"] == "group"
+            assert step["depth"] == steps[step["parent"]]["depth"] + 1
+    assert sorted(step_path(steps, z["position"]) for z in steps) \
+        == sorted(["-1", "1", "2", "3", "3/-1", "3/1", "3/2", "3/-2", "-2"])
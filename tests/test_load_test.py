@@ -0,0 +1,52 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import io
+import json
+
+import pandas as pd
+
+from core import ImportWorkflow, convert_csv_to_import_steps
+from tools import load_test
+from tools.synthetic_workflows import SCENARIOS, rows_to_csv, rows_to_json
+
+
+def test_percentile():
+    values = sorted(float(z) for z in range(1, 101))
+    assert load_test.percentile(values, 0.50) == 50.0
+    assert load_test.percentile(values, 0.99) == 99.0
+    assert load_test.percentile([], 0.99) == 0.0
+
+
+def test_parse_mix():
+    assert load_test.parse_mix("small_form=6,deep_groups") == {
+        "small_form": 6.0,
+        "deep_groups": 1.0,
+    }
+
+
+def test_synthetic_scenarios_match_across_endpoints():
+    # the json and csv payloads for a scenario should describe the same steps
+    for name, scenario in SCENARIOS.items():
+        rows = scenario()
+        from_json = ImportWorkflow(**json.loads(rows_to_json(rows))).workflow_steps
+        from_csv = convert_csv_to_import_steps(
+            pd.read_csv(io.BytesIO(rows_to_csv(rows)))
+        )
+        assert [z.step_index for z in from_json] == [z.step_index for z in from_csv], name
@@ -0,0 +1,144 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import io
+import zipfile
+
+from fastapi.testclient import TestClient
+import pytest
+from pydantic import ValidationError
+
+import main
+from core import (
+    ImportStep,
+    ImportWorkflow,
+    WorkflowValidationError,
+    convert_csv_to_import_steps,
+    generate_workflow_zip,
+    read_csv_steps,
+)
+
+CSV = b"""StepIndex,StepTitle,StepDescription,StepType,Parent,StepTitle_fr,StepDescription_de
+1,First,,instruction,,Premier,Erste
+2,Group,,group,,Groupe,
+3,Inner,Inside,text,2,,Innen
+"""
+
+
+def _workflow_xml(buf):
+    with zipfile.ZipFile(buf) as zfile:
+        return {z: zfile.read(z).decode() for z in zfile.namelist()}
+
+
+def test_localised_keys_are_collected():
+    step = ImportStep(stepIndex=1, stepTitle="First", stepTitle_fr="Premier",
+                      stepDescription_de="Erste", stepTitle_es="")
+
+    assert step.step_title == "First"
+    assert step.translations == {
+        "fr": {"title": "Premier"},
+        "de": {"description": "Erste"},
+    }
+
+
+def test_invalid_locales_are_rejected():
+    with pytest.raises(ValidationError):
+        ImportStep(step_index=1, translations={"../fr": {"title": "x"}})
+
+
+@pytest.mark.parametrize("locale", ["fr", "pt-BR", "zh-Hant", "es-419", "sr-Latn-RS"])
+def test_language_tags_are_locales(locale):
+    step = ImportStep(step_index=1, translations={locale: {"title": "x"}})
+    assert list(step.translations) == [locale]
+
+
+@pytest.mark.parametrize("key", ["stepTitle_old", "stepDescription_bak", "stepTitle_xx-GB"])
+def test_unknown_suffixes_are_rejected(key):
+    with pytest.raises(ValidationError, match="is not a known locale"):
+        ImportStep(**{"stepIndex": 1, "stepTitle": "First", key: "x"})
+
+
+def test_unknown_csv_column_suffixes_are_rejected():
+    csv = CSV.replace(b"StepDescription_de", b"StepDescription_bak")
+
+    with pytest.raises(WorkflowValidationError, match="StepDescription_bak"):
+        convert_csv_to_import_steps(read_csv_steps(io.BytesIO(csv)))
+
+
+def test_unknown_query_parameter_suffixes_are_rejected():
+    response = TestClient(main.app).post(
+        "/api/csv/v1",
+        params={"workflow_title": "Checks", "workflow_title_old": "Old checks"},
+        files={"workflow_steps": ("steps.csv", CSV, "text/csv")},
+    )
+
+    assert response.status_code == 422
+    assert "workflow_title_old" in response.json()["detail"]
+
+
+def test_localised_csv_columns():
+    import_steps = convert_csv_to_import_steps(read_csv_steps(io.BytesIO(CSV)))
+
+    assert import_steps[0].translations == {
+        "fr": {"title": "Premier"}, "de": {"description": "Erste"}}
+    assert import_steps[1].steps[0].translations == {"de": {"description": "Innen"}}
+
+
+def test_one_workflow_xml_per_locale():
+    import_steps = convert_csv_to_import_steps(read_csv_steps(io.BytesIO(CSV)))
+
+    members = _workflow_xml(generate_workflow_zip(
+        import_steps, "Checks", "", {"fr": {"title": "Controles"}}))
+
+    assert sorted(members) == ["de/workflow.xml", "fr/workflow.xml", "workflow.xml"]
+    assert "<Title>Checks</Title>" in members["workflow.xml"]
+    assert "<Title>Controles</Title>" in members["fr/workflow.xml"]
+    assert "<Title>Premier</Title>" in members["fr/workflow.xml"]
+    assert "<Title>Premier</Title>" not in members["de/workflow.xml"]
+    assert "<Description>Innen</Description>" in members["de/workflow.xml"]
+
+    # everything other than the translated text is shared between locales
+    french = members["fr/workflow.xml"]
+    for translated, default in (
+        ("Controles", "Checks"), ("Premier", "First"), ("Groupe", "Group")
+    ):
+        french = french.replace(translated, default)
+    assert french == members["workflow.xml"]
+
+
+def test_json_workflow_translations():
+    workflow = ImportWorkflow(
+        workflowTitle="Checks",
+        workflowTitle_de="Prufungen",
+        workflowSteps=[{"stepIndex": 1, "stepTitle": "First"}]
+    )
+
+    members = _workflow_xml(generate_workflow_zip(
+        workflow.workflow_steps, workflow.workflow_title,
+        workflow.workflow_description, workflow.translations))
+
+    assert sorted(members) == ["de/workflow.xml", "workflow.xml"]
+    assert "<Title>Prufungen</Title>" in members["de/workflow.xml"]
+
+
+def test_no_translations_produces_a_single_workflow_xml():
+    members = _workflow_xml(generate_workflow_zip(
+        [ImportStep(step_index=1)], "Checks", ""))
+
+    assert list(members) == ["workflow.xml"]
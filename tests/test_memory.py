@@ -0,0 +1,97 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from core import ImportStep, MemoryBudgetExceeded, generate_workflow_zip
+from core import memory
+
+
+@pytest.fixture
+def tracking():
+    memory.configure(enabled=True, top_sites=3)
+    yield
+    memory.configure(enabled=False)
+
+
+def _import_steps(count):
+    return [
+        ImportStep(step_index=i, step_title="Step " + str(i))
+        for i in range(1, count + 1)
+    ]
+
+
+def test_tracking_disabled_by_default():
+    with memory.track_request("test") as tracker:
+        generate_workflow_zip(_import_steps(5), "Title", "")
+    assert tracker is None
+
+
+def test_stages_are_reported(tracking):
+    with memory.track_request("test"):
+        generate_workflow_zip(_import_steps(50), "Title", "")
+
+    report = memory.recent_reports()[-1]
+    assert report["request"] == "test"
+    assert report["error"] is None
+    assert [z["stage"] for z in report["stages"]] == [
+        "build", "xml", "zip"
+    ]
+    assert report["peak_traced_bytes"] > 0
+
+
+def test_limit_aborts_conversion(tracking):
+    memory.configure(enabled=True, limit_bytes=1024, top_sites=0)
+
+    with pytest.raises(MemoryBudgetExceeded):
+        with memory.track_request("test"):
+            generate_workflow_zip(_import_steps(500), "Title", "")
+
+    report = memory.recent_reports()[-1]
+    assert report["error"] is not None
+    assert memory.current_tracker() is None
+
+
+def test_limit_is_on_the_process_without_tracking():
+    # the rss of the test process is well over a kilobyte and well under
+    # a terabyte whatever this conversion allocates
+    try:
+        memory.configure(limit_bytes=1024)
+        assert not memory.is_enabled()
+        with memory.track_request("test") as tracker:
+            assert tracker is None
+            with pytest.raises(MemoryBudgetExceeded):
+                generate_workflow_zip(_import_steps(500), "Title", "")
+
+        memory.configure(limit_bytes=2**40)
+        generate_workflow_zip(_import_steps(500), "Title", "").close()
+    finally:
+        memory.configure()
+
+
+def test_debug_memory_needs_the_admin_token(monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    client = TestClient(main.app)
+
+    assert client.get("/debug/memory").status_code == 403
+    response = client.get("/debug/memory", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json()["limit_bytes"] is None
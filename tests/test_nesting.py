@@ -0,0 +1,126 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import json
+import zipfile
+
+from fastapi.testclient import TestClient
+import pytest
+
+import main
+from core import ImportStep, ImportWorkflow, generate_workflow_zip
+from core import json_decoding
+from tools import benchmark_nesting
+from tools.synthetic_workflows import deep_groups, rows_to_import_steps
+
+
+def _deep_import_steps(depth):
+    return ImportWorkflow(
+        workflow_title="Deep",
+        workflow_steps=rows_to_import_steps(deep_groups(depth, 1))
+    ).workflow_steps
+
+
+def test_nested_steps_are_built_without_recursion():
+    import_steps = _deep_import_steps(1000)
+
+    depth = 0
+    group = import_steps[0]
+    while group is not None:
+        assert isinstance(group, ImportStep)
+        depth += 1
+        group = next((z for z in group.steps if z.steps is not None), None)
+    assert depth == 1000
+
+
+def test_nested_steps_match_pydantic_validation():
+    raw_steps = rows_to_import_steps(deep_groups(3, 2))
+
+    assert ImportWorkflow(workflow_title="", workflow_steps=raw_steps).workflow_steps \
+        == [ImportStep(**z) for z in raw_steps]
+
+
+def test_nested_steps_must_be_a_list():
+    with pytest.raises(ValueError):
+        ImportWorkflow(
+            workflow_title="",
+            workflow_steps=[{"stepIndex": 1, "stepType": "group", "steps": "x"}]
+        )
+
+
+def test_thousand_level_nesting_converts():
+    buf = generate_workflow_zip(_deep_import_steps(1000), "Deep", "")
+
+    with zipfile.ZipFile(buf) as zfile:
+        workflow_xml = zfile.read("workflow.xml")
+    assert workflow_xml.count(b'Type="GroupStep"') == 1000
+    assert workflow_xml.count(b"<Steps>") == 1001
+
+
+def test_benchmark_reports_every_stage():
+    results = benchmark_nesting.run([1, 5], repeat=1)["results"]
+
+    assert [z["depth"] for z in results] == [1, 5]
+    assert set(results[0]["stages_ms"]) == set(benchmark_nesting.STAGES)
+    assert results[1]["zip_bytes"] > results[0]["zip_bytes"]
+    assert [z["json_status"] for z in results] == [200, 200]
+
+
+def test_json_endpoint_converts_a_thousand_levels():
+    summary = benchmark_nesting.run([1000], repeat=1, find_limit=True)
+
+    assert summary["results"][0]["json_status"] == 200
+    assert summary["json_failure"] is None and summary["json_limit"] is None
+
+
+def test_deep_json_is_decoded_without_recursion():
+    body = '{"a": [' * 5000 + '1.5, "x\\u00e9", null, true' + ']}' * 5000
+
+    value = json_decoding.loads(body.encode("utf-8"))
+
+    depth = 1
+    while isinstance(value["a"][0], dict):
+        value = value["a"][0]
+        depth += 1
+    assert depth == 5000
+    assert value["a"] == [1.5, "x\u00e9", None, True]
+
+
+@pytest.mark.parametrize("body", [
+    '{"a": 1, "b": [2, 3.5e1, -4], "c": {"d": "\\"e\\"", "f": [[], {}]}}',
+    " [NaN, Infinity, -Infinity, false] ",
+])
+def test_deep_json_decoding_matches_the_json_module(body):
+    assert repr(json_decoding._loads_without_recursion(body)) == repr(json.loads(body))
+
+
+@pytest.mark.parametrize("body", ['[1, 2', '[1 2]', '{"a" 1}', '{"a": 1,}', '[1,]', '1 2', '{1: 2}'])
+def test_deep_json_decoding_rejects_what_the_json_module_does(body):
+    with pytest.raises(json.JSONDecodeError):
+        json_decoding._loads_without_recursion(body)
+
+
+def test_malformed_deep_json_is_a_validation_error():
+    client = TestClient(main.app)
+    body = '{"workflowTitle": "Deep", "workflowSteps": ' + "[" * 5000 + "1,"
+
+    response = client.post(
+        "/api/json/v1", content=body, headers={"Content-Type": "application/json"})
+
+    assert response.status_code == 422
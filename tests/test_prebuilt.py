@@ -0,0 +1,203 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import io
+import json
+import os
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from core import ImportStep, PrebuiltWorkflowNotFound, WorkflowValidationError
+from core import prebuilt
+from core import subflows
+
+INSPECTION = {
+    "workflowTitle": "Inspection",
+    "workflowSteps": [
+        {"stepIndex": 1, "stepTitle": "Walk round"},
+        {"stepIndex": 2, "stepTitle": "Reading", "stepType": "numeric"},
+    ],
+}
+
+
+def _write(path, content, modified_ns):
+    with open(path, "w") as f:
+        f.write(content)
+    # changes within the resolution of the file system's clock still count
+    os.utime(path, ns=(modified_ns, modified_ns))
+
+
+@pytest.fixture
+def library(tmp_path):
+    definitions = tmp_path / "prebuilt"
+    definitions.mkdir()
+    _write(str(definitions / "inspection.json"), json.dumps(INSPECTION), 10**18)
+    _write(str(definitions / "checklist.csv"),
+           "StepIndex,StepTitle,StepType\n1,Gloves,instruction\n2,Goggles,text\n", 10**18)
+    prebuilt.configure(directory=str(definitions), cache_directory=str(tmp_path / "cache"))
+    yield definitions
+    prebuilt.configure()
+
+
+def _workflow_xml(zip_bytes):
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zfile:
+        return zfile.read("workflow.xml")
+
+
+def _titles(zip_bytes):
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zfile:
+        workflow_xml = zfile.read("workflow.xml")
+    return workflow_xml.split(b"<Title>")[1].split(b"</Title>")[0]
+
+
+def test_definitions_are_converted_once(library):
+    assert [z["name"] for z in prebuilt.list_prebuilt()] == ["checklist", "inspection"]
+
+    inspection = prebuilt.get_prebuilt("inspection")
+    assert _titles(inspection.zip_bytes) == b"Inspection"
+    assert _titles(prebuilt.get_prebuilt("checklist").zip_bytes) == b"checklist"
+    assert prebuilt.get_prebuilt("inspection") is inspection
+
+    with pytest.raises(PrebuiltWorkflowNotFound):
+        prebuilt.get_prebuilt("missing")
+    with pytest.raises(PrebuiltWorkflowNotFound):
+        prebuilt.get_prebuilt("../prebuilt/inspection")
+
+
+def test_changed_definitions_are_reloaded(library):
+    inspection = prebuilt.get_prebuilt("inspection")
+
+    _write(str(library / "inspection.json"),
+           json.dumps(dict(INSPECTION, workflowTitle="Inspection v2")), 10**18 + 1)
+    reloaded = prebuilt.get_prebuilt("inspection")
+    assert _titles(reloaded.zip_bytes) == b"Inspection v2"
+    assert reloaded.etag != inspection.etag
+
+    _write(str(library / "inspection.json"), "{", 10**18 + 2)
+    with pytest.raises(WorkflowValidationError):
+        prebuilt.get_prebuilt("inspection")
+    assert prebuilt.list_prebuilt()[1]["error"] is not None
+
+    os.remove(str(library / "inspection.json"))
+    with pytest.raises(PrebuiltWorkflowNotFound):
+        prebuilt.get_prebuilt("inspection")
+    assert [z["name"] for z in prebuilt.list_prebuilt()] == ["checklist"]
+
+
+def test_workers_serve_the_same_zip(library, tmp_path):
+    first = prebuilt.get_prebuilt("inspection")
+    # another worker process, sharing the cache directory
+    prebuilt.configure(directory=str(library), cache_directory=str(tmp_path / "cache"))
+    second = prebuilt.get_prebuilt("inspection")
+    assert second is not first
+    assert (second.etag, second.zip_bytes) == (first.etag, first.zip_bytes)
+    assert len(os.listdir(str(tmp_path / "cache"))) == 1
+
+
+def test_conditional_and_range_requests(library):
+    client = TestClient(main.app)
+    zip_bytes = prebuilt.get_prebuilt("inspection").zip_bytes
+
+    response = client.get("/api/prebuilt/v1/inspection")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200 and response.content == zip_bytes
+    assert response.headers["Accept-Ranges"] == "bytes"
+
+    assert client.get("/api/prebuilt/v1/inspection",
+                      headers={"If-None-Match": etag}).status_code == 304
+
+    response = client.get("/api/prebuilt/v1/inspection", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206 and response.content == zip_bytes[10:20]
+    assert response.headers["Content-Range"] == "bytes 10-19/{0}".format(len(zip_bytes))
+
+    response = client.get("/api/prebuilt/v1/inspection", headers={"Range": "bytes=-5"})
+    assert response.content == zip_bytes[-5:]
+
+    # a range of an older version is answered with the whole zip
+    response = client.get("/api/prebuilt/v1/inspection",
+                          headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert response.status_code == 200 and response.content == zip_bytes
+
+    response = client.get("/api/prebuilt/v1/inspection",
+                          headers={"Range": "bytes={0}-".format(len(zip_bytes))})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == "bytes */{0}".format(len(zip_bytes))
+
+    # an invalid range is ignored
+    for range_header in ("bytes=5-3", "bytes=a-b", "bytes=--3"):
+        response = client.get("/api/prebuilt/v1/inspection", headers={"Range": range_header})
+        assert response.status_code == 200 and response.content == zip_bytes
+
+    assert client.get("/api/prebuilt/v1/missing").status_code == 404
+
+
+def test_changed_subflows_are_picked_up(library, tmp_path):
+    subflows.configure(directory=str(tmp_path / "subflows"))
+    try:
+        subflows.register_subflow("safety", [ImportStep(step_index=1, step_title="Gloves")])
+        _write(str(library / "site.json"), json.dumps({
+            "workflowTitle": "Site",
+            "workflowSteps": [{"stepIndex": 1, "stepType": "group", "config": {"include": "safety"}}],
+        }), 10**18)
+        first = prebuilt.get_prebuilt("site")
+        assert prebuilt.get_prebuilt("site") is first
+
+        subflows.register_subflow("safety", [ImportStep(step_index=1, step_title="Goggles")])
+        second = prebuilt.get_prebuilt("site")
+        assert b"Goggles" in _workflow_xml(second.zip_bytes)
+
+        # nor is the old zip taken from the cache by a worker that starts
+        # after the change
+        prebuilt.configure(directory=str(library), cache_directory=str(tmp_path / "cache"))
+        assert b"Goggles" in _workflow_xml(prebuilt.get_prebuilt("site").zip_bytes)
+
+        subflows.remove_subflow("safety")
+        with pytest.raises(WorkflowValidationError):
+            prebuilt.get_prebuilt("site")
+    finally:
+        subflows.configure()
+
+
+def test_cached_zips_are_not_used_by_another_version(library, tmp_path, monkeypatch):
+    first = prebuilt.get_prebuilt("inspection")
+
+    monkeypatch.setattr(prebuilt, "_SOURCE_DIGEST", b"another version")
+    prebuilt.configure(directory=str(library), cache_directory=str(tmp_path / "cache"))
+    second = prebuilt.get_prebuilt("inspection")
+
+    assert second.etag != first.etag
+    # the zip of the earlier version is removed
+    assert len([z for z in os.listdir(str(tmp_path / "cache")) if z.startswith("inspection.")]) == 1
+
+
+def test_cache_without_hard_links(library, tmp_path, monkeypatch):
+    def link(source, target):
+        raise PermissionError(1, "Operation not permitted")
+
+    monkeypatch.setattr(os, "link", link)
+    first = prebuilt.get_prebuilt("inspection")
+    assert first.error is None
+
+    prebuilt.configure(directory=str(library), cache_directory=str(tmp_path / "cache"))
+    second = prebuilt.get_prebuilt("inspection")
+    assert second.etag == first.etag
+    assert [z for z in os.listdir(str(tmp_path / "cache")) if z.endswith(".tmp")] == []
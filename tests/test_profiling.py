@@ -0,0 +1,108 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import pstats
+
+import pytest
+
+from core import (
+    ImportStep,
+    ProfileNotFound,
+    ProfilerBusy,
+    generate_workflow_zip,
+)
+from core import memory
+from core import profiling
+
+
+@pytest.fixture
+def profiles(tmp_path):
+    profiling.configure(directory=str(tmp_path), history=3)
+    yield tmp_path
+    profiling.configure(directory=str(tmp_path), history=20)
+
+
+def _import_steps():
+    return [
+        ImportStep(step_index=1, step_title="First"),
+        ImportStep(step_index=2, step_title="Group", steps=[
+            ImportStep(step_index=1, step_title="Inner"),
+        ]),
+    ]
+
+
+def _profiled_conversion(name="test"):
+    with memory.track_request(name, always=True) as tracker:
+        with profiling.capture(name, tracker) as profile_capture:
+            generate_workflow_zip(_import_steps(), "Title", "").close()
+    return profile_capture
+
+
+def test_capture_stores_profile_and_metadata(profiles):
+    profile_capture = _profiled_conversion()
+
+    metadata = profiling.list_profiles()[0]
+    assert metadata["id"] == profile_capture.profile_id
+    assert metadata["request"] == "test"
+    assert metadata["step_count"] == 3
+    assert metadata["group_count"] == 1
+    assert [z["stage"] for z in metadata["stages"]] == ["build", "xml", "zip"]
+    assert metadata["error"] is None
+
+    stats = pstats.Stats(profiling.profile_path(profile_capture.profile_id))
+    assert any(z[2] == "generate_workflow_zip" for z in stats.stats)
+    assert "generate_workflow_zip" in profiling.profile_summary(profile_capture.profile_id)
+
+
+def test_unflagged_requests_are_not_profiled(profiles):
+    with memory.track_request("test") as tracker:
+        generate_workflow_zip(_import_steps(), "Title", "").close()
+    assert tracker is None
+    assert profiling.current_capture() is None
+    assert profiling.list_profiles() == []
+
+
+def test_failed_conversion_is_recorded(profiles):
+    with pytest.raises(ValueError):
+        with profiling.capture("test"):
+            raise ValueError("bad input")
+
+    assert profiling.list_profiles()[0]["error"] == "ValueError: bad input"
+    # the profiler is free again
+    _profiled_conversion()
+
+
+def test_one_profile_at_a_time(profiles):
+    with profiling.capture("first"):
+        with pytest.raises(ProfilerBusy):
+            with profiling.capture("second"):
+                pass
+    assert [z["request"] for z in profiling.list_profiles()] == ["first"]
+
+
+def test_old_profiles_are_pruned(profiles):
+    ids = [_profiled_conversion().profile_id for _ in range(5)]
+    assert [z["id"] for z in profiling.list_profiles()] == ids[:1:-1]
+    assert len(list(profiles.glob("*.prof"))) == 3
+
+
+def test_unknown_profile(profiles):
+    for profile_id in ("1-0123abcd", "../secret", ""):
+        with pytest.raises(ProfileNotFound):
+            profiling.profile_path(profile_id)
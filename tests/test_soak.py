@@ -0,0 +1,67 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# a short soak of every kind of request, the full run is:
+#   python -m tools.soak_test --conversions 20000
+# or, with pytest, e.g.
+#   WORKFLOW_SOAK_CONVERSIONS=5000 python -m pytest tests/test_soak.py
+
+import os
+import tempfile
+
+from tools import soak_test
+
+CONVERSIONS = int(os.environ.get("WORKFLOW_SOAK_CONVERSIONS", 160))
+
+
+def test_sustained_growth():
+    assert soak_test.sustained_growth([5, 9, 5, 6, 9, 5, 6, 5]) < 0
+    # a leak grows throughout, a spike at the end isn't sustained
+    assert soak_test.sustained_growth([1, 2, 3, 4, 5, 6, 7, 8]) == 5
+    assert soak_test.sustained_growth([5, 5, 5, 5, 5, 5, 5, 50]) == 0
+
+
+def test_soak():
+    report = soak_test.run_soak(
+        conversions=CONVERSIONS, sample_every=max(1, CONVERSIONS // 8),
+        warmup=40, scenarios={"small_form": 1.0})
+
+    assert all(report["counts"].values()), report["counts"]
+    assert soak_test.check_report(report) == [], soak_test.format_report(report)
+
+
+def test_soak_catches_a_leak(monkeypatch):
+    leaked = []
+
+    def leaky(client, payloads, rng):
+        # a temporary file left open and a buffer kept alive
+        leaked.append(tempfile.mkstemp()[0])
+        leaked.append(bytearray(2**16))
+        return soak_test.REQUESTS["json"](client, payloads, rng)
+
+    monkeypatch.setitem(soak_test.REQUESTS, "leaky", leaky)
+    try:
+        report = soak_test.run_soak(
+            conversions=80, sample_every=10, warmup=0,
+            mix={"leaky": 1.0}, scenarios={"small_form": 1.0})
+    finally:
+        for fd in leaked[::2]:
+            os.close(fd)
+
+    failures = soak_test.check_report(report)
+    assert [z.split()[0] for z in failures] == ["open_fds", "temp_files", "traced_bytes"]
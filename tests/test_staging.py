@@ -0,0 +1,124 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import pytest
+
+from core import (
+    ImportStep,
+    StagedOverrides,
+    StagedUploadNotFound,
+    StepType,
+    WorkflowValidationError,
+    compile_workflow,
+    render_workflow_xml,
+)
+from core import staging
+
+
+@pytest.fixture(params=["memory", "directory"])
+def staged_store(request, tmp_path):
+    staging.configure(
+        directory=str(tmp_path) if request.param == "directory" else None)
+    yield
+    staging.configure()
+
+
+def _import_steps():
+    return [
+        ImportStep(step_index=1, step_title="First", translations={"fr": {"title": "Premier"}}),
+        ImportStep(step_index=2, step_title="Reading", step_type=StepType.numeric,
+                   config={"units": "mm"}),
+        ImportStep(step_index=3, step_title="Group", steps=[
+            ImportStep(step_index=1, step_title="Inner", step_type=StepType.decision,
+                       decision_paths=[{"step_index": 2, "decision_name": "Yes"}]),
+            ImportStep(step_index=2, step_title="Pick", step_type=StepType.selection,
+                       selection_options=["a", "b"]),
+        ]),
+    ]
+
+
+def _structure(import_steps):
+    return [
+        (z.step_index, z.step_type, z.step_title, z.config, z.selection_options,
+         z.translations,
+         [(p.step_index, p.decision_name) for p in z.decision_paths or ()],
+         _structure(z.steps) if z.steps is not None else None)
+        for z in import_steps
+    ]
+
+
+def test_staged_steps_round_trip(staged_store):
+    staged = staging.stage_upload(
+        _import_steps(), "Title", "Description", {"fr": {"title": "Titre"}})
+
+    restored = staging.get_staged_upload(staged.handle)
+
+    assert _structure(restored.import_steps) == _structure(_import_steps())
+    assert (restored.workflow_title, restored.workflow_description) == ("Title", "Description")
+    assert restored.translations == {"fr": {"title": "Titre"}}
+    assert staging.count_steps(restored.import_steps) == 5
+
+
+def test_regenerated_xml_matches_direct_conversion(staged_store):
+    staged = staging.stage_upload(_import_steps(), "Title", "")
+    restored = staging.get_staged_upload(staged.handle)
+
+    direct = render_workflow_xml(compile_workflow(_import_steps(), "Title", ""))
+    regenerated = render_workflow_xml(compile_workflow(restored.import_steps, "Title", ""))
+
+    # ids are generated for each workflow, the structure must match
+    assert [z.tag for z in regenerated.iter()] == [z.tag for z in direct.iter()]
+    assert [z.text for z in regenerated.iter("Title")] == [z.text for z in direct.iter("Title")]
+
+
+def test_step_config_overrides_do_not_change_the_staged_upload(staged_store):
+    staged = staging.stage_upload(_import_steps(), "Title", "")
+
+    overrides = StagedOverrides.parse_obj({"stepConfig": {"2": {"units": "cm"}, "3/2": {"dynamic": True}}})
+    restored = staging.get_staged_upload(staged.handle)
+    staging.apply_step_config(restored.import_steps, overrides.step_config)
+
+    assert restored.import_steps[1].config == {"units": "cm"}
+    assert restored.import_steps[2].steps[1].config == {"dynamic": True}
+    assert staging.get_staged_upload(staged.handle).import_steps[1].config == {"units": "mm"}
+
+    with pytest.raises(WorkflowValidationError):
+        staging.apply_step_config(restored.import_steps, {"3/9": {}})
+
+
+def test_invalid_uploads_are_rejected_when_staged(staged_store):
+    with pytest.raises(WorkflowValidationError):
+        staging.stage_upload([
+            ImportStep(step_index=1, step_title="Pick", step_type=StepType.selection),
+        ])
+
+
+def test_expired_and_removed_handles_are_not_found(staged_store, monkeypatch):
+    staged = staging.stage_upload(_import_steps())
+    staging.remove_staged_upload(staged.handle)
+    with pytest.raises(StagedUploadNotFound):
+        staging.get_staged_upload(staged.handle)
+
+    monkeypatch.setattr(staging, "_ttl_seconds", -1)
+    expired = staging.stage_upload(_import_steps())
+    with pytest.raises(StagedUploadNotFound):
+        staging.get_staged_upload(expired.handle)
+
+    with pytest.raises(StagedUploadNotFound):
+        staging.get_staged_upload("../not-a-handle")
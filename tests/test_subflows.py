@@ -0,0 +1,123 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import lxml.etree as et
+import pytest
+
+from core import (
+    ImportStep,
+    StepType,
+    Workflow,
+    SubflowNotFound,
+    WorkflowValidationError,
+)
+from core import subflows
+
+
+@pytest.fixture(params=["memory", "directory"])
+def library(request, tmp_path):
+    subflows.configure(
+        directory=str(tmp_path) if request.param == "directory" else None
+    )
+    yield
+    subflows.configure()
+
+
+def _safety_checks():
+    return [
+        ImportStep(step_index=i, step_title="Check " + str(i))
+        for i in range(1, 41)
+    ]
+
+
+def _base_ids(xml):
+    return [z.get("ID") for z in xml.iter("Base")]
+
+
+def test_included_subflow_gets_fresh_ids(library):
+    subflows.register_subflow("safety-v3", _safety_checks())
+
+    workflow = Workflow(
+        [
+            ImportStep(step_index=1, step_type=StepType.group,
+                       config={"include": "safety-v3"}),
+            ImportStep(step_index=2, step_type=StepType.group,
+                       config={"include": "safety-v3"}),
+        ],
+        "Title", ""
+    )
+    workflow_xml = workflow.return_xml()
+
+    groups = workflow_xml.find("Steps").findall("Step[@Type='GroupStep']")
+    assert len(groups) == 2
+    for group in groups:
+        assert len(group.find("Steps").findall("Step")) == 42
+
+    # every step id is unique and every connection
+    # points at a step within the same group
+    ids = _base_ids(workflow_xml)
+    assert len(ids) == len(set(ids))
+    for group in groups:
+        group_ids = set(_base_ids(group.find("Steps")))
+        for connection in group.find("Steps").iter("Connection"):
+            if connection.get("Sink") is not None:
+                assert connection.get("Source") in group_ids
+                assert connection.get("Sink") in group_ids
+
+
+def test_subflow_matches_inline_group(library):
+    subflows.register_subflow("safety-v3", _safety_checks())
+
+    def titles(import_step):
+        xml = Workflow([import_step], "Title", "").return_xml()
+        return [z.text for z in xml.iter("Title")]
+
+    included = titles(ImportStep(step_index=1, step_type=StepType.group,
+                                 config={"include": "safety-v3"}))
+    inline = titles(ImportStep(step_index=1, step_type=StepType.group,
+                               steps=_safety_checks()))
+    assert included == inline
+
+
+def test_unknown_subflow(library):
+    with pytest.raises(WorkflowValidationError):
+        Workflow(
+            [ImportStep(step_index=1, step_type=StepType.group,
+                        config={"include": "missing"})],
+            "Title", ""
+        )
+    with pytest.raises(SubflowNotFound):
+        subflows.remove_subflow("missing")
+
+
+def test_register_remove_and_list(library):
+    subflows.register_subflow("a", _safety_checks()[:2])
+    subflows.register_subflow("b", _safety_checks()[:3])
+    assert subflows.list_subflows() == [
+        {"name": "a", "step_count": 4},
+        {"name": "b", "step_count": 5},
+    ]
+
+    subflows.remove_subflow("a")
+    assert [z["name"] for z in subflows.list_subflows()] == ["b"]
+
+
+def test_invalid_name(library):
+    with pytest.raises(WorkflowValidationError):
+        subflows.register_subflow("../escape", _safety_checks())
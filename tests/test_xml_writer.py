@@ -0,0 +1,255 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import io
+import re
+import zipfile
+
+import lxml.etree as et
+import pytest
+
+from core import (
+    ImportStep,
+    ImportWorkflow,
+    compile_workflow,
+    generate_workflow_zip,
+    render_workflow_xml,
+)
+from core import catalogs
+from core import pipeline
+from core import zip_converter
+from core import subflows
+from core.localisation import LocalisedText
+from core.xml_writer import COMPACT_OMITTED, render_workflow_document
+from tools.synthetic_workflows import SCENARIOS, rows_to_import_steps
+
+_ID = re.compile(rb"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+_DATE_MODIFIED = re.compile(rb"<DateModified>[^<]*</DateModified>")
+
+EVERY_STEP_TYPE = [
+    {"stepIndex": 1, "stepTitle": "Intro & <welcome>", "stepDescription": "Café \U0001F600\r\nnext",
+     "stepTag": "tag \"1\"", "stepTitle_fr": "Intro & fr"},
+    {"stepIndex": 2, "stepTitle": "Text", "stepType": "text", "config": {"optional": "True"}},
+    {"stepIndex": 3, "stepTitle": "Numeric", "stepType": "numeric"},
+    {"stepIndex": 4, "stepTitle": "Photo", "stepType": "photo"},
+    {"stepIndex": 5, "stepTitle": "Video", "stepType": "video"},
+    {"stepIndex": 6, "stepTitle": "Signature", "stepType": "signature"},
+    {"stepIndex": 7, "stepTitle": "Barcode", "stepType": "barcode"},
+    {"stepIndex": 8, "stepTitle": "Date", "stepType": "datetime", "config": {"optional": "true"}},
+    {"stepIndex": 9, "stepTitle": "Select", "stepType": "selection",
+     "selectionOptions": [" a < b ", "\"quoted\""], "config": {"multi": "true", "fixed": "False"}},
+    {"stepIndex": 10, "stepTitle": "Dynamic", "stepType": "selection",
+     "selectionOptions": ["https://example.com/?a=1&b=2"], "config": {"dynamic": "true"}},
+    {"stepIndex": 11, "stepTitle": "Catalog", "stepType": "selection",
+     "selectionOptions": ["@catalog:sites"], "config": {"multi": "true"}},
+    {"stepIndex": 12, "stepTitle": "Empty", "stepType": "selection", "selectionOptions": []},
+    {"stepIndex": 13, "stepTitle": "Decide", "stepType": "decision", "decisionPaths": [
+        {"stepIndex": 14, "decisionName": "Yes \"&\"\t<ok>\n"},
+        {"stepIndex": 15, "decisionName": "No"},
+    ]},
+    {"stepIndex": 14, "stepTitle": "Group", "stepType": "group", "config": {"form": "True"}, "steps": [
+        {"stepIndex": 1, "stepTitle": "Inner", "stepDescription_de": "Innen"},
+        {"stepIndex": 2, "stepTitle": "Nested", "stepType": "group",
+         "steps": [{"stepIndex": 1, "stepTitle": "Deep", "stepType": "text"}]},
+    ]},
+    {"stepIndex": 15, "stepTitle": "Included", "stepType": "group", "config": {"include": "safety"}},
+    {"stepIndex": 16, "stepTitle": "Own id", "stepId": "id-with-\"quote\"&"},
+]
+
+
+@pytest.fixture
+def library(tmp_path):
+    catalogs.configure(directory=str(tmp_path / "catalogs"))
+    subflows.configure(directory=str(tmp_path / "subflows"))
+    catalogs.register_catalog("sites", ["North", " South & East ", ""])
+    subflows.register_subflow("safety", [
+        ImportStep(step_index=1, step_title="Gloves"),
+        ImportStep(step_index=2, step_title="Goggles", step_type="text"),
+    ])
+    yield
+    catalogs.configure()
+    subflows.configure()
+
+
+def _normalise(xml_bytes):
+    # subflows get new ids each time they are rendered, so ids are
+    # compared by the order in which they first appear
+    ids = {}
+    xml_bytes = _ID.sub(
+        lambda m: ids.setdefault(m.group(0), b"id-%d" % len(ids)), xml_bytes)
+    return _DATE_MODIFIED.sub(b"", xml_bytes)
+
+
+def _lxml_outputs(compiled):
+    localised_text = LocalisedText()
+    workflow_xml = render_workflow_xml(compiled, localised_text)
+    outputs = {}
+    for locale in [None] + localised_text.locales():
+        localised_text.apply(locale)
+        out = io.BytesIO()
+        et.ElementTree(workflow_xml).write(out, pretty_print=True)
+        outputs[locale] = _normalise(out.getvalue())
+    return outputs
+
+
+def _bytes_outputs(compiled):
+    document = render_workflow_document(compiled)
+    return {
+        locale: _normalise(document.tobytes(locale))
+        for locale in [None] + document.locales()
+    }
+
+
+def _corpus():
+    workflows = [
+        ImportWorkflow(workflow_title="Every step type & more",
+                       workflow_description="<all>", workflowTitle_de="Alle",
+                       workflow_steps=EVERY_STEP_TYPE),
+    ]
+    for name, scenario in sorted(SCENARIOS.items()):
+        workflows.append(ImportWorkflow(
+            workflow_title=name, workflow_steps=rows_to_import_steps(scenario())))
+    return workflows
+
+
+def test_bytes_backend_matches_lxml(library):
+    for workflow in _corpus():
+        compiled = compile_workflow(
+            workflow.workflow_steps, workflow.workflow_title,
+            workflow.workflow_description, workflow.translations)
+        assert _bytes_outputs(compiled) == _lxml_outputs(compiled), \
+            workflow.workflow_title
+
+
+def test_bytes_backend_zip(library):
+    workflow = _corpus()[0]
+    entries = {}
+    for backend in ("lxml", "bytes"):
+        buf = generate_workflow_zip(
+            workflow.workflow_steps, workflow.workflow_title,
+            workflow.workflow_description, workflow.translations,
+            xml_backend=backend)
+        with zipfile.ZipFile(buf) as zfile:
+            entries[backend] = {
+                z: _normalise(zfile.read(z)) for z in zfile.namelist()
+            }
+    assert sorted(entries["bytes"]) == ["de/workflow.xml", "fr/workflow.xml", "workflow.xml"]
+    assert entries["bytes"].keys() == entries["lxml"].keys()
+    # the ids of separately compiled workflows differ, the shape doesn't
+    for name, xml in entries["bytes"].items():
+        assert xml == entries["lxml"][name]
+
+
+@pytest.mark.parametrize("text", ["bad \x01", "bad \x0b", "bad \ufffe"])
+def test_invalid_characters_are_rejected_by_both(text):
+    compiled = compile_workflow([ImportStep(step_index=1, step_title=text)], "Title", "")
+    with pytest.raises(ValueError):
+        render_workflow_xml(compiled)
+    with pytest.raises(ValueError):
+        render_workflow_document(compiled)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        pipeline.configure(xml_backend="text")
+
+
+def _without_omitted(xml_bytes):
+    # an empty Description is kept if another locale has a translation of
+    # it, so is taken out of both documents before they are compared
+    root = et.fromstring(xml_bytes, et.XMLParser(remove_blank_text=True))
+    for element in list(root.iter()):
+        if element.tag in COMPACT_OMITTED and not len(element) and not element.text \
+                or element.tag in ("Size", "ConnectionAnchors"):
+            element.getparent().remove(element)
+    return _normalise(et.tostring(root))
+
+
+def test_compact_output(library):
+    for workflow in _corpus():
+        compiled = compile_workflow(
+            workflow.workflow_steps, workflow.workflow_title,
+            workflow.workflow_description, workflow.translations)
+        pretty = render_workflow_document(compiled)
+        compact = render_workflow_document(compiled, compact=True)
+        assert compact.locales() == pretty.locales()
+        assert compact.bytes_saved == pretty.size() - compact.size() > 0
+        for locale in [None] + compact.locales():
+            assert b">\n" not in compact.tobytes(locale)
+            assert b"<Size>" not in compact.tobytes(locale)
+            assert b"<ConnectionAnchors>" not in compact.tobytes(locale)
+            assert _without_omitted(compact.tobytes(locale)) \
+                == _without_omitted(pretty.tobytes(locale)), workflow.workflow_title
+
+
+def test_compact_output_prunes_unreachable_steps():
+    compiled = compile_workflow([
+        ImportStep(step_index=1, step_title="Decide", step_type="decision", decision_paths=[
+            {"step_index": 3, "decision_name": "Yes"},
+            {"step_index": -2, "decision_name": "No"},
+        ]),
+        ImportStep(step_index=2, step_title="Skipped", step_type="group", steps=[
+            ImportStep(step_index=1, step_title="Skipped too"),
+        ]),
+        ImportStep(step_index=3, step_title="Reached", step_type="group", steps=[
+            ImportStep(step_index=1, step_title="Inner", decision_paths=None),
+        ]),
+    ], "Title", "")
+    pretty = render_workflow_document(compiled)
+    compact = render_workflow_document(compiled, compact=True, prune_unreachable=True)
+
+    titles = et.fromstring(compact.tobytes()).xpath("//Base/Title/text()")
+    assert "Skipped" not in titles and "Skipped too" not in titles
+    assert ["Decide", "Reached", "Inner"] == [z for z in titles if z not in ("Start", "End")]
+    # the skipped group, its start, end and inner step
+    assert compact.pruned_step_count == 4
+    assert compact.bytes_saved == pretty.size() - compact.size()
+
+
+def test_compact_zip_report():
+    report = {}
+    buf = generate_workflow_zip(
+        [ImportStep(step_index=1, step_title="Only")], "Title", "",
+        compact=True, report=report)
+    with zipfile.ZipFile(buf) as zfile:
+        workflow_xml = zfile.read("workflow.xml")
+    assert report["xml_bytes"] == len(workflow_xml)
+    assert report["bytes_saved"] > 0 and report["pruned_step_count"] == 0
+
+
+def test_compact_zip_metadata_can_be_rewritten(library):
+    # a compact zip rewritten is the same as the pretty printed zip
+    # rewritten, other than the whitespace and the empty elements left out
+    for workflow in _corpus():
+        rewritten = {}
+        for compact in (False, True):
+            with generate_workflow_zip(
+                workflow.workflow_steps, workflow.workflow_title,
+                workflow.workflow_description, workflow.translations, compact=compact
+            ) as buf:
+                rewritten_buf = zip_converter.rewrite_workflow_metadata(
+                    buf, workflow_title="Retitled & <new>", version="2")
+            with zipfile.ZipFile(rewritten_buf) as zfile:
+                rewritten[compact] = {z: zfile.read(z) for z in zfile.namelist()}
+        assert list(rewritten[True]) == list(rewritten[False])
+        for name, workflow_xml in rewritten[True].items():
+            assert b">\n" not in workflow_xml
+            assert b"<Version>2</Version>" in workflow_xml
+            assert _without_omitted(workflow_xml) \
+                == _without_omitted(rewritten[False][name]), workflow.workflow_title
@@ -0,0 +1,220 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import io
+import json
+import zipfile
+
+import lxml.etree as et
+import pytest
+
+from core import ImportStep, StepType, WorkflowValidationError, generate_workflow_zip
+from core import zip_converter
+
+
+@pytest.fixture
+def small_threshold():
+    zip_converter.configure(spool_threshold=1024)
+    yield
+    zip_converter.configure()
+
+
+def _workflow_xml(steps):
+    workflow_xml = et.Element("Procedure")
+    steps_xml = et.SubElement(workflow_xml, "Steps")
+    for i in range(steps):
+        et.SubElement(steps_xml, "Step").text = "Step " + str(i)
+    return workflow_xml
+
+
+def test_zip_contains_pretty_printed_xml():
+    workflow_xml = _workflow_xml(3)
+
+    buf = zip_converter.construct_zip(workflow_xml)
+
+    with zipfile.ZipFile(buf) as zfile:
+        assert zfile.read("workflow.xml") == et.tostring(
+            workflow_xml, pretty_print=True)
+
+
+def test_small_zip_stays_in_memory():
+    buf = zip_converter.construct_zip(_workflow_xml(3))
+    assert not buf._rolled
+
+
+def test_large_zip_spills_to_disk(small_threshold):
+    buf = zip_converter.construct_zip(_workflow_xml(5000))
+    assert buf._rolled
+    with zipfile.ZipFile(buf) as zfile:
+        assert zfile.read("workflow.xml").count(b"<Step>") == 5000
+
+
+def test_iter_chunks_closes_buffer(small_threshold):
+    buf = zip_converter.construct_zip(_workflow_xml(5000))
+    size = zip_converter.buffer_size(buf)
+
+    chunks = list(zip_converter.iter_chunks(buf, chunk_size=1000))
+
+    assert sum(len(z) for z in chunks) == size
+    assert max(len(z) for z in chunks) == 1000
+    assert buf.closed
+
+
+def test_iter_chunks_closes_buffer_when_abandoned(small_threshold):
+    buf = zip_converter.construct_zip(_workflow_xml(5000))
+
+    chunks = zip_converter.iter_chunks(buf, chunk_size=1000)
+    next(chunks)
+    chunks.close()
+
+    assert buf.closed
+
+
+def _generated_zip():
+    import_steps = [ImportStep(step_index=1, step_title="First")]
+    with generate_workflow_zip(
+        import_steps, "Title", "Description",
+        {"fr": {"title": "Titre"}, "de": {"description": "Beschreibung"}}
+    ) as buf:
+        source = io.BytesIO(buf.read())
+    with zipfile.ZipFile(source, "a") as zfile:
+        zfile.writestr("assets/manual.pdf", b"%PDF" * 1000, zipfile.ZIP_DEFLATED)
+    return source
+
+
+def _header(workflow_xml):
+    procedure = et.fromstring(workflow_xml)
+    return {z.tag: z.text for z in procedure if z.tag != "Steps"}
+
+
+def test_rewrite_metadata_changes_only_the_header():
+    source = _generated_zip()
+    with zipfile.ZipFile(source) as zfile:
+        before = {z: zfile.read(z) for z in zfile.namelist()}
+        raw_sizes = {z.filename: z.compress_size for z in zfile.infolist()}
+
+    buf = zip_converter.rewrite_workflow_metadata(
+        source, workflow_title="New & improved", version="2", author="QA")
+
+    with zipfile.ZipFile(buf) as zfile:
+        assert zfile.testzip() is None
+        after = {z: zfile.read(z) for z in zfile.namelist()}
+        assert zfile.getinfo("assets/manual.pdf").compress_size \
+            == raw_sizes["assets/manual.pdf"]
+
+    assert list(after) == list(before)
+    assert after["assets/manual.pdf"] == before["assets/manual.pdf"]
+    for name in ("workflow.xml", "fr/workflow.xml", "de/workflow.xml"):
+        steps_start = before[name].index(b"\n  <Steps>")
+        assert after[name].endswith(before[name][steps_start:])
+
+    header = _header(after["workflow.xml"])
+    assert (header["Title"], header["Description"]) == ("New & improved", "Description")
+    assert (header["Version"], header["Author"], header["DocVersion"]) == ("2", "QA", None)
+    # a translated title is kept, an untranslated one follows the default
+    assert _header(after["fr/workflow.xml"])["Title"] == "Titre"
+    assert _header(after["de/workflow.xml"])["Title"] == "New & improved"
+    assert _header(after["de/workflow.xml"])["Description"] == "Beschreibung"
+
+
+def test_rewrite_metadata_keeps_the_step_index():
+    import_steps = [
+        ImportStep(step_index=1, step_title="First"),
+        ImportStep(step_index=2, step_title="Second", step_type=StepType.group, steps=[
+            ImportStep(step_index=1, step_title="Inner"),
+        ]),
+    ]
+    with generate_workflow_zip(
+        import_steps, "Title", "Description", {"fr": {"title": "Titre"}},
+        with_index=True
+    ) as buf:
+        source = io.BytesIO(buf.read())
+
+    buf = zip_converter.rewrite_workflow_metadata(
+        source, workflow_title="A much longer title than the one it had", version="3")
+
+    with zipfile.ZipFile(buf) as zfile:
+        for prefix in ("", "fr/"):
+            workflow_xml = zfile.read(prefix + "workflow.xml")
+            index = json.loads(zfile.read(prefix + "index.json"))
+            assert index["size"] == len(workflow_xml)
+            assert len(index["offset"]) == index["step_count"] >= 3
+            for offset, length in zip(index["offset"], index["length"]):
+                span = workflow_xml[offset:offset + length]
+                assert span.startswith(b"<Step") and span.endswith(b"</Step>")
+
+
+def test_rewrite_metadata_of_a_compact_zip():
+    import_steps = [ImportStep(step_index=1, step_title="First")]
+    with generate_workflow_zip(
+        import_steps, "Title", "", {"fr": {"title": "Titre"}}, compact=True,
+        with_index=True
+    ) as buf:
+        source = io.BytesIO(buf.read())
+    with zipfile.ZipFile(source) as zfile:
+        before = zfile.read("workflow.xml")
+
+    buf = zip_converter.rewrite_workflow_metadata(
+        source, workflow_title="New", version="2", author="QA")
+
+    with zipfile.ZipFile(buf) as zfile:
+        after = zfile.read("workflow.xml")
+        localised = zfile.read("fr/workflow.xml")
+        index = json.loads(zfile.read("index.json"))
+    # the empty elements compact output leaves out are added where they go
+    assert b"\n" not in after
+    assert after.endswith(before[before.index(b"<Steps>"):])
+    assert [z.tag for z in et.fromstring(after)][:6] \
+        == ["ID", "Title", "Version", "Author", "Interlocked", "Report"]
+    header = _header(after)
+    assert (header["Title"], header["Version"], header["Author"]) == ("New", "2", "QA")
+    assert _header(localised)["Title"] == "Titre"
+    assert _header(localised)["Version"] == "2"
+    assert index["size"] == len(after)
+    assert all(after[z:].startswith(b"<Step") for z in index["offset"])
+
+
+def test_rewrite_metadata_whatever_the_whitespace():
+    source = io.BytesIO()
+    with zipfile.ZipFile(source, "w") as zfile:
+        zfile.writestr(
+            "workflow.xml",
+            '<Procedure IsReport="false">\r\n\t<ID>1</ID>\t<Title>Old</Title>\r\n'
+            '\t<Report Export="false" />\t<DateModified>2020-01-01</DateModified >'
+            '<Steps>\r\n\t</Steps></Procedure>')
+
+    buf = zip_converter.rewrite_workflow_metadata(source, workflow_title="New")
+
+    with zipfile.ZipFile(buf) as zfile:
+        after = zfile.read("workflow.xml")
+    assert _header(after)["Title"] == "New"
+    assert _header(after)["DateModified"] != "2020-01-01"
+    assert after.startswith(b'<Procedure IsReport="false">\r\n\t<ID>1</ID>\t<Title>New</Title>\r\n')
+    assert after.endswith(b"<Steps>\r\n\t</Steps></Procedure>")
+
+
+def test_rewrite_metadata_rejects_other_files():
+    with pytest.raises(WorkflowValidationError):
+        zip_converter.rewrite_workflow_metadata(io.BytesIO(b"not a zip"))
+
+    source = io.BytesIO()
+    with zipfile.ZipFile(source, "w") as zfile:
+        zfile.writestr("readme.txt", "hello")
+    with pytest.raises(WorkflowValidationError):
+        zip_converter.rewrite_workflow_metadata(source)
@@ -0,0 +1,123 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import json
+import zipfile
+
+import lxml.etree as et
+import pytest
+
+from core import ImportStep, StepType, generate_workflow_zip
+from core import subflows
+
+
+def _import_steps():
+    return [
+        ImportStep(step_index=1, step_title="Intro & <welcome>", step_tag="intro",
+                   translations={"fr": {"title": "Une introduction bien plus longue"}}),
+        ImportStep(step_index=2, step_title="Group", step_type=StepType.group, steps=[
+            ImportStep(step_index=1, step_title="Inner", step_tag="reading",
+                       step_type=StepType.numeric, translations={"de": {"title": "I"}}),
+        ]),
+        ImportStep(step_index=3, step_title="Pick", step_type=StepType.selection,
+                   selection_options=["Red", "Green"], step_tag="reading"),
+    ]
+
+
+def _entries(**kwargs):
+    with generate_workflow_zip(
+            _import_steps(), "Title", "", {"fr": {"title": "Titre"}}, **kwargs) as buf:
+        with zipfile.ZipFile(buf) as zfile:
+            return {z: zfile.read(z) for z in zfile.namelist()}
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_offsets_point_at_each_step(compact):
+    entries = _entries(with_index=True, compact=compact)
+    assert sorted(entries) == [
+        "de/index.json", "de/workflow.xml", "fr/index.json", "fr/workflow.xml",
+        "index.json", "workflow.xml",
+    ]
+    for locale in ("", "de/", "fr/"):
+        workflow_xml = entries[locale + "workflow.xml"]
+        index = json.loads(entries[locale + "index.json"])
+        assert index["document"] == locale + "workflow.xml"
+        assert index["size"] == len(workflow_xml)
+        for step_id, offset, length in zip(index["id"], index["offset"], index["length"]):
+            step = et.fromstring(workflow_xml[offset:offset + length])
+            assert step.tag == "Step" and step.find("Base").get("ID") == step_id
+
+
+def test_index_fields():
+    index = json.loads(_entries(with_index=True)["index.json"])
+    group = index["step_index"].index(2)
+
+    assert index["step_count"] == len(index["id"]) == 8
+    assert index["type_counts"] == {
+        "start": 2, "instruction": 1, "group": 1, "numeric": 1, "end": 2, "selection": 1,
+    }
+    assert [t for t in index["tag"] if t] == ["intro", "reading", "reading"]
+    # the start, inner and end step of the group
+    assert [i for i, z in enumerate(index["parent"]) if z == group] == [group + 1, group + 2, group + 3]
+    assert index["offset"][group] < index["offset"][group + 1]
+    assert index["offset"][group + 3] + index["length"][group + 3] \
+        < index["offset"][group] + index["length"][group]
+
+    assert "index.json" not in _entries()
+
+
+@pytest.fixture
+def safety_subflow(tmp_path):
+    subflows.configure(directory=str(tmp_path))
+    subflows.register_subflow("safety", [
+        ImportStep(step_index=1, step_title="Gloves", step_tag="ppe"),
+        ImportStep(step_index=2, step_title="Goggles", step_type=StepType.text),
+        ImportStep(step_index=3, step_title="Site", step_type=StepType.selection,
+                   selection_options=["North", "South"]),
+    ])
+    yield
+    subflows.configure()
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_steps_of_included_subflows_are_indexed(safety_subflow, compact):
+    import_steps = [
+        ImportStep(step_index=1, step_title="Checks", step_type=StepType.group,
+                   config={"include": "safety"}),
+        ImportStep(step_index=2, step_title="Done", step_tag="done"),
+    ]
+    with generate_workflow_zip(
+            import_steps, "Title", "", {}, with_index=True, compact=compact) as buf:
+        with zipfile.ZipFile(buf) as zfile:
+            workflow_xml = zfile.read("workflow.xml")
+            index = json.loads(zfile.read("index.json"))
+
+    group = index["step_index"].index(1)
+    included = [i for i, z in enumerate(index["parent"]) if z == group]
+    # the start and end step of the subflow's group as well as its own
+    assert [index["type"][z] for z in included] \
+        == ["start", "instruction", "text", "selection", "end"]
+    assert [index["step_index"][z] for z in included] == [None] * 5
+    assert index["tag"][included[1]] == "ppe"
+    assert index["step_index"][included[-1] + 1] == 2
+    assert index["step_count"] == len(index["id"]) == 9
+    assert len(set(index["id"])) == 9
+    for step_id, offset, length in zip(index["id"], index["offset"], index["length"]):
+        step = et.fromstring(workflow_xml[offset:offset + length])
+        assert step.tag == "Step" and step.find("Base").get("ID") == step_id
@@ -0,0 +1,252 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# benchmark of deeply nested groups, times each stage of a conversion
+# in process for the deep_groups scenario at increasing depths, and the
+# same workflow sent as json to /api/json/v1 through the app
+#
+# example usage, from the root of the repository:
+#   python -m tools.benchmark_nesting
+#   python -m tools.benchmark_nesting --depths 100,1000,5000 --repeat 5
+#   python -m tools.benchmark_nesting --depths 100,1000 --find-json-limit
+#
+# the stages in process and the json endpoint handle any depth, a body
+# too deep for the json module is decoded without recursion by
+# core.json_decoding; a depth the endpoint fails at is still reported, and
+# --find-json-limit narrows down the deepest it converts
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from tools.synthetic_workflows import deep_groups, rows_to_import_steps
+
+APP_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "app"
+)
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from core import ImportWorkflow, Workflow, construct_zip  # noqa: E402
+
+STAGES = ("validate", "build", "xml", "zip")
+
+JSON_ENDPOINT = "/api/json/v1"
+
+# the recursion limit while the benchmark encodes a request body, the json
+# encoder recurses as the decoder does and the body is the benchmark's own
+_ENCODE_RECURSION_LIMIT = 100000
+
+
+def parse_depths(value):
+    try:
+        depths = [int(z) for z in value.split(",") if z.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError("depths must be comma separated integers")
+    if not depths or min(depths) < 1:
+        raise argparse.ArgumentTypeError("depths must be positive")
+    return depths
+
+
+def time_conversion(depth, leaves=1):
+    # returns the duration of each stage in milliseconds and the zip size
+    raw_steps = rows_to_import_steps(deep_groups(depth, leaves))
+    timings = {}
+
+    start = time.perf_counter()
+    import_workflow = ImportWorkflow(
+        workflow_title="Nesting Benchmark", workflow_steps=raw_steps)
+    timings["validate"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    workflow = Workflow(
+        import_workflow.workflow_steps, import_workflow.workflow_title, "")
+    timings["build"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    workflow_xml = workflow.return_xml()
+    timings["xml"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    buf = construct_zip(workflow_xml)
+    timings["zip"] = time.perf_counter() - start
+
+    zip_bytes = buf.seek(0, 2)
+    buf.close()
+    return {k: v * 1000 for k, v in timings.items()}, zip_bytes
+
+
+def _json_body(depth, leaves=1):
+    raw_steps = rows_to_import_steps(deep_groups(depth, leaves))
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, _ENCODE_RECURSION_LIMIT))
+    try:
+        return json.dumps({
+            "workflowTitle": "Nesting Benchmark",
+            "workflowSteps": raw_steps,
+        }).encode("utf-8")
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+
+
+def _client():
+    # the app in process, as tools/soak_test.py drives it
+    from fastapi.testclient import TestClient
+    import main
+    return TestClient(main.app)
+
+
+def time_json_request(client, depth, leaves=1):
+    # returns the duration of the request in milliseconds, its status code
+    # and the detail of the error if it failed
+    body = _json_body(depth, leaves)
+    start = time.perf_counter()
+    response = client.post(
+        JSON_ENDPOINT, content=body, headers={"Content-Type": "application/json"})
+    request_ms = (time.perf_counter() - start) * 1000
+    error = None
+    if response.status_code != 200:
+        try:
+            error = response.json().get("detail")
+        except ValueError:
+            error = response.text
+    return request_ms, response.status_code, error
+
+
+def find_json_limit(client, low, high, leaves=1):
+    # the deepest nesting the json endpoint converts, by bisection between
+    # a depth that is known to convert and one that is known to fail
+    while high - low > 1:
+        middle = (low + high) // 2
+        if time_json_request(client, middle, leaves)[1] == 200:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+def run(depths, leaves=1, repeat=3, json_request=True, find_limit=False):
+    # json_request also sends each workflow to the json endpoint, the
+    # depth it first fails at is reported as json_failure, and find_limit
+    # then narrows down the deepest it converts as json_limit
+    client = _client() if json_request else None
+    results = []
+    for depth in depths:
+        runs = [time_conversion(depth, leaves) for _ in range(repeat)]
+        result = {
+            "depth": depth,
+            "zip_bytes": runs[-1][1],
+            "stages_ms": {
+                stage: statistics.median(z[0][stage] for z in runs)
+                for stage in STAGES
+            },
+        }
+        if client is not None:
+            requests = [time_json_request(client, depth, leaves) for _ in range(repeat)]
+            result["json_status"] = requests[-1][1]
+            result["json_error"] = requests[-1][2]
+            result["json_ms"] = statistics.median(z[0] for z in requests) \
+                if result["json_status"] == 200 else None
+        results.append(result)
+
+    summary = {"results": results, "json_failure": None, "json_limit": None}
+    if client is None:
+        return summary
+    failed = [z for z in results if z["json_status"] != 200]
+    if failed:
+        failure = min(failed, key=lambda z: z["depth"])
+        summary["json_failure"] = {
+            "depth": failure["depth"],
+            "status": failure["json_status"],
+            "error": failure["json_error"],
+        }
+        if find_limit:
+            converted = [z["depth"] for z in results
+                         if z["json_status"] == 200 and z["depth"] < failure["depth"]]
+            summary["json_limit"] = find_json_limit(
+                client, max(converted, default=0), failure["depth"], leaves)
+    return summary
+
+
+def _json_column(result):
+    if "json_status" not in result:
+        return "-"
+    if result["json_status"] != 200:
+        return "fails {0}".format(result["json_status"])
+    return "{0:.1f}".format(result["json_ms"])
+
+
+def format_results(summary):
+    header = "{0:>8} {1:>10} {2:>10} {3:>10} {4:>10} {5:>10} {6:>12} {7:>10}".format(
+        "depth", *(z + " ms" for z in STAGES), "total ms", "zip bytes", "json ms")
+    lines = [header]
+    for result in summary["results"]:
+        stages_ms = result["stages_ms"]
+        lines.append(
+            "{0:>8} {1:>10.1f} {2:>10.1f} {3:>10.1f} {4:>10.1f} {5:>10.1f} {6:>12} {7:>10}".format(
+                result["depth"],
+                *(stages_ms[z] for z in STAGES),
+                sum(stages_ms.values()),
+                result["zip_bytes"],
+                _json_column(result),
+            )
+        )
+
+    failure = summary["json_failure"]
+    if failure is not None:
+        lines.append("")
+        if summary["json_limit"] is None:
+            lines.append("{0} fails at a depth of {1} with {2}: {3}".format(
+                JSON_ENDPOINT, failure["depth"], failure["status"], failure["error"]))
+        else:
+            lines.append("{0} fails from a depth of {1} with {2}: {3}".format(
+                JSON_ENDPOINT, summary["json_limit"] + 1,
+                failure["status"], failure["error"]))
+        lines.append(
+            "the request body is decoded recursively, deeper workflows can be "
+            "converted from a csv with /api/csv/v1")
+    if summary["json_limit"] is not None:
+        lines.append("deepest nesting converted by {0}: {1}".format(
+            JSON_ENDPOINT, summary["json_limit"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the conversion of deeply nested groups")
+    parser.add_argument("--depths", type=parse_depths, default=[10, 100, 1000],
+                        help="comma separated nesting depths")
+    parser.add_argument("--leaves", type=int, default=1, help="steps per group besides the nested group")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per depth, the median is reported")
+    parser.add_argument("--no-json", action="store_true",
+                        help="don't send the workflows to " + JSON_ENDPOINT)
+    parser.add_argument("--find-json-limit", action="store_true",
+                        help="find the deepest nesting " + JSON_ENDPOINT + " converts")
+    args = parser.parse_args(argv)
+
+    print(format_results(run(
+        args.depths, args.leaves, args.repeat,
+        json_request=not args.no_json, find_limit=args.find_json_limit)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
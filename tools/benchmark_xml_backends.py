@@ -0,0 +1,147 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# benchmark of the xml backends, renders and zips the same compiled
+# workflow with the lxml backend and the bytes backend (see
+# app/core/xml_writer.py) and reports the time taken and the throughput
+#
+# example usage, from the root of the repository:
+#   python -m tools.benchmark_xml_backends
+#   python -m tools.benchmark_xml_backends --steps 1000,100000 --repeat 5
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+import lxml.etree as et
+
+from tools.synthetic_workflows import large_checklist, group_tree, rows_to_import_steps
+
+APP_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "app"
+)
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from core import ImportWorkflow, compile_workflow, construct_zip  # noqa: E402
+from core.localisation import LocalisedText  # noqa: E402
+from core.workflow_generator import render_workflow_xml  # noqa: E402
+from core.xml_writer import render_workflow_document  # noqa: E402
+
+BACKENDS = ("lxml", "bytes")
+SCENARIOS = {
+    "large_checklist": large_checklist,
+    "group_tree": group_tree,
+}
+
+
+def parse_counts(value):
+    try:
+        counts = [int(z) for z in value.split(",") if z.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError("step counts must be comma separated integers")
+    if not counts or min(counts) < 1:
+        raise argparse.ArgumentTypeError("step counts must be positive")
+    return counts
+
+
+def _render(compiled, backend):
+    if backend == "bytes":
+        return render_workflow_document(compiled), None
+    localised_text = LocalisedText()
+    return render_workflow_xml(compiled, localised_text), localised_text
+
+
+def _xml_size(workflow_xml):
+    if hasattr(workflow_xml, "tobytes"):
+        return len(workflow_xml.tobytes())
+    out = io.BytesIO()
+    et.ElementTree(workflow_xml).write(out, pretty_print=True)
+    return len(out.getvalue())
+
+
+def time_backend(compiled, backend):
+    # returns the render and zip times in milliseconds and the xml size
+    start = time.perf_counter()
+    workflow_xml, localised_text = _render(compiled, backend)
+    xml_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    construct_zip(workflow_xml, localised_text).close()
+    zip_ms = (time.perf_counter() - start) * 1000
+    return xml_ms, zip_ms, _xml_size(workflow_xml)
+
+
+def run(steps, repeat=3):
+    results = []
+    for scenario, rows_for in sorted(SCENARIOS.items()):
+        for count in steps:
+            import_workflow = ImportWorkflow(
+                workflow_title="Backend Benchmark",
+                workflow_steps=rows_to_import_steps(rows_for(count)))
+            compiled = compile_workflow(
+                import_workflow.workflow_steps, import_workflow.workflow_title, "")
+            for backend in BACKENDS:
+                runs = [time_backend(compiled, backend) for _ in range(repeat)]
+                results.append({
+                    "scenario": scenario,
+                    "steps": count,
+                    "backend": backend,
+                    "xml_ms": statistics.median(z[0] for z in runs),
+                    "zip_ms": statistics.median(z[1] for z in runs),
+                    "xml_bytes": runs[-1][2],
+                })
+    return results
+
+
+def format_results(results):
+    lines = ["{0:>16} {1:>8} {2:>7} {3:>10} {4:>10} {5:>10} {6:>10} {7:>9}".format(
+        "scenario", "steps", "backend", "xml ms", "zip ms", "total ms", "MB/s", "speedup")]
+    totals = {}
+    for result in results:
+        total_ms = result["xml_ms"] + result["zip_ms"]
+        key = (result["scenario"], result["steps"])
+        totals.setdefault(key, total_ms)
+        lines.append(
+            "{0:>16} {1:>8} {2:>7} {3:>10.1f} {4:>10.1f} {5:>10.1f} {6:>10.1f} {7:>8.2f}x".format(
+                result["scenario"], result["steps"], result["backend"],
+                result["xml_ms"], result["zip_ms"], total_ms,
+                result["xml_bytes"] / 2**20 / (total_ms / 1000),
+                totals[key] / total_ms,
+            )
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the throughput of the lxml and bytes xml backends")
+    parser.add_argument("--steps", type=parse_counts, default=[1000, 10000],
+                        help="comma separated step counts")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, the median is reported")
+    args = parser.parse_args(argv)
+
+    print(format_results(run(args.steps, args.repeat)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,424 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# local load test harness, boots the app under uvicorn on localhost and
+# drives the conversion endpoints with a mix of synthetic workflows
+#
+# example usage, from the root of the repository:
+#   python -m tools.load_test --duration 30 --concurrency 8
+#   python -m tools.load_test --rate 50 --mix small_form=6,large_checklist=3,deep_groups=1
+#   python -m tools.load_test --max-p99-ms 500 --max-error-rate 0.01
+#
+# only the standard library is used to drive the load so that the harness
+# runs fully offline, a non-zero exit code is returned if a gate fails
+
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from tools.synthetic_workflows import SCENARIOS, rows_to_csv, rows_to_json
+
+APP_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "app"
+)
+
+JSON_ENDPOINT = "/api/json/v1"
+CSV_ENDPOINT = "/api/csv/v1"
+
+
+def parse_mix(mix_string):
+    # "small_form=6,large_checklist=3" -> {"small_form": 6.0, ...}
+    mix = {}
+    for item in mix_string.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(
+                "Unknown scenario {0}, choose from {1}".format(
+                    name, ", ".join(SCENARIOS))
+            )
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    # nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _multipart_body(field_name, filename, content):
+    boundary = uuid.uuid4().hex
+    body = b"".join([
+        b"--" + boundary.encode() + b"\r\n",
+        'Content-Disposition: form-data; name="{0}"; filename="{1}"\r\n'.format(
+            field_name, filename).encode(),
+        b"Content-Type: text/csv\r\n\r\n",
+        content,
+        b"\r\n--" + boundary.encode() + b"--\r\n",
+    ])
+    return body, "multipart/form-data; boundary=" + boundary
+
+
+def build_requests(mix, endpoints):
+    # every request is prepared up front so that payload generation
+    # doesn't show up in the measured latency
+    prepared = []
+    for name, weight in mix.items():
+        rows = SCENARIOS[name]()
+        if "json" in endpoints:
+            prepared.append({
+                "scenario": name,
+                "endpoint": JSON_ENDPOINT,
+                "path": JSON_ENDPOINT,
+                "body": rows_to_json(rows, name),
+                "content_type": "application/json",
+                "weight": weight,
+            })
+        if "csv" in endpoints:
+            body, content_type = _multipart_body(
+                "workflow_steps", name + ".csv", rows_to_csv(rows)
+            )
+            prepared.append({
+                "scenario": name,
+                "endpoint": CSV_ENDPOINT,
+                "path": CSV_ENDPOINT + "?" + urllib.parse.urlencode(
+                    {"workflow_title": name}),
+                "body": body,
+                "content_type": content_type,
+                "weight": weight,
+            })
+    return prepared
+
+
+class Server():
+
+    def __init__(self, workers, port=None):
+        self.port = port or _free_port()
+        self.base_url = "http://127.0.0.1:{0}".format(self.port)
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "main:app",
+                "--app-dir", APP_DIR,
+                "--host", "127.0.0.1",
+                "--port", str(self.port),
+                "--workers", str(workers),
+                "--log-level", "warning",
+            ],
+            cwd=APP_DIR
+        )
+
+    def wait_until_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            try:
+                with urllib.request.urlopen(self.base_url + "/", timeout=1):
+                    return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.1)
+        raise RuntimeError("uvicorn did not start within {0}s".format(timeout))
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def _children(pid):
+    children = []
+    task_dir = "/proc/{0}/task".format(pid)
+    try:
+        for task in os.listdir(task_dir):
+            with open(os.path.join(task_dir, task, "children")) as f:
+                children.extend(int(z) for z in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def _rss_bytes(pid):
+    try:
+        with open("/proc/{0}/status".format(pid)) as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class RssSampler():
+    # samples the resident set size of the server process tree, uvicorn runs
+    # a supervisor process with the workers as its children when workers > 1
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak_by_pid = {}
+        self.last_by_pid = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        pids = [self.pid]
+        for pid in pids:
+            pids.extend(_children(pid))
+        for pid in pids:
+            rss = _rss_bytes(pid)
+            if rss:
+                self.last_by_pid[pid] = rss
+                self.peak_by_pid[pid] = max(self.peak_by_pid.get(pid, 0), rss)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def send_request(base_url, prepared, timeout):
+    request = urllib.request.Request(
+        base_url + prepared["path"],
+        data=prepared["body"],
+        headers={"Content-Type": prepared["content_type"]},
+        method="POST"
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        status = 0
+    return status, time.perf_counter() - start
+
+
+def run_closed_loop(base_url, prepared, concurrency, duration, timeout, seed):
+    # a fixed number of clients each send their next request as soon
+    # as the previous one has completed
+    results = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    weights = [z["weight"] for z in prepared]
+
+    def client(client_number):
+        rng = random.Random(seed + client_number)
+        while time.monotonic() < deadline:
+            item = rng.choices(prepared, weights)[0]
+            status, latency = send_request(base_url, item, timeout)
+            with lock:
+                results.append((item, status, latency))
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    return results
+
+
+def run_open_loop(base_url, prepared, rate, duration, timeout, seed, max_in_flight):
+    # requests are dispatched on a fixed schedule regardless of how long
+    # earlier requests take, latency is measured from the scheduled send
+    # time so that a slow server is not hidden by coordinated omission
+    results = []
+    lock = threading.Lock()
+    rng = random.Random(seed)
+    weights = [z["weight"] for z in prepared]
+    interval = 1.0 / rate
+
+    def fire(item, scheduled):
+        status, _ = send_request(base_url, item, timeout)
+        with lock:
+            results.append((item, status, time.perf_counter() - scheduled))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_in_flight) as executor:
+        sent = 0
+        while True:
+            scheduled = start + sent * interval
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(fire, rng.choices(prepared, weights)[0], scheduled)
+            sent += 1
+    return results
+
+
+def summarise(results, elapsed):
+    def stats(subset):
+        latencies = sorted(latency for _, _, latency in subset)
+        errors = sum(1 for _, status, _ in subset if status != 200)
+        return {
+            "requests": len(subset),
+            "throughput_rps": len(subset) / elapsed if elapsed else 0.0,
+            "error_rate": errors / len(subset) if subset else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": (latencies[-1] * 1000) if latencies else 0.0,
+        }
+
+    breakdown = {}
+    for result in results:
+        key = "{0} {1}".format(result[0]["endpoint"], result[0]["scenario"])
+        breakdown.setdefault(key, []).append(result)
+
+    return {
+        "total": stats(results),
+        "breakdown": {key: stats(value) for key, value in sorted(breakdown.items())},
+    }
+
+
+def format_report(summary, rss):
+    lines = [
+        "{0:<40} {1:>8} {2:>9} {3:>7} {4:>9} {5:>9} {6:>9}".format(
+            "", "requests", "req/s", "errors", "p50 ms", "p95 ms", "p99 ms")
+    ]
+    rows = list(summary["breakdown"].items()) + [("total", summary["total"])]
+    for name, z in rows:
+        lines.append(
+            "{0:<40} {1:>8} {2:>9.1f} {3:>6.1%} {4:>9.1f} {5:>9.1f} {6:>9.1f}".format(
+                name, z["requests"], z["throughput_rps"], z["error_rate"],
+                z["p50_ms"], z["p95_ms"], z["p99_ms"])
+        )
+    if rss:
+        lines.append("")
+        for pid, values in sorted(rss.items()):
+            lines.append(
+                "pid {0:<8} rss last {1:>8.1f} MiB   peak {2:>8.1f} MiB".format(
+                    pid, values["last"] / 2**20, values["peak"] / 2**20)
+            )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load test the workflow generator conversion endpoints")
+    parser.add_argument("--url", help="target an already running server instead of booting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--mix", type=parse_mix,
+                        default=parse_mix("small_form=6,large_checklist=3,deep_groups=1"),
+                        help="weighted scenario mix, e.g. small_form=6,deep_groups=1")
+    parser.add_argument("--endpoints", default="json,csv", help="json, csv or json,csv")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unmeasured load first")
+    parser.add_argument("--concurrency", type=int, default=4, help="closed loop clients")
+    parser.add_argument("--rate", type=float, help="open loop requests per second, overrides --concurrency")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="open loop request cap")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_output", help="also write the report to this file as json")
+    parser.add_argument("--max-p99-ms", type=float, help="fail if the overall p99 exceeds this")
+    parser.add_argument("--max-error-rate", type=float, help="fail if the overall error rate exceeds this")
+    args = parser.parse_args(argv)
+
+    prepared = build_requests(args.mix, args.endpoints.split(","))
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        server = Server(args.workers)
+        base_url = server.base_url
+
+    try:
+        if server:
+            server.wait_until_ready()
+        sampler = RssSampler(server.process.pid) if server else None
+
+        def run(duration):
+            if args.rate:
+                return run_open_loop(base_url, prepared, args.rate, duration,
+                                     args.timeout, args.seed, args.max_in_flight)
+            return run_closed_loop(base_url, prepared, args.concurrency,
+                                   duration, args.timeout, args.seed)
+
+        if args.warmup:
+            run(args.warmup)
+
+        if sampler:
+            sampler.start()
+        start = time.perf_counter()
+        results = run(args.duration)
+        elapsed = time.perf_counter() - start
+        if sampler:
+            sampler.stop()
+    finally:
+        if server:
+            server.stop()
+
+    summary = summarise(results, elapsed)
+    rss = {
+        pid: {"last": sampler.last_by_pid[pid], "peak": peak}
+        for pid, peak in sampler.peak_by_pid.items()
+    } if sampler else {}
+    summary["rss_bytes"] = rss
+
+    print(format_report(summary, rss))
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    failures = []
+    if args.max_p99_ms is not None and summary["total"]["p99_ms"] > args.max_p99_ms:
+        failures.append("p99 {0:.1f} ms exceeds {1} ms".format(
+            summary["total"]["p99_ms"], args.max_p99_ms))
+    if args.max_error_rate is not None and summary["total"]["error_rate"] > args.max_error_rate:
+        failures.append("error rate {0:.2%} exceeds {1:.2%}".format(
+            summary["total"]["error_rate"], args.max_error_rate))
+    for failure in failures:
+        print("FAILED: " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
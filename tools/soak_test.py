@@ -0,0 +1,379 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# memory leak soak test, pushes a long run of mixed conversions through the
+# app in process and fails if the resident set size, open file descriptors,
+# temporary files or memory traced by tracemalloc keep growing
+#
+# example usage, from the root of the repository:
+#   python -m tools.soak_test --conversions 20000
+#   python -m tools.soak_test --conversions 50000 --sample-every 1000 --json soak.json
+#
+# the app is driven with starlette's TestClient so that every request goes
+# through the same routing, validation, streaming and clean up as it does
+# under uvicorn, without sockets or other processes muddying the figures
+#
+# each sample is taken after a full garbage collection, a metric only
+# counts as growing if every sample in the last quarter of the run is above
+# every sample in the first quarter by more than its tolerance, so a
+# one-off spike or a cache filling up during the warm up doesn't fail it
+
+import argparse
+import gc
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tools import load_test
+from tools.load_test import APP_DIR, _multipart_body, _rss_bytes
+from tools.synthetic_workflows import SCENARIOS, rows_to_csv, rows_to_json
+
+METRICS = ["rss_bytes", "open_fds", "temp_files", "traced_bytes"]
+
+# the growth allowed between the first and last quarter of the run, file
+# descriptors and temporary files should come back exactly
+DEFAULT_TOLERANCES = {
+    "rss_bytes": 32 * 2**20,
+    "open_fds": 0,
+    "temp_files": 0,
+    "traced_bytes": 2 * 2**20,
+}
+
+DEFAULT_MIX = "json=4,csv=3,compact=1,explain=1,staged=1,metadata=1,invalid=1,cancelled=1"
+
+# the synthetic workflows converted, as for tools/load_test.py
+DEFAULT_SCENARIOS = "small_form=6,large_checklist=3,deep_groups=1"
+
+# small enough that the larger zips are spilled to temporary files
+SOAK_SPOOL_THRESHOLD = 64 * 2**10
+
+# the number of allocation sites listed in the report
+TOP_ALLOCATION_COUNT = 10
+
+
+def _app():
+    # the app, and its core package, as when run from the app directory
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    import main
+    return main
+
+
+def build_payloads(scenarios):
+    # every payload is generated up front, each conversion picks a scenario
+    payloads = {"scenarios": [], "weights": []}
+    for name, weight in sorted(scenarios.items()):
+        rows = SCENARIOS[name]()
+        payloads["weights"].append(weight)
+        csv_body, csv_content_type = _multipart_body(
+            "workflow_steps", name + ".csv", rows_to_csv(rows))
+        payloads["scenarios"].append({
+            "name": name,
+            "json": rows_to_json(rows, name),
+            "csv": csv_body,
+            "csv_content_type": csv_content_type,
+        })
+    payloads["invalid_csv"], payloads["invalid_csv_content_type"] = _multipart_body(
+        "workflow_steps", "invalid.csv",
+        b"StepIndex,StepTitle,StepType,DecisionPaths\n1,Check,decision,Yes;No\n")
+    return payloads
+
+
+def _scenario(payloads, rng):
+    return rng.choices(payloads["scenarios"], payloads["weights"])[0]
+
+
+def _json(client, payloads, rng):
+    scenario = _scenario(payloads, rng)
+    return [client.post("/api/json/v1", content=scenario["json"],
+                        headers={"Content-Type": "application/json"})], 200
+
+
+def _csv(client, payloads, rng):
+    scenario = _scenario(payloads, rng)
+    return [client.post(
+        "/api/csv/v1", params={"workflow_title": scenario["name"]},
+        content=scenario["csv"],
+        headers={"Content-Type": scenario["csv_content_type"]})], 200
+
+
+def _compact(client, payloads, rng):
+    scenario = _scenario(payloads, rng)
+    return [client.post("/api/json/v1?compact=true&prune=true", content=scenario["json"],
+                        headers={"Content-Type": "application/json"})], 200
+
+
+def _explain(client, payloads, rng):
+    scenario = _scenario(payloads, rng)
+    return [client.post("/api/json/v1?explain=true", content=scenario["json"],
+                        headers={"Content-Type": "application/json"})], 200
+
+
+def _staged(client, payloads, rng):
+    # staged, generated twice and removed
+    scenario = _scenario(payloads, rng)
+    staged = client.post("/api/json/v1/stage", content=scenario["json"],
+                         headers={"Content-Type": "application/json"})
+    if staged.status_code != 200:
+        return [staged], 200
+    handle = staged.json()["handle"]
+    responses = [
+        client.post("/api/staged/v1/" + handle),
+        client.post("/api/staged/v1/" + handle, json={"workflowTitle": "Again"}),
+    ]
+    removed = client.delete("/api/staged/v1/" + handle)
+    return responses + ([removed] if removed.status_code != 204 else []), 200
+
+
+def _metadata(client, payloads, rng):
+    scenario = _scenario(payloads, rng)
+    generated = client.post("/api/json/v1", content=scenario["json"],
+                            headers={"Content-Type": "application/json"})
+    if generated.status_code != 200:
+        return [generated], 200
+    body, content_type = _multipart_body(
+        "workflow_zip", "workflow.zip", generated.content)
+    return [client.post("/api/zip/v1/metadata", params={"version": "2"},
+                        content=body, headers={"Content-Type": content_type})], 200
+
+
+def _invalid(client, payloads, rng):
+    # fails validation part way through ingestion
+    return [client.post(
+        "/api/csv/v1", params={"workflow_title": "Invalid"},
+        content=payloads["invalid_csv"],
+        headers={"Content-Type": payloads["invalid_csv_content_type"]})], 422
+
+
+def _cancelled(client, payloads, rng):
+    # a deadline that has already passed, cancelled at the first check
+    scenario = _scenario(payloads, rng)
+    return [client.post("/api/json/v1", content=scenario["json"],
+                        headers={"Content-Type": "application/json",
+                                 "X-Workflow-Timeout": "0"})], 504
+
+
+# each sends one conversion, or a few related requests, and returns the
+# responses along with the status code they should all have
+REQUESTS = {
+    "json": _json,
+    "csv": _csv,
+    "compact": _compact,
+    "explain": _explain,
+    "staged": _staged,
+    "metadata": _metadata,
+    "invalid": _invalid,
+    "cancelled": _cancelled,
+}
+
+
+def parse_mix(mix_string):
+    # "json=4,staged=1" -> {"json": 4.0, "staged": 1.0}
+    mix = {}
+    for item in mix_string.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in REQUESTS:
+            raise argparse.ArgumentTypeError(
+                "Unknown request kind {0}, choose from {1}".format(
+                    name, ", ".join(REQUESTS))
+            )
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+def _count_files(directory):
+    return sum(len(files) + len(dirs) for _, dirs, files in os.walk(directory))
+
+
+def _open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return 0
+
+
+def take_sample(conversions, temp_dir):
+    gc.collect()
+    return {
+        "conversions": conversions,
+        "rss_bytes": _rss_bytes(os.getpid()),
+        "open_fds": _open_fds(),
+        "temp_files": _count_files(temp_dir),
+        "traced_bytes": tracemalloc.get_traced_memory()[0]
+        if tracemalloc.is_tracing() else 0,
+    }
+
+
+def sustained_growth(values):
+    # how far the lowest value of the last quarter of the samples is above
+    # the highest of the first quarter, negative if it isn't
+    quarter = max(1, len(values) // 4)
+    return min(values[-quarter:]) - max(values[:quarter])
+
+
+def run_soak(conversions=20000, sample_every=500, warmup=200, mix=None,
+             scenarios=None, seed=0):
+    mix = mix or parse_mix(DEFAULT_MIX)
+    scenarios = scenarios or load_test.parse_mix(DEFAULT_SCENARIOS)
+
+    from fastapi.testclient import TestClient
+
+    app = _app().app
+    from core import zip_converter
+    rng = random.Random(seed)
+    payloads = build_payloads(scenarios)
+    kinds = sorted(mix)
+    weights = [mix[z] for z in kinds]
+
+    # temporary files, including the spilled zip buffers, go to a directory
+    # of their own so that they can be counted
+    temp_dir = tempfile.mkdtemp(prefix="workflow_soak_")
+    previous_temp_dir = tempfile.tempdir
+    previous_spool_threshold = zip_converter._spool_threshold
+    started_tracing = not tracemalloc.is_tracing()
+    samples = []
+    errors = {}
+    counts = {z: 0 for z in kinds}
+    first_snapshot = last_snapshot = None
+    start = time.perf_counter()
+    try:
+        tempfile.tempdir = temp_dir
+        zip_converter.configure(spool_threshold=SOAK_SPOOL_THRESHOLD)
+        if started_tracing:
+            tracemalloc.start()
+        with TestClient(app) as client:
+            for number in range(1, warmup + conversions + 1):
+                kind = rng.choices(kinds, weights)[0]
+                counts[kind] += 1
+                responses, expected = REQUESTS[kind](client, payloads, rng)
+                for response in responses:
+                    if response.status_code != expected:
+                        key = "{0} {1}".format(kind, response.status_code)
+                        errors[key] = errors.get(key, 0) + 1
+                del responses
+
+                done = number - warmup
+                if done >= 0 and done % sample_every == 0:
+                    samples.append(take_sample(done, temp_dir))
+                    if done == 0:
+                        first_snapshot = tracemalloc.take_snapshot()
+            if samples[-1]["conversions"] != conversions:
+                samples.append(take_sample(conversions, temp_dir))
+            last_snapshot = tracemalloc.take_snapshot()
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        zip_converter.configure(spool_threshold=previous_spool_threshold)
+        tempfile.tempdir = previous_temp_dir
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    top_allocations = [
+        str(z) for z in last_snapshot.compare_to(first_snapshot, "lineno")[:TOP_ALLOCATION_COUNT]
+    ] if first_snapshot is not None else []
+
+    return {
+        "conversions": conversions,
+        "warmup": warmup,
+        "seconds": time.perf_counter() - start,
+        "counts": counts,
+        "errors": errors,
+        "samples": samples,
+        "growth": {
+            z: sustained_growth([s[z] for s in samples]) for z in METRICS
+        },
+        "top_allocations": top_allocations,
+    }
+
+
+def check_report(report, tolerances=None):
+    tolerances = dict(DEFAULT_TOLERANCES, **(tolerances or {}))
+    failures = []
+    for metric in METRICS:
+        if report["growth"][metric] > tolerances[metric]:
+            failures.append("{0} grew by {1} over the run, more than {2}".format(
+                metric, report["growth"][metric], tolerances[metric]))
+    for key, count in sorted(report["errors"].items()):
+        failures.append("{0} unexpected responses from {1}".format(count, key))
+    return failures
+
+
+def format_report(report):
+    lines = [
+        "{0} conversions after {1} warm up in {2:.1f}s".format(
+            report["conversions"], report["warmup"], report["seconds"]),
+        "",
+        "{0:>12} {1:>12} {2:>9} {3:>11} {4:>12}".format(
+            "conversions", "rss MiB", "open fds", "temp files", "traced MiB"),
+    ]
+    for sample in report["samples"]:
+        lines.append("{0:>12} {1:>12.1f} {2:>9} {3:>11} {4:>12.2f}".format(
+            sample["conversions"], sample["rss_bytes"] / 2**20, sample["open_fds"],
+            sample["temp_files"], sample["traced_bytes"] / 2**20))
+    lines.append("")
+    for metric in METRICS:
+        lines.append("{0:<14} sustained growth {1}".format(metric, report["growth"][metric]))
+    if report["top_allocations"]:
+        lines.append("")
+        lines.append("largest changes in traced memory since the warm up:")
+        lines.extend("  " + z for z in report["top_allocations"])
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Soak test the workflow generator for memory and resource leaks")
+    parser.add_argument("--conversions", type=int, default=20000, help="conversions measured")
+    parser.add_argument("--warmup", type=int, default=200, help="conversions before the first sample")
+    parser.add_argument("--sample-every", type=int, default=500, help="conversions between samples")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help="weighted request mix, e.g. json=4,csv=3,staged=1")
+    parser.add_argument("--scenarios", type=load_test.parse_mix,
+                        default=load_test.parse_mix(DEFAULT_SCENARIOS),
+                        help="weighted scenario mix, e.g. small_form=6,deep_groups=1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_output", help="also write the report to this file as json")
+    parser.add_argument("--max-rss-growth-mb", type=float,
+                        default=DEFAULT_TOLERANCES["rss_bytes"] / 2**20)
+    parser.add_argument("--max-traced-growth-mb", type=float,
+                        default=DEFAULT_TOLERANCES["traced_bytes"] / 2**20)
+    args = parser.parse_args(argv)
+
+    report = run_soak(args.conversions, args.sample_every, args.warmup,
+                      args.mix, args.scenarios, args.seed)
+    print(format_report(report))
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_report(report, {
+        "rss_bytes": int(args.max_rss_growth_mb * 2**20),
+        "traced_bytes": int(args.max_traced_growth_mb * 2**20),
+    })
+    for failure in failures:
+        print("FAILED: " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
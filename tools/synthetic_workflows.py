@@ -0,0 +1,185 @@
+# Copyright © Intoware Limited, 2021
+#
+# This file is part of WorkfloPlusWorkflowGenerator.
+#
+# WorkfloPlusWorkflowGenerator is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# WorkfloPlusWorkflowGenerator is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. 
+# If not, see <https://www.gnu.org/licenses/>.
+
+# generators for synthetic workflows used by the load test harness and
+# benchmarks, each generator returns a flat list of rows keyed by the
+# csv column names so the same workflow can be sent to either endpoint
+
+import csv
+import io
+import json
+
+STEP_INDEX = "StepIndex"
+STEP_TITLE = "StepTitle"
+STEP_DESCRIPTION = "StepDescription"
+STEP_TAG = "StepTag"
+STEP_TYPE = "StepType"
+DECISION_PATHS = "DecisionPaths"
+SELECTION_OPTIONS = "SelectionOptions"
+CONFIG = "Config"
+PARENT = "Parent"
+
+COLUMNS = [
+    STEP_INDEX,
+    STEP_TITLE,
+    STEP_DESCRIPTION,
+    STEP_TAG,
+    STEP_TYPE,
+    DECISION_PATHS,
+    SELECTION_OPTIONS,
+    CONFIG,
+    PARENT,
+]
+
+FORM_FIELD_TYPES = ["text", "numeric", "datetime", "selection", "photo"]
+
+
+def _row(step_index, step_type, parent="", **fields):
+    row = {column: "" for column in COLUMNS}
+    row[STEP_INDEX] = step_index
+    row[STEP_TITLE] = "Step " + str(step_index)
+    row[STEP_TYPE] = step_type
+    row[PARENT] = parent
+    row.update(fields)
+    return row
+
+
+def small_form(fields=8):
+    # a single form group containing a handful of input steps
+    rows = [_row(1, "group", Config="Form:True")]
+    for i in range(fields):
+        step_type = FORM_FIELD_TYPES[i % len(FORM_FIELD_TYPES)]
+        extra = {SELECTION_OPTIONS: "A;B;C"} if step_type == "selection" else {}
+        rows.append(_row(i + 2, step_type, parent=1, **extra))
+    return rows
+
+
+def large_checklist(steps=500):
+    # a long linear checklist where every tenth step is a pass/fail decision
+    rows = []
+    for i in range(1, steps + 1):
+        if i % 10 == 0 and i < steps:
+            rows.append(
+                _row(i, "decision", DecisionPaths="Pass:{0};Fail:-2".format(i + 1))
+            )
+        elif i % 5 == 0:
+            rows.append(
+                _row(i, "selection", SelectionOptions="OK;Not OK;N/A")
+            )
+        else:
+            rows.append(
+                _row(i, "instruction", StepDescription="Check item " + str(i))
+            )
+    return rows
+
+
+def deep_groups(depth=20, leaves=2):
+    # a chain of groups, each nested inside the previous one,
+    # with a few instruction steps at every level
+    rows = []
+    step_index = 0
+    parent = ""
+    for _ in range(depth):
+        step_index += 1
+        rows.append(_row(step_index, "group", parent=parent))
+        parent = step_index
+        for _ in range(leaves):
+            step_index += 1
+            rows.append(_row(step_index, "instruction", parent=parent))
+    return rows
+
+
+def group_tree(steps=1000, branching=4):
+    # a balanced tree of groups, each holding up to branching steps,
+    # numbered breadth first so that step i sits in group
+    # (i - 2) // branching + 1, a small branching makes a narrow and
+    # deep tree and a large one a wide and shallow tree
+    rows = []
+    for i in range(1, steps + 1):
+        parent = "" if i == 1 else (i - 2) // branching + 1
+        has_children = (i - 1) * branching + 2 <= steps
+        rows.append(
+            _row(i, "group" if has_children else "instruction", parent=parent)
+        )
+    return rows
+
+
+SCENARIOS = {
+    "small_form": small_form,
+    "large_checklist": large_checklist,
+    "deep_groups": deep_groups,
+    "group_tree": group_tree,
+}
+
+
+def rows_to_csv(rows):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=COLUMNS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue().encode("utf-8")
+
+
+def _row_to_import_step(row):
+    step = {
+        "stepIndex": int(row[STEP_INDEX]),
+        "stepTitle": row[STEP_TITLE],
+        "stepDescription": row[STEP_DESCRIPTION],
+        "stepTag": row[STEP_TAG],
+        "stepType": row[STEP_TYPE],
+        "config": {
+            z.split(":")[0].strip().lower(): z.split(":")[1].strip()
+            for z in row[CONFIG].split(";")
+        } if row[CONFIG] else {},
+    }
+    if row[DECISION_PATHS]:
+        step["decisionPaths"] = [
+            {
+                "decisionName": z.split(":")[0],
+                "stepIndex": int(z.split(":")[1])
+            }
+            for z in row[DECISION_PATHS].split(";")
+        ]
+    if row[SELECTION_OPTIONS]:
+        step["selectionOptions"] = row[SELECTION_OPTIONS].split(";")
+    return step
+
+
+def rows_to_import_steps(rows):
+    # nest the flat rows using the Parent column, parents always
+    # appear before their children in the generated rows
+    steps_by_index = {}
+    top_level = []
+    for row in rows:
+        step = _row_to_import_step(row)
+        steps_by_index[step["stepIndex"]] = step
+        if row[PARENT] == "":
+            top_level.append(step)
+        else:
+            steps_by_index[int(row[PARENT])].setdefault("steps", []).append(step)
+    return top_level
+
+
+def rows_to_json(rows, title="Synthetic Workflow", description=""):
+    return json.dumps(
+        {
+            "workflowTitle": title,
+            "workflowDescription": description,
+            "workflowSteps": rows_to_import_steps(rows),
+        }
+    ).encode("utf-8")